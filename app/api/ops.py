@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+
+from app.services import ideation_cache, page_cache, tool_cache
+
+router = APIRouter(
+    prefix="/ops",
+    tags=["Operations"]
+)
+
+
+@router.get("/cache-stats")
+def get_cache_stats():
+    """
+    Hit/miss counters since startup for the shared ideation cache, the agent tool cache and
+    the rendered trip pages.
+    """
+    return {"ideation": ideation_cache.stats(), "tool_cache": tool_cache.stats(), "pages": page_cache.stats()}
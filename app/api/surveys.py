@@ -1,44 +1,52 @@
-
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app import models, schemas
+from app.services import read_models, survey_service
+from app.core import query_log
+from app.core.templates import templates
 
 router = APIRouter(tags=["Surveys"])
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/survey/{participant_id}", response_class=HTMLResponse)
-def get_survey_form(request: Request, participant_id: int, db: Session = Depends(get_db)):
-    participant = db.query(models.Participant).filter(models.Participant.id == participant_id).first()
-    if not participant:
+@query_log.budget(1)
+async def get_survey_form(request: Request, participant_id: int, db: AsyncSession = Depends(get_async_db)):
+    page = await db.run_sync(read_models.load_survey_page, participant_id)
+    if not page:
         raise HTTPException(status_code=404, detail="Participant not found")
     return templates.TemplateResponse(
         "survey.html",
         {
             "request": request,
-            "trip_name": participant.trip.name,
-            "contact_info": participant.contact_info,
-            "participant_id": participant.id
+            "trip_name": page.trip_name,
+            "contact_info": page.participant.contact_info,
+            "participant_id": page.participant.id
         }
     )
 
 @router.post("/surveys/{participant_id}")
-def submit_survey(participant_id: int,location: str = Form(), budget: str = Form(), interests: str = Form(), db: Session = Depends(get_db)):
+async def submit_survey(participant_id: int,location: str = Form(), budget: str = Form(), interests: str = Form(), db: AsyncSession = Depends(get_async_db)):
     # In a real app, you'd have more robust validation
     preferences = {
         "budget": budget,
         "interests": [interest.strip() for interest in interests.split(',')]
     }
-    participant = db.query(models.Participant).filter(models.Participant.id == participant_id).first()
-    if participant:
-        participant.start_location = location
+    trip_id = await db.run_sync(survey_service.submit_survey, participant_id, location, preferences)
+    if trip_id is None:
+        raise HTTPException(status_code=404, detail="Participant not found")
+    return {"message": "Thank you for submitting your preferences!"}
 
-    survey_response = models.SurveyResponse(
-        participant_id=participant_id,
-        preferences=preferences
-    )
-    db.add(survey_response)
-    db.commit()
-    return {"message": "Thank you for submitting your preferences!"}
\ No newline at end of file
+@router.get("/trips/{trip_id}/surveys/pending")
+@query_log.budget(3)
+async def get_pending_surveys(trip_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Participants who haven't answered the survey yet."""
+    page = await db.run_sync(read_models.load_pending_surveys, trip_id)
+    if not page:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    return {
+        "trip_name": page.trip_name,
+        "participants": page.participant_count,
+        "responses": page.response_count,
+        "pending": [{"id": p.id, "contact_info": p.contact_info} for p in page.pending],
+    }
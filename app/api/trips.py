@@ -1,30 +1,46 @@
-from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session
+import csv
+import io
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, Request, HTTPException, UploadFile, File
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List
-from fastapi.templating import Jinja2Templates
 
-from app.core.database import get_db
+from app.core.database import get_async_db, SessionLocal
 from app.services import trip_service
 from app.services import ai_service
+from app.services import job_service
+from app.services import event_service
+from app.services import page_cache
+from app.services import read_models
+from app.core import query_log
+from app.core.templates import templates
+from app.core.config import settings
 from app import schemas, models
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 
 from fastapi import Form
 from typing import List
 
-templates = Jinja2Templates(directory="app/templates")
-
 router = APIRouter(
     prefix="/trips",  # All routes in this file will start with /trips
     tags=["Trips"]    # This groups them nicely in the docs
 )
 
+async def _create_trip_or_422(db: AsyncSession, trip_data: schemas.TripCreate):
+    try:
+        return await db.run_sync(trip_service.create_trip, trip_data)
+    except trip_service.DuplicateParticipantError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "duplicates": e.duplicates})
+
+
 @router.post("/", response_model=schemas.Trip)
-def create_new_trip(
+async def create_new_trip(
         request: Request,  # Add the request object
         name: str = Form(...),
         participants: List[str] = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new trip and return an HTML confirmation.
@@ -32,43 +48,174 @@ def create_new_trip(
     participant_schemas = [schemas.ParticipantCreate(contact_info=p) for p in participants if p]
     trip_data = schemas.TripCreate(name=name, participants=participant_schemas)
 
-    # Create the trip in the database
-    created_trip = trip_service.create_trip(db=db, trip=trip_data)
+    # Create the trip in the database; invites are queued in the notification outbox
+    created_trip = await _create_trip_or_422(db, trip_data)
 
     # Return the HTML template as the response
     return templates.TemplateResponse(
         "trip_created_success.html",
         {"request": request, "trip": created_trip}
     )
-@router.post("/{trip_id}/generate-recommendations", response_model=List[schemas.Recommendation])
-def generate_trip_recommendations(trip_id: int, db: Session = Depends(get_db)):
+
+
+@router.post("/bulk", response_model=schemas.Trip, status_code=201)
+async def bulk_create_trip(trip: schemas.TripCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Creates a trip with its whole roster from JSON in one transaction and returns the
+    participants with their ids. Invites are queued in the notification outbox.
+    """
+    return await _create_trip_or_422(db, trip)
+
+
+@router.post("/bulk/csv", response_model=schemas.Trip, status_code=201)
+async def bulk_create_trip_from_csv(
+        name: str = Form(...),
+        roster: UploadFile = File(...),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Creates a trip from an uploaded CSV roster: one contact per row, taken from a
+    `contact_info` column if the file has that header, otherwise from the first column.
+    """
+    text = (await roster.read()).decode("utf-8-sig")
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    column = 0
+    if rows and "contact_info" in [cell.strip().lower() for cell in rows[0]]:
+        column = [cell.strip().lower() for cell in rows[0]].index("contact_info")
+        rows = rows[1:]
+
+    participant_schemas = [schemas.ParticipantCreate(contact_info=row[column]) for row in rows if len(row) > column]
+    trip_data = schemas.TripCreate(name=name, participants=participant_schemas)
+    return await _create_trip_or_422(db, trip_data)
+
+
+def _generate_recommendations_now(trip_id: int):
+    db = SessionLocal()
+    try:
+        try:
+            recommendations = ai_service.generate_recommendations(trip_id=trip_id, db=db)
+        except ai_service.PipelineIncomplete as e:
+            # Finished stages are checkpointed, so calling this again resumes where it stopped
+            raise HTTPException(status_code=503, detail={"message": str(e), "stage": e.stage})
+        if recommendations is None:
+            return None
+        return [schemas.Recommendation.model_validate(rec) for rec in recommendations]
+    finally:
+        db.close()
+
+
+@router.post("/{trip_id}/generate-recommendations", response_model=List[schemas.Recommendation],
+             responses={202: {"model": schemas.RecommendationJob}})
+async def generate_trip_recommendations(trip_id: int, background: bool = False, db: AsyncSession = Depends(get_async_db)):
     """
     Triggers the AI to generate travel recommendations for a specific trip.
+    With `?background=true` the pipeline runs as a background job and a 202 with the job is returned right away.
     """
-    recommendations = ai_service.generate_recommendations(trip_id=trip_id, db=db)
+    if background:
+        if not await db.get(models.Trip, trip_id):
+            raise HTTPException(status_code=404, detail="Trip not found")
+        job = await db.run_sync(lambda session: job_service.submit_recommendation_job(trip_id=trip_id, db=session))
+        return JSONResponse(
+            status_code=202,
+            content=schemas.RecommendationJob.model_validate(job).model_dump(),
+            headers={"Location": f"/trips/{trip_id}/jobs/{job.id}"}
+        )
+
+    # The pipeline blocks on LLM and agent tool calls for minutes, so it runs on a worker thread
+    recommendations = await run_in_threadpool(_generate_recommendations_now, trip_id)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
     return recommendations
 
 
+@router.get("/{trip_id}/jobs/{job_id}", response_model=schemas.RecommendationJob)
+async def get_recommendation_job(trip_id: int, job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Reports the stage and progress of a background recommendation job.
+    """
+    job = await db.get(models.RecommendationJob, job_id)
+    if not job or job.trip_id != trip_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{trip_id}/events")
+async def stream_trip_events(request: Request, trip_id: int):
+    """
+    Server-Sent Events stream of the recommendation pipeline's progress for a trip:
+    `started`, `ideas`, `destination` (one per enriched destination), `recommendation`
+    (one per persisted recommendation), `completed` and `error`.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    subscription = event_service.subscribe(
+        trip_id, int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                event = await subscription.next_event(timeout=settings.SSE_KEEPALIVE_SECONDS)
+                yield event_service.format_sse(event) if event else ": keep-alive\n\n"
+        finally:
+            event_service.unsubscribe(subscription)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.get("/add-participant-input", response_class=HTMLResponse)
 def add_participant_input(request: Request):
     return templates.TemplateResponse("participant_input.html", {"request": request})
 
 
 @router.get("/{trip_id}", response_class=HTMLResponse)
-def get_trip_status_page(request: Request, trip_id: int, db: Session = Depends(get_db)):
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
+@query_log.budget(6)
+async def get_trip_status_page(request: Request, trip_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def render():
+        page = await db.run_sync(read_models.load_trip_status, trip_id)
+        if not page:
+            raise HTTPException(status_code=404, detail="Trip not found")
 
-    votes = db.query(models.Vote).join(models.Participant).filter(models.Participant.trip_id == trip_id).all()
-    vote_count = len(votes)
-    # Create a set of IDs for easy lookup in the template
-    voted_participant_ids = {vote.participant_id for vote in votes}
+        return templates.TemplateResponse(
+            "trip_status.html",
+            {
+                "request": request,
+                "trip": page.trip,
+                "vote_count": page.vote_count,
+                "voted_participant_ids": page.voted_participant_ids  # For easy lookup in the template
+            }
+        )
 
-    return templates.TemplateResponse(
-        "trip_status.html",
-        {
-            "request": request,
-            "trip": trip,
-            "vote_count": vote_count,
-            "voted_participant_ids": voted_participant_ids  # Pass the new list to the template
-        }
-    )
\ No newline at end of file
+    # Unchanged since the client's (or anyone's) last view: a 304 or the cached HTML for one indexed lookup
+    return await page_cache.serve(request, db, "trip_status", trip_id, render)
+
+
+@router.get("/{trip_id}/participants/{participant_id}/travel")
+@query_log.budget(2)
+async def get_participant_travel(trip_id: int, participant_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    One participant's route, fuel and flight estimates for each of the trip's recommendations.
+    """
+    page = await db.run_sync(read_models.load_participant_travel, trip_id, participant_id)
+    if not page:
+        raise HTTPException(status_code=404, detail="Participant not found")
+    return {
+        "participant_id": page.participant.id,
+        "contact_info": page.participant.contact_info,
+        "travel": [asdict(travel) for travel in page.travel],
+    }
+
+
+@router.get("/{trip_id}/participants/{participant_id}/travel/view", response_class=HTMLResponse)
+@query_log.budget(3)
+async def get_participant_travel_view(request: Request, trip_id: int, participant_id: int,
+                                      db: AsyncSession = Depends(get_async_db)):
+    """
+    The participant's travel info as an HTML fragment, loaded into the trip status page on demand.
+    """
+    async def render():
+        page = await db.run_sync(read_models.load_participant_travel, trip_id, participant_id)
+        if not page:
+            raise HTTPException(status_code=404, detail="Participant not found")
+        return templates.TemplateResponse("participant_travel.html", {"request": request, "page": page})
+
+    return await page_cache.serve(request, db, "participant_travel", trip_id, render, variant=participant_id)
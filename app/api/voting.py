@@ -1,29 +1,39 @@
-from fastapi import APIRouter, Depends, Request, Form
+import asyncio
+
+from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app import models, schemas
-from app.services import voting_service
+from app.services import ballot_buffer, page_cache, voting_service, read_models
+from app.core import query_log
+from app.core.config import settings
+from app.core.templates import templates
 
 router = APIRouter(tags=["Voting"])
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/trip/{trip_id}/vote/{participant_id}", response_class=HTMLResponse)
-def get_voting_page(request: Request, trip_id: int, participant_id: int, db: Session = Depends(get_db)):
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
-    return templates.TemplateResponse(
-        "vote.html",
-        {
-            "request": request,
-            "trip": trip,
-            "recommendations": trip.recommendations
-        }
-    )
+@query_log.budget(3)
+async def get_voting_page(request: Request, trip_id: int, participant_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def render():
+        trip = await db.run_sync(read_models.load_voting_page, trip_id)
+        if not trip:
+            raise HTTPException(status_code=404, detail="Trip not found")
+        return templates.TemplateResponse(
+            "vote.html",
+            {
+                "request": request,
+                "trip": trip,
+                "recommendations": trip.recommendations
+            }
+        )
+
+    # The page is the same for every participant, so it's cached per trip version
+    return await page_cache.serve(request, db, "vote", trip_id, render)
 
 @router.post("/trip/{trip_id}/vote/{participant_id}")
-async def submit_vote(request: Request, participant_id: int, db: Session = Depends(get_db)):
+async def submit_vote(request: Request, trip_id: int, participant_id: int, db: AsyncSession = Depends(get_async_db)):
     form_data = await request.form()
 
     # Convert form data (e.g., {"rank_1": "2", "rank_2": "1"}) to a sorted list
@@ -32,34 +42,51 @@ async def submit_vote(request: Request, participant_id: int, db: Session = Depen
     # Extract just the recommendation IDs in their ranked order
     ranked_ids = [int(key.split('_')[1]) for key, value in ranked_votes]
 
-    # Check if this participant has already voted
-    existing_vote = db.query(models.Vote).filter(models.Vote.participant_id == participant_id).first()
-    if existing_vote:
-        existing_vote.ranked_choices = ranked_ids
-    else:
-        new_vote = models.Vote(participant_id=participant_id, ranked_choices=ranked_ids)
-        db.add(new_vote)
-
-    db.commit()
+    # Insert or replace the ballot and keep the trip's tally up to date, batched with other ballots
+    # arriving at the same time when write-behind is on
+    try:
+        if settings.VOTE_WRITE_BEHIND_ENABLED:
+            recorded = await asyncio.wrap_future(ballot_buffer.get_buffer().submit(trip_id, participant_id, ranked_ids))
+        else:
+            recorded = await db.run_sync(voting_service.record_ballot, trip_id, participant_id, ranked_ids)
+    except voting_service.InvalidBallot as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if recorded is None:
+        raise HTTPException(status_code=404, detail="Participant not found")
     return {"message": "Vote submitted successfully!"}
 
 
 @router.get("/trip/{trip_id}/results", response_class=HTMLResponse)
-def get_trip_results(request: Request, trip_id: int, db: Session = Depends(get_db)):
+@query_log.budget(7)
+async def get_trip_results(request: Request, trip_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Tallies the votes and returns an HTML page with the winner.
     """
-    winner = voting_service.tally_votes(trip_id=trip_id, db=db)
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
+    async def render():
+        # Served from the maintained tally; only re-tallied if a ballot changed since the last view
+        page = await db.run_sync(read_models.load_results_page, trip_id)
+
+        # Render the new results template
+        return templates.TemplateResponse(
+            "trip_results.html",
+            {
+                "request": request,
+                "winner": page.winner,
+                "analysis": page.analysis,
+                "names": page.names,
+            }
+        )
 
-    if winner:
-        trip.status = "completed"
-        trip.winner_recommendation_id = winner.id
-        db.commit()
-        db.refresh(trip)
+    return await page_cache.serve(request, db, "results", trip_id, render)
 
-    # Render the new results template
-    return templates.TemplateResponse(
-        "trip_results.html",
-        {"request": request, "trip": trip, "winner": winner}
-    )
\ No newline at end of file
+
+@router.get("/trip/{trip_id}/results/analysis")
+async def get_trip_results_analysis(trip_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Every counting method's winner (instant-runoff, Borda, Condorcet, Schulze) plus the
+    pairwise-preference matrix, Borda scores and Schulze path strengths behind them.
+    """
+    tally = await db.run_sync(lambda session: voting_service.current_tally(trip_id, session))
+    if not tally.ballot_count:
+        raise HTTPException(status_code=404, detail="No votes have been cast")
+    return tally.analysis
\ No newline at end of file
@@ -30,6 +30,125 @@ class Settings(BaseSettings):
     GOOGLE_PROJECT_ID: str = ""
     GOOGLE_MAPS_API_KEY: str = ""
 
+    # Model used for every LLM call (see app.services.llm)
+    LLM_MODEL: str = "vertex_ai/gemini-2.5-flash"
+    # "litellm", or "fake" for the offline stand-in in app.services.fake_llm (no API key needed)
+    LLM_PROVIDER: str = "litellm"
+    LLM_FAKE_LATENCY_SECONDS: float = 0.0
+    LLM_FAKE_JITTER_SECONDS: float = 0.0
+    LLM_FAKE_ERROR_RATE: float = 0.0
+    LLM_FAKE_RATE_LIMIT_RATE: float = 0.0
+    LLM_FAKE_DESTINATIONS: int = 5
+    LLM_FAKE_SEED: int = 0
+    # Rate limits per model ({"model": {"requests_per_minute": n, "tokens_per_minute": n}}), shared by every
+    # worker process on the machine through the state files in LLM_LIMITER_STATE_DIR (default: the temp dir).
+    # A limit of 0 means unlimited, the default: calls aren't paced until the provider answers with a 429,
+    # which blocks the model for a backoff. Set the provider's quota here to also pace calls below it.
+    LLM_RATE_LIMITS: dict[str, dict[str, int]] = {}
+    LLM_DEFAULT_REQUESTS_PER_MINUTE: int = 0
+    LLM_DEFAULT_TOKENS_PER_MINUTE: int = 0
+    LLM_RATE_BURST_SECONDS: float = 10.0
+    LLM_EXPECTED_COMPLETION_TOKENS: int = 500
+    LLM_LIMITER_STATE_DIR: str = ""
+    LLM_LIMITER_MAX_WAIT_SECONDS: float = 300.0
+    # On 429/quota errors: retries, jittered exponential backoff, and how fast the halved rate recovers
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_BASE_SECONDS: float = 2.0
+    LLM_BACKOFF_MAX_SECONDS: float = 60.0
+    LLM_RATE_RECOVERY_STEP: float = 0.05
+
+    # Logging: "text" or "json" (one object per line); raw LLM responses are logged at DEBUG
+    LOG_FORMAT: str = "text"
+    LOG_LEVEL: str = "INFO"
+
+    # Database: SQLite file locally, a postgresql:// URL in production
+    DATABASE_URL: str = "sqlite:///./chalovote.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Apply pending migrations when the app starts. Serverless deployments can turn this off and run
+    # `python -m app.core.migrations` on deploy instead, keeping it out of every cold start.
+    MIGRATE_ON_STARTUP: bool = True
+    # Development aid: log each request's query count and flag statements repeated this many times (N+1)
+    QUERY_LOG_ENABLED: bool = False
+    QUERY_N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Agent enrichment: how many tool calls may run at once, and how long each may take
+    AGENT_MAX_CONCURRENCY: int = 8
+    AGENT_TOOL_TIMEOUT_SECONDS: float = 60.0
+    # Ask for route/flight/petrol data once per destination for all origins instead of once per participant
+    AGENT_BATCH_TOOL_CALLS: bool = True
+
+    # Route estimates from the bundled gazetteer (app/data/gazetteer_in.csv) instead of the LLM:
+    # great-circle distance x road factor, at an average speed. Unresolvable places still go to the LLM.
+    GEO_ROUTES_ENABLED: bool = True
+    GEO_GAZETTEER_PATH: str = ""
+    GEO_ROAD_DISTANCE_FACTOR: float = 1.3
+    GEO_AVERAGE_SPEED_KMPH: float = 60.0
+    GEO_FUZZY_CUTOFF: float = 0.85
+
+    # Agent tool result cache (in-process LRU in front of the tool_cache table)
+    TOOL_CACHE_MAX_ENTRIES: int = 2048
+    TOOL_CACHE_DEFAULT_TTL_SECONDS: int = 24 * 3600
+    # How often the job poller deletes expired rows from the tool_cache table
+    TOOL_CACHE_PURGE_INTERVAL_SECONDS: int = 3600
+    TOOL_CACHE_TTL_SECONDS: dict[str, int] = {
+        "petrol_price": 12 * 3600,
+        "route_info": 30 * 24 * 3600,
+        "flight_prices": 24 * 3600,
+        "hotel_recommendations": 7 * 24 * 3600,
+        "ideation": 7 * 24 * 3600,
+    }
+
+    # Destination ideas shared across trips with the same preference profile (see app.services.ideation_cache)
+    IDEATION_CACHE_MAX_ENTRIES: int = 1000
+    # 0..1; when set, a miss reuses the most similar cached profile scoring at least this much
+    IDEATION_CACHE_SIMILARITY_THRESHOLD: float | None = None
+
+    # Background recommendation jobs
+    JOB_WORKERS: int = 2
+    JOB_LEASE_SECONDS: int = 300
+    JOB_POLL_INTERVAL_SECONDS: int = 30
+    JOB_MAX_ATTEMPTS: int = 3
+    # How many streamed summary answers may be asked for; each retry only asks for the destinations
+    # whose recommendations are still missing (cut off, or not valid JSON)
+    PIPELINE_SUMMARY_ATTEMPTS: int = 2
+
+    # Rendered trip status, vote and results pages, keyed by trip version (see app.services.page_cache)
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_MAX_ENTRIES: int = 512
+    # Compiled Jinja templates are kept in TEMPLATE_BYTECODE_CACHE_DIR (default: the temp dir), so a
+    # fresh process loads them instead of compiling every template again. The temp dir doesn't outlive a
+    # serverless instance; point this into the deployment and fill it with `python -m app.core.templates`.
+    TEMPLATE_BYTECODE_CACHE_ENABLED: bool = True
+    TEMPLATE_BYTECODE_CACHE_DIR: str = ""
+
+    # Write-behind ballot ingestion (see app.services.ballot_buffer): ballots arriving together are
+    # committed in batches of up to VOTE_BATCH_MAX_SIZE, each waiting at most VOTE_FLUSH_INTERVAL_SECONDS
+    VOTE_WRITE_BEHIND_ENABLED: bool = False
+    VOTE_BATCH_MAX_SIZE: int = 200
+    VOTE_FLUSH_INTERVAL_SECONDS: float = 0.05
+
+    # Server-Sent Events for pipeline progress
+    SSE_SUBSCRIBER_BUFFER: int = 64
+    SSE_HISTORY_SIZE: int = 50
+    SSE_KEEPALIVE_SECONDS: float = 15.0
+
+    # Notification outbox
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 10.0
+    OUTBOX_CLAIM_SIZE: int = 500
+    OUTBOX_LEASE_SECONDS: int = 300
+    # How long shutdown waits for a send in progress
+    OUTBOX_STOP_TIMEOUT_SECONDS: float = 30.0
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_BASE_SECONDS: float = 30.0
+    EMAIL_BATCH_SIZE: int = 500
+    EMAIL_RATE_PER_SECOND: float = 5.0
+    EMAIL_RATE_BURST: int = 5
+    SMS_RATE_PER_SECOND: float = 10.0
+    SMS_RATE_BURST: int = 10
 
 
 # Create a single instance of the settings to be used throughout the app
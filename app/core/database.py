@@ -1,15 +1,71 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.core import query_log
 
-# For local development, we use a simple SQLite database.
-# For production on a platform like Vercel, you'd use a cloud database like PostgreSQL.
-SQLALCHEMY_DATABASE_URL = "sqlite:///./chalovote.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _database_url(url: str) -> str:
+    # Hosted Postgres providers hand out postgres:// URLs, which SQLAlchemy no longer accepts
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# For local development this is a SQLite file; in production point DATABASE_URL at PostgreSQL.
+SQLALCHEMY_DATABASE_URL = _database_url(settings.DATABASE_URL)
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _async_database_url(url: str) -> str:
+    # The async engine needs an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+
+def _engine_options(is_async: bool = False) -> dict:
+    if IS_SQLITE and is_async:
+        return {"connect_args": {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    if IS_SQLITE:
+        # The busy timeout makes concurrent writers wait for the lock instead of failing
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+
+# The sync engine serves migrations, the background workers and services run outside a request;
+# request handlers use the async engine below, which shares the same database and settings.
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
+async_engine = create_async_engine(_async_database_url(SQLALCHEMY_DATABASE_URL), **_engine_options(is_async=True))
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers keep going while a write is in progress
+        if SQLALCHEMY_DATABASE_URL not in ("sqlite://", "sqlite:///:memory:"):
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.close()
+
+# Lets the query log count the statements each request runs
+query_log.install(engine)
+query_log.install(async_engine.sync_engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit, since an async session can't lazily refresh them on attribute access
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -19,4 +75,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Async dependency for request handlers. Services written against a sync Session run
+# on it through `await db.run_sync(...)`, which keeps their queries non-blocking.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
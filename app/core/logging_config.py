@@ -0,0 +1,58 @@
+# app/core/logging_config.py
+"""
+Structured logging setup.
+
+Every module logs through `logging.getLogger(__name__)` and passes machine-readable fields
+with `extra={...}`. With LOG_FORMAT=json each record is one JSON object per line (timestamp,
+level, logger, message and those fields); with LOG_FORMAT=text the fields are appended to
+the message as key=value pairs.
+"""
+import json
+import logging
+import sys
+
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging():
+    """Installs the configured formatter on the `app` logger tree. Safe to call more than once."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    logger = logging.getLogger("app")
+    logger.handlers = [handler]
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.propagate = False
@@ -0,0 +1,99 @@
+# app/core/metrics.py
+"""
+Prometheus metrics, served in text format at /metrics.
+
+Everything the app measures is declared here so the names and labels stay in one place.
+Labels only ever take values from small fixed sets (stage, tool, model, channel, route
+template), never ids or user input.
+"""
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# Tool calls and pipeline stages take seconds to minutes, much longer than the default buckets
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "chalovote_pipeline_stage_seconds", "Duration of each recommendation pipeline stage",
+    ["stage"], buckets=_SLOW_BUCKETS)
+PIPELINE_RUNS = Counter(
+    "chalovote_pipeline_runs_total", "Recommendation pipeline runs by outcome", ["outcome"])
+TOOL_CALL_SECONDS = Histogram(
+    "chalovote_tool_call_seconds", "Duration of agent tool calls, including cache lookups",
+    ["tool"], buckets=_SLOW_BUCKETS)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "chalovote_llm_request_seconds", "LLM completion latency",
+    ["model", "purpose"], buckets=_SLOW_BUCKETS)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "chalovote_llm_first_token_seconds", "Time until a streamed LLM completion's first chunk arrived",
+    ["model", "purpose"], buckets=_SLOW_BUCKETS)
+LLM_REQUESTS = Counter(
+    "chalovote_llm_requests_total", "LLM completion calls by outcome", ["model", "purpose", "outcome"])
+LLM_TOKENS = Counter(
+    "chalovote_llm_tokens_total", "Tokens reported by the LLM provider", ["model", "purpose", "kind"])
+LLM_COST_USD = Counter(
+    "chalovote_llm_cost_usd_total", "Estimated LLM spend in US dollars", ["model", "purpose"])
+LLM_LIMITER_WAIT_SECONDS = Histogram(
+    "chalovote_llm_limiter_wait_seconds", "Time LLM calls spent queued behind the rate limiter",
+    ["model"], buckets=(0,) + _SLOW_BUCKETS)
+LLM_RATE_LIMITED = Counter(
+    "chalovote_llm_rate_limited_total", "429/quota errors returned by the LLM provider", ["model"])
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "chalovote_http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+HTTP_REQUEST_QUERIES = Histogram(
+    "chalovote_http_request_db_queries", "Database queries run per HTTP request",
+    ["method", "route"], buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+
+BALLOT_BATCH_SIZE = Histogram(
+    "chalovote_ballot_batch_size", "Ballots committed per write-behind batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+BALLOT_QUEUE_SECONDS = Histogram(
+    "chalovote_ballot_queue_seconds", "Time from a ballot being buffered to its batch being committed")
+
+NOTIFICATION_SEND_SECONDS = Histogram(
+    "chalovote_notification_send_seconds", "Provider call latency per SMS or email batch", ["channel"])
+NOTIFICATION_DELIVERY_SECONDS = Histogram(
+    "chalovote_notification_delivery_seconds", "Time from enqueueing a notification to the provider accepting it",
+    ["channel"], buckets=_SLOW_BUCKETS)
+NOTIFICATIONS = Counter(
+    "chalovote_notifications_total", "Notification send attempts by outcome", ["channel", "outcome"])
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """Times a pipeline stage into PIPELINE_STAGE_SECONDS and logs its duration."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        PIPELINE_STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        logger.info("pipeline stage finished", extra={
+            "stage": name, "outcome": outcome, "duration_ms": round(elapsed * 1000, 1), **fields})
+
+
+def timed_tool(tool: str):
+    """Decorator recording an agent tool's duration in TOOL_CALL_SECONDS."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            with TOOL_CALL_SECONDS.labels(tool=tool).time():
+                return fn(*args, **kwargs)
+        return timed
+    return wrap
+
+
+def render() -> tuple[bytes, str]:
+    """The current metrics in Prometheus text format, and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,202 @@
+# app/core/migrations.py
+"""
+Versioned schema migrations.
+
+Every migration has a version number and runs in its own transaction, which also records the
+version in the `schema_migrations` table, so each one is applied exactly once per database.
+Migrations are written to be safe on both fresh and existing databases (CREATE ... IF NOT
+EXISTS, add-column-if-missing), since a fresh database gets the current models from the
+baseline. Add new migrations at the end of the list; never edit one that has shipped.
+
+Run them with `python -m app.core.migrations`, or let the app run them on startup.
+"""
+import logging
+import time
+
+from sqlalchemy import insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.core import database
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes concurrent migrators
+_PG_LOCK_KEY = 724_091_338
+
+
+def migration(version: int, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _add_column_if_missing(conn: Connection, table: str, column: str, ddl_type: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _drop_column_if_present(conn: Connection, table: str, column: str):
+    # SQLite has ALTER TABLE ... DROP COLUMN since 3.35
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+
+def _create_table_if_missing(conn: Connection, table: str):
+    # Importing the models registers every table on Base.metadata
+    from app import models  # noqa: F401
+    database.Base.metadata.tables[table].create(bind=conn, checkfirst=True)
+
+
+@migration(1, "Baseline schema")
+def _baseline(conn: Connection):
+    # Importing the models registers every table on Base.metadata
+    from app import models  # noqa: F401
+    database.Base.metadata.create_all(bind=conn)
+
+
+@migration(2, "Index the foreign keys used by trip pages, tallies and preference aggregation")
+def _foreign_key_indexes(conn: Connection):
+    # votes.participant_id is already covered by the unique index behind _participant_vote_uc
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_participants_trip_id ON participants (trip_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_survey_responses_participant_id ON survey_responses (participant_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_recommendations_trip_id ON recommendations (trip_id)"))
+
+
+@migration(3, "Store multi-method ballot analysis on vote tallies")
+def _vote_tally_analysis(conn: Connection):
+    _add_column_if_missing(conn, "vote_tallies", "analysis", "JSON")
+
+
+@migration(4, "Let trips opt out of the shared ideation cache")
+def _trip_ideation_cache_opt_out(conn: Connection):
+    _add_column_if_missing(conn, "trips", "ideation_cache_opt_out", "BOOLEAN NOT NULL DEFAULT FALSE")
+
+
+@migration(5, "Checkpoints for resumable recommendation pipelines")
+def _pipeline_checkpoints(conn: Connection):
+    _create_table_if_missing(conn, "pipeline_checkpoints")
+
+
+@migration(6, "One survey response per participant, and per-trip preference summaries")
+def _preference_summaries(conn: Connection):
+    from itertools import groupby
+    from app import models
+    from app.services import survey_service
+
+    # Resubmitted surveys used to add rows; keep each participant's latest answers
+    conn.execute(text("DELETE FROM survey_responses WHERE id NOT IN "
+                      "(SELECT MAX(id) FROM survey_responses GROUP BY participant_id)"))
+    inspector = inspect(conn)
+    unique = [c["column_names"] for c in inspector.get_unique_constraints("survey_responses")]
+    unique += [i["column_names"] for i in inspector.get_indexes("survey_responses") if i["unique"]]
+    if ["participant_id"] not in unique:
+        conn.execute(text("CREATE UNIQUE INDEX _participant_survey_uc ON survey_responses (participant_id)"))
+
+    _create_table_if_missing(conn, "preference_summaries")
+    rows = conn.execute(
+        select(models.Participant.trip_id, models.Participant.id, models.Participant.start_location,
+               models.SurveyResponse.preferences)
+        .join(models.SurveyResponse, models.SurveyResponse.participant_id == models.Participant.id)
+        .order_by(models.Participant.trip_id, models.SurveyResponse.id)
+    ).all()
+    existing = {trip_id for (trip_id,) in conn.execute(select(models.PreferenceSummary.trip_id))}
+    for trip_id, responses in groupby(rows, key=lambda row: row[0]):
+        if trip_id not in existing:
+            conn.execute(insert(models.PreferenceSummary).values(
+                trip_id=trip_id, version=1, **survey_service.summarize(row[1:] for row in responses)))
+
+
+@migration(7, "Version trips for conditional GETs and the page cache")
+def _trip_version(conn: Connection):
+    _add_column_if_missing(conn, "trips", "version", "INTEGER NOT NULL DEFAULT 1")
+    _add_column_if_missing(conn, "trips", "updated_at", "FLOAT")
+
+
+@migration(8, "Per-participant travel rows and hotel rows instead of the recommendation details blob")
+def _recommendation_travel(conn: Connection):
+    from app import models
+    from app.services import travel_service
+
+    _create_table_if_missing(conn, "recommendation_travel")
+    _create_table_if_missing(conn, "recommendation_hotels")
+    participant_ids = {}  # trip id -> {contact info: participant id}
+    for trip_id, participant_id, contact_info in conn.execute(
+            select(models.Participant.trip_id, models.Participant.id, models.Participant.contact_info)):
+        participant_ids.setdefault(trip_id, {})[contact_info] = participant_id
+
+    for rec_id, trip_id, details in conn.execute(
+            select(models.Recommendation.id, models.Recommendation.trip_id, models.Recommendation.details)).all():
+        if not isinstance(details, dict):
+            continue
+        own, travel, hotels = travel_service.split_details(details, participant_ids.get(trip_id, {}))
+        if own == details:
+            continue
+        travel_service.add_rows(conn, rec_id, travel, hotels)
+        conn.execute(update(models.Recommendation).where(models.Recommendation.id == rec_id).values(details=own))
+
+
+@migration(9, "Drop the unused first-preference counts from vote tallies")
+def _drop_first_preferences(conn: Connection):
+    _drop_column_if_present(conn, "vote_tallies", "first_preferences")
+
+
+
+@migration(10, "At most one queued or running recommendation job per trip")
+def _one_active_job_per_trip(conn: Connection):
+    # Submits that raced before this index existed may have queued duplicates: keep the running one, else the oldest
+    conn.execute(text(
+        "UPDATE recommendation_jobs SET status = 'failed', error = 'Superseded by another job for the trip' "
+        "WHERE status IN ('queued', 'running') AND id NOT IN (SELECT id FROM ("
+        "SELECT id, ROW_NUMBER() OVER (PARTITION BY trip_id ORDER BY status = 'running' DESC, created_at, id) AS n "
+        "FROM recommendation_jobs WHERE status IN ('queued', 'running')) AS active WHERE n = 1)"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_recommendation_jobs_active_trip "
+                      "ON recommendation_jobs (trip_id) WHERE status IN ('queued', 'running')"))
+
+
+def _ensure_version_table(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at FLOAT NOT NULL)"
+        ))
+
+
+def applied_versions(engine: Engine) -> set:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {version for (version,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine = None) -> list:
+    """Applies every pending migration in order. Returns the versions that were applied."""
+    engine = engine or database.engine
+    # On an up-to-date database (every start but the first after a deploy) this read is all that runs
+    done = applied_versions(engine)
+    pending = [m for m in sorted(MIGRATIONS, key=lambda m: m[0]) if m[0] not in done]
+
+    applied = []
+    for version, description, fn in pending:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+            already = conn.execute(text("SELECT 1 FROM schema_migrations WHERE version = :version"),
+                                   {"version": version}).first()
+            if already:
+                continue
+            logger.info("Applying migration", extra={"version": version, "description": description})
+            fn(conn)
+            conn.execute(text("INSERT INTO schema_migrations (version, description, applied_at) "
+                              "VALUES (:version, :description, :applied_at)"),
+                         {"version": version, "description": description, "applied_at": time.time()})
+            applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from app.core.logging_config import configure_logging
+    configure_logging()
+    versions = run_migrations()
+    print(f"Applied migrations: {versions}" if versions else "Database schema is up to date.")
@@ -0,0 +1,73 @@
+# app/core/query_log.py
+"""
+Per-request SQL query counting.
+
+A cursor-execute listener on the engine records every statement against the QueryStats of
+the request (or `track()` block) it runs in, found through a context variable; statements run
+outside of one, e.g. by the background workers, aren't counted. The same SQL text running
+many times in one request is the signature of an N+1 lazy load, and is reported as such.
+"""
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_current_stats: ContextVar = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.statements = Counter()
+
+    def record(self, statement: str):
+        self.count += 1
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """(statement, times) for every statement that ran at least `threshold` times."""
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+
+@contextmanager
+def track():
+    """Counts the queries run inside the block (in this context and the threads it hands work to)."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def budget(max_queries: int):
+    """Declares how many queries an endpoint is expected to need; the query log warns when it's exceeded."""
+    def mark(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return mark
+
+
+def report(label: str, stats: QueryStats, query_budget: int = None, n_plus_one_threshold: int = 5):
+    """Logs the query count for `label`, flagging a blown budget and likely N+1 patterns."""
+    logger.info("Request queries", extra={"request": label, "queries": stats.count})
+    if query_budget is not None and stats.count > query_budget:
+        logger.warning("Query budget exceeded", extra={"request": label, "queries": stats.count, "budget": query_budget})
+    for statement, times in stats.repeated(n_plus_one_threshold):
+        logger.warning("Possible N+1 query", extra={
+            "request": label, "times": times, "statement": " ".join(statement.split())[:200]})
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement)
+
+
+def install(engine: Engine):
+    event.listen(engine, "before_cursor_execute", _count_query)
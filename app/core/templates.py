@@ -0,0 +1,52 @@
+# app/core/templates.py
+"""
+The one Jinja environment every page renders with.
+
+Templates are compiled on first use. With TEMPLATE_BYTECODE_CACHE_ENABLED the compiled code is
+also written to TEMPLATE_BYTECODE_CACHE_DIR, so the next process (e.g. a serverless cold start)
+loads it instead of compiling again. Entries are keyed by the template's source, so an edited
+template is simply compiled afresh. `python -m app.core.templates` fills the cache ahead of
+time, e.g. in a build step with TEMPLATE_BYTECODE_CACHE_DIR pointing into the deployment.
+"""
+import os
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from app.core.config import settings
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            # e.g. a read-only deployment directory; the template is compiled again by the next process
+            pass
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache | None:
+    if not settings.TEMPLATE_BYTECODE_CACHE_ENABLED:
+        return None
+    directory = settings.TEMPLATE_BYTECODE_CACHE_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Without a directory jinja picks a private one in the temp dir
+    return _BytecodeCache(directory or None)
+
+
+templates = Jinja2Templates(directory=TEMPLATE_DIR, bytecode_cache=_bytecode_cache())
+
+
+def precompile() -> int:
+    """Compiles every template into the bytecode cache. Returns how many were compiled."""
+    names = templates.env.list_templates()
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+
+if __name__ == "__main__":
+    print(f"Compiled {precompile()} templates.")
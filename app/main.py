@@ -1,25 +1,79 @@
 from fastapi import FastAPI, Request
-from .core import database
-from .api import trips, surveys, voting
+import time
+
+from .core import database, metrics, migrations, query_log
+from .core.logging_config import configure_logging
+from .core.config import settings
+from .core.templates import templates
+from .api import trips, surveys, voting, ops
+from .services import ballot_buffer, job_service, notification_service
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 
 
-# This line tells SQLAlchemy to create all the tables based on your models
-# It's good for development, but for production, a tool like Alembic is recommended
-database.Base.metadata.create_all(bind=database.engine)
+configure_logging()
 
 app = FastAPI(title="ChaloVote")
 
+
+@app.on_event("startup")
+def apply_migrations():
+    # Brings the schema up to date (creating it on a fresh database) before anything queries it
+    if settings.MIGRATE_ON_STARTUP:
+        migrations.run_migrations(database.engine)
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    # Picks up recommendation jobs that were queued or cut off by the last restart
+    job_service.start_worker()
+    # Delivers notifications queued in the outbox, including any left over from the last run
+    notification_service.get_dispatcher().start()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    job_service.stop_worker()
+    notification_service.get_dispatcher().stop()
+    # Commits any ballots still waiting in the write-behind buffer
+    ballot_buffer.stop_buffer()
+
+
+@app.middleware("http")
+async def measure_requests(request: Request, call_next):
+    # Latency and query count per route; with QUERY_LOG_ENABLED also flags budgets blown by N+1 lazy loads
+    started = time.perf_counter()
+    with query_log.track() as stats:
+        response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.HTTP_REQUEST_SECONDS.labels(method=request.method, route=route, status=response.status_code).observe(
+        time.perf_counter() - started)
+    metrics.HTTP_REQUEST_QUERIES.labels(method=request.method, route=route).observe(stats.count)
+
+    if settings.QUERY_LOG_ENABLED:
+        endpoint = request.scope.get("endpoint")
+        query_log.report(f"{request.method} {request.url.path}", stats,
+                         query_budget=getattr(endpoint, "query_budget", None),
+                         n_plus_one_threshold=settings.QUERY_N_PLUS_ONE_THRESHOLD)
+        response.headers["X-Query-Count"] = str(stats.count)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus scrape endpoint
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 # Include the routes from your trips API file
 app.include_router(trips.router)
 app.include_router(surveys.router)
 app.include_router(voting.router)
+app.include_router(ops.router)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
-templates = Jinja2Templates(directory="app/templates")
 @app.get("/", response_class=HTMLResponse)
 def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -1,3 +1,7 @@
 
 #from .trip import Trip, Participant, SurveyResponse, Recommendation
-from .trip import *
\ No newline at end of file
+from .trip import *
+from .cache import *
+from .job import *
+from .notification import *
+from .pipeline import *
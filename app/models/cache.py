@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, JSON, Float
+from app.core.database import Base
+
+
+class ToolCacheEntry(Base):
+    __tablename__ = "tool_cache"
+
+    # "<tool>:<normalized args>", see app.services.tool_cache.make_key
+    key = Column(String, primary_key=True)
+    tool = Column(String, index=True)
+    value = Column(JSON)
+    # Unix timestamp after which the entry is stale
+    expires_at = Column(Float, index=True)
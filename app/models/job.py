@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Float, Index, text
+from app.core.database import Base
+
+
+class RecommendationJob(Base):
+    __tablename__ = "recommendation_jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex
+    trip_id = Column(Integer, ForeignKey("trips.id"), index=True)
+    # Status can be: 'queued', 'running', 'completed', 'failed'
+    status = Column(String, default="queued", index=True)
+    # Pipeline stage: 'queued', 'ideation', 'enrichment', 'summary', 'persisted'
+    stage = Column(String, default="queued")
+    progress_done = Column(Integer, default=0)
+    progress_total = Column(Integer, default=0)
+    recommendation_ids = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+
+    # A running job whose lease has expired belonged to a worker that died; it can be claimed again
+    lease_expires_at = Column(Float, nullable=True)
+    created_at = Column(Float)
+    updated_at = Column(Float)
+
+    # At most one queued or running job per trip, so concurrent submits can't start two pipelines
+    __table_args__ = (
+        Index("ix_recommendation_jobs_active_trip", "trip_id", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Float
+from app.core.database import Base
+
+
+class OutboxMessage(Base):
+    """A notification waiting to be (or already) delivered by the outbox dispatcher."""
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Channel can be: 'sms', 'email'
+    channel = Column(String)
+    recipient = Column(String)
+    subject = Column(String, nullable=True)
+    body = Column(String)
+    # Status can be: 'pending', 'sending', 'sent', 'failed'
+    status = Column(String, default="pending", index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, index=True)
+    last_error = Column(String, nullable=True)
+    provider_message_id = Column(String, nullable=True)
+
+    # Set when a dispatcher claims the message; an expired lease means that dispatcher died
+    claim_token = Column(String, nullable=True, index=True)
+    lease_expires_at = Column(Float, nullable=True)
+    created_at = Column(Float)
+    sent_at = Column(Float, nullable=True)
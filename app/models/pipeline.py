@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Float, UniqueConstraint
+from app.core.database import Base
+
+
+class PipelineCheckpoint(Base):
+    """A finished piece of a trip's recommendation pipeline, kept so a failed run can resume from it."""
+    __tablename__ = "pipeline_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    trip_id = Column(Integer, ForeignKey("trips.id"), index=True)
+    # Hash of the preferences and travellers the run started from; checkpoints of other inputs are stale
+    inputs_key = Column(String)
+    # Stage can be: 'ideas', 'destination' (one per destination, key = destination name),
+    # 'recommendation' (id of a persisted recommendation, key = destination name)
+    stage = Column(String)
+    key = Column(String, default="")
+    data = Column(JSON)
+    created_at = Column(Float)
+    __table_args__ = (UniqueConstraint('trip_id', 'stage', 'key', name='_checkpoint_stage_key_uc'),)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Boolean, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy import UniqueConstraint
 from app.core.database import Base
@@ -11,6 +11,12 @@ class Trip(Base):
     name = Column(String, index=True)
     # Status can be: 'planning', 'voting', 'completed'
     status = Column(String, default="planning")
+    # Always brainstorm fresh destination ideas instead of reusing ones cached for a similar group
+    ideation_cache_opt_out = Column(Boolean, default=False, nullable=False)
+    # Bumped on every write to the trip, its recommendations, votes or surveys (see trip_service.bump_version);
+    # the trip pages are cached and revalidated against it
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    updated_at = Column(Float, nullable=True)
 
     winner_recommendation_id = Column(Integer, ForeignKey("recommendations.id"), nullable=True)
     recommendations = relationship("Recommendation", foreign_keys="[Recommendation.trip_id]", back_populates="trip")
@@ -26,7 +32,7 @@ class Participant(Base):
     id = Column(Integer, primary_key=True, index=True)
     # You can store phone numbers or emails here for notifications
     contact_info = Column(String, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"))
+    trip_id = Column(Integer, ForeignKey("trips.id"), index=True)
     start_location = Column(String, nullable=True)
 
     # This links a Participant back to its Trip
@@ -39,28 +45,92 @@ class SurveyResponse(Base):
     __tablename__ = "survey_responses"
 
     id = Column(Integer, primary_key=True, index=True)
-    participant_id = Column(Integer, ForeignKey("participants.id"))
+    participant_id = Column(Integer, ForeignKey("participants.id"), index=True)
 
     # We use JSON to store flexible survey data
     preferences = Column(JSON)
 
     participant = relationship("Participant", back_populates="survey_response")
+    # One response per participant; resubmitting replaces it
+    __table_args__ = (UniqueConstraint('participant_id', name='_participant_survey_uc'),)
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"))
+    trip_id = Column(Integer, ForeignKey("trips.id"), index=True)
     destination_name = Column(String)
     reason = Column(String)
     estimated_budget = Column(String)
-    details = Column(JSON, nullable=True)  # <-- ADD THIS LINE
+    # Fields of the recommendation itself (e.g. estimated_total_cost); per-participant travel
+    # estimates and hotels live in recommendation_travel and recommendation_hotels
+    details = Column(JSON, nullable=True)
 
     trip = relationship("Trip", back_populates="recommendations", foreign_keys=[trip_id])
+    hotels = relationship("RecommendationHotel", order_by="RecommendationHotel.position")
+
+
+class RecommendationTravel(Base):
+    """One participant's route, fuel and flight estimates for one recommendation."""
+    __tablename__ = "recommendation_travel"
+    id = Column(Integer, primary_key=True)
+    # Already indexed through _recommendation_participant_uc
+    recommendation_id = Column(Integer, ForeignKey("recommendations.id"))
+    participant_id = Column(Integer, ForeignKey("participants.id"), index=True)
+    # The participant's start location when the estimate was made; the map shows directions from it
+    origin = Column(String)
+    route_text = Column(String)
+    distance_km = Column(Integer, nullable=True)
+    estimated_fuel_cost = Column(String)
+    flight_estimate = Column(String)
+    __table_args__ = (UniqueConstraint('recommendation_id', 'participant_id', name='_recommendation_participant_uc'),)
+
+
+class RecommendationHotel(Base):
+    """A stay listed for a recommendation, in the order it was listed."""
+    __tablename__ = "recommendation_hotels"
+    id = Column(Integer, primary_key=True)
+    recommendation_id = Column(Integer, ForeignKey("recommendations.id"), index=True)
+    # Source can be: 'top_stay' (picked by the final summary, shown on the pages) or 'search' (the hotel lookup)
+    source = Column(String)
+    position = Column(Integer)
+    name = Column(String)
+    rating = Column(String, nullable=True)
+    price = Column(String, nullable=True)
 
 class Vote(Base):
     __tablename__ = "votes"
     id = Column(Integer, primary_key=True, index=True)
+    # Already indexed through _participant_vote_uc
     participant_id = Column(Integer, ForeignKey("participants.id"))
     # Storing ranked list of recommendation IDs, e.g., [3, 1, 2]
     ranked_choices = Column(JSON)
-    __table_args__ = (UniqueConstraint('participant_id', name='_participant_vote_uc'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('participant_id', name='_participant_vote_uc'),)
+
+
+class VoteTally(Base):
+    """Per-trip instant-runoff state, maintained as ballots come in so results pages don't re-tally."""
+    __tablename__ = "vote_tallies"
+    trip_id = Column(Integer, ForeignKey("trips.id"), primary_key=True)
+    ballot_count = Column(Integer, default=0)
+    # Bumped whenever a ballot is cast or replaced; `rounds` and the winner are valid for tallied_version
+    ballot_version = Column(Integer, default=0)
+    tallied_version = Column(Integer, default=-1)
+    rounds = Column(JSON, nullable=True)
+    winner_recommendation_id = Column(Integer, nullable=True)
+    # Borda/Condorcet/Schulze results next to IRV, see app.services.ballots.BallotAnalysis.to_dict
+    analysis = Column(JSON, nullable=True)
+
+
+class PreferenceSummary(Base):
+    """Per-trip aggregate of the survey answers, maintained as surveys come in so generation reads one row."""
+    __tablename__ = "preference_summaries"
+    trip_id = Column(Integer, ForeignKey("trips.id"), primary_key=True)
+    # {"<interest>": respondents listing it}, {"<budget>": respondents choosing it}, {"<start location>": respondents}
+    interest_counts = Column(JSON)
+    budget_counts = Column(JSON)
+    location_counts = Column(JSON)
+    # Ids of the participants who have answered, for the "who hasn't answered yet" view
+    respondent_ids = Column(JSON)
+    response_count = Column(Integer, default=0)
+    # Bumped on every submission, which takes the write lock before anything is read
+    version = Column(Integer, default=0)
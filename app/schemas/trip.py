@@ -39,10 +39,12 @@ class TripBase(BaseModel):
 class TripCreate(TripBase):
     # When creating a new trip, we expect a list of participants
     participants: List[ParticipantCreate]
+    ideation_cache_opt_out: bool = False
 
 class Trip(TripBase):
     id: int
     status: str
+    ideation_cache_opt_out: bool = False
     # When we retrieve a trip, we want to see its participants
     participants: List[Participant] = []
     recommendations: List[Recommendation] = []
@@ -57,3 +59,16 @@ class SurveyResponseCreate(BaseModel):
 
 class VoteCreate(BaseModel):
     ranked_choices: List[int] # A list of recommendation IDs in order of preference
+
+class RecommendationJob(BaseModel):
+    id: str
+    trip_id: int
+    status: str
+    stage: str
+    progress_done: int
+    progress_total: int
+    recommendation_ids: Optional[List[int]] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,71 +1,176 @@
 # app/services/agent_service.py
-import litellm
-import time
-import json
+import logging
+from app.core import metrics
 from app.core.config import settings
+from app.services import geo_service
+from app.services import llm
+from app.services import tool_cache
 
-def _ask_gemini(question: str) -> str | None:
-    """A generic internal tool to ask Gemini a question."""
-    if not settings.GEMINI_API_KEY:
-        print("ERROR: Gemini API key not found for agent tool.")
+logger = logging.getLogger(__name__)
+
+def _ask_gemini(question: str, tool: str) -> str | None:
+    """A generic internal tool to ask Gemini a question. `tool` labels the call in the LLM metrics."""
+    if not llm.available():
+        logger.error("Gemini API key not found for agent tool", extra={"tool": tool})
         return None
     try:
-        print(f"AGENT TOOL: Asking Gemini -> '{question}'")
-        time.sleep(2)
-        response = litellm.completion(
-            model="vertex_ai/gemini-2.5-flash",
+        logger.debug("Asking Gemini", extra={"tool": tool, "question": question})
+        response = llm.completion(
             messages=[{"role": "user", "content": question}],
-            api_key=settings.GEMINI_API_KEY
+            purpose=tool,
+            timeout=settings.AGENT_TOOL_TIMEOUT_SECONDS
         )
-        return response.choices[0].message.content
+        return llm.response_text(response)
     except Exception as e:
-        print(f"Error calling Gemini tool: {e}")
+        logger.warning("Error calling Gemini tool", extra={"tool": tool, "error": str(e)})
         return None
 
-def get_route_info(origin_city: str, dest_city: str):
-    """Gets route distance and duration from Gemini."""
+def _fetch_route_info(origin_city: str, dest_city: str) -> dict | None:
     question = f"""What is the driving distance in kilometers and estimated duration by car from {origin_city}, India to {dest_city}, India? 
 Respond ONLY with a valid JSON object with keys "distance_km" (int) and "duration_text" (str)."""
-    response_text = _ask_gemini(question)
+    response_text = _ask_gemini(question, "route_info")
     try:
-        data = json.loads(response_text)
-        return {
-            "text": f"Driving is {data.get('distance_km')} km, about {data.get('duration_text')}.",
-            "distance_km": data.get('distance_km', 0)
-        }
+        data = llm.extract_json(response_text, dict)
+        return _route_info(data.get('distance_km'), data.get('duration_text'))
     except Exception:
-        return {"text": response_text or "Could not retrieve route info.", "distance_km": 0}
+        return None
 
-def get_flight_prices(origin_city: str, dest_city: str):
-    """Gets estimated flight prices from Gemini."""
+def _route_info(distance_km, duration_text) -> dict:
+    return {
+        "text": f"Driving is {distance_km} km, about {duration_text}.",
+        "distance_km": distance_km or 0
+    }
+
+@metrics.timed_tool("route_info")
+def get_route_info(origin_city: str, dest_city: str):
+    """Gets route distance and duration from the gazetteer, or from Gemini for places it doesn't know."""
+    local = geo_service.route_infos([origin_city], dest_city).get(origin_city)
+    if local:
+        return _route_info(*local)
+    route_info = tool_cache.get_or_fetch("route_info", [origin_city, dest_city],
+                                         lambda: _fetch_route_info(origin_city, dest_city))
+    return route_info or {"text": "Could not retrieve route info.", "distance_km": 0}
+
+def _fetch_flight_prices(origin_city: str, dest_city: str) -> str | None:
     question = f"""What are the estimated budget-friendly flight prices for one person from {origin_city} to {dest_city}, India? 
 Respond ONLY with a valid JSON object with one key 'price_estimate' (str). Example: {{"price_estimate": "Around ₹4,500 - ₹6,000"}}"""
-    response_text = _ask_gemini(question)
+    response_text = _ask_gemini(question, "flight_prices")
     try:
-        return json.loads(response_text).get("price_estimate", "Estimate not available.")
+        return llm.extract_json(response_text, dict, "price_estimate").get("price_estimate")
     except Exception:
-        return response_text or "Estimate not available."
+        return None
 
-def get_hotel_recommendations(dest_city: str):
-    """Gets top 4 budget hotel/hostel recommendations from Gemini."""
+@metrics.timed_tool("flight_prices")
+def get_flight_prices(origin_city: str, dest_city: str):
+    """Gets estimated flight prices from Gemini."""
+    price_estimate = tool_cache.get_or_fetch("flight_prices", [origin_city, dest_city],
+                                             lambda: _fetch_flight_prices(origin_city, dest_city))
+    return price_estimate or "Estimate not available."
+
+def _fetch_hotel_recommendations(dest_city: str) -> list | None:
     question = f"""List the top 4 budget-friendly hostels or guesthouses in {dest_city}, India, suitable for college students. Order them by rating. 
 Respond ONLY with a valid JSON list of objects. Each object must have keys 'name', 'rating' (float or string), and 'estimated_price' (str)."""
-    response_text = _ask_gemini(question)
+    response_text = _ask_gemini(question, "hotel_recommendations")
     try:
-        # Use regex to find the JSON list, as Gemini might add text
-        import re
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(0))
-        return [{"name": "Could not parse hotel data.", "rating": "N/A", "price": "N/A"}]
+        # Gemini might add text around the JSON list
+        return llm.extract_json(response_text, list)
     except Exception:
-        return [{"name": "Could not retrieve hotel data.", "rating": "N/A", "price": "N/A"}]
+        return None
 
-def get_petrol_price(city: str) -> float:
-    """Gets petrol price for a city from Gemini."""
+@metrics.timed_tool("hotel_recommendations")
+def get_hotel_recommendations(dest_city: str):
+    """Gets top 4 budget hotel/hostel recommendations from Gemini."""
+    hotels = tool_cache.get_or_fetch("hotel_recommendations", [dest_city],
+                                     lambda: _fetch_hotel_recommendations(dest_city))
+    return hotels or [{"name": "Could not retrieve hotel data.", "rating": "N/A", "price": "N/A"}]
+
+def _fetch_petrol_price(city: str) -> float | None:
     question = f"What is the current price of 1 litre of petrol in {city}, India? Respond with only the number."
-    response_text = _ask_gemini(question)
+    response_text = _ask_gemini(question, "petrol_price")
     try:
         return float(response_text)
     except (ValueError, TypeError):
-        return 100.0 # Fallback price
\ No newline at end of file
+        return None
+
+@metrics.timed_tool("petrol_price")
+def get_petrol_price(city: str) -> float:
+    """Gets petrol price for a city from Gemini."""
+    price = tool_cache.get_or_fetch("petrol_price", [city], lambda: _fetch_petrol_price(city))
+    return price if price is not None else 100.0 # Fallback price
+
+def _ask_travel_batch(origins: list, dest_city: str) -> dict:
+    """Asks Gemini for route, flight and petrol data for several origins at once. Returns {origin: data}."""
+    origin_lines = "\n".join(f"- {origin}" for origin in origins)
+    question = f"""For each starting city below, estimate travel to {dest_city}, India:
+the driving distance in kilometers and duration by car, the budget-friendly flight price for one person,
+and the current price of 1 litre of petrol in the starting city.
+
+Starting cities:
+{origin_lines}
+
+Respond ONLY with a valid JSON object that maps each starting city, written exactly as above, to an object with keys
+"distance_km" (int), "duration_text" (str), "flight_price_estimate" (str) and "petrol_price" (float)."""
+    response_text = _ask_gemini(question, "travel_batch")
+    try:
+        data = llm.extract_json(response_text, dict)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    # Match the answer back to our origins even if Gemini changed the spelling or case
+    by_key = {tool_cache.normalize_place(name): entry for name, entry in data.items() if isinstance(entry, dict)}
+    return {origin: by_key[tool_cache.normalize_place(origin)]
+            for origin in origins if tool_cache.normalize_place(origin) in by_key}
+
+@metrics.timed_tool("travel_batch")
+def get_travel_info_batch(origins: list, dest_city: str) -> dict:
+    """
+    Batched version of get_route_info, get_flight_prices and get_petrol_price for one destination.
+    Origins are deduplicated, routes come from the gazetteer where it knows both places, cached
+    results are reused, and everything still missing is requested in a single Gemini call. Entries the batch answer doesn't cover fall back to the per-pair tools.
+    Returns {origin: {"route_info": dict, "flight_estimate": str, "petrol_price": float}} for every origin.
+    """
+    unique_origins = {}
+    for origin in origins:
+        unique_origins.setdefault(tool_cache.normalize_place(origin), origin)
+
+    local_routes = geo_service.route_infos(list(unique_origins.values()), dest_city)
+    results = {}
+    to_ask = []
+    for origin in unique_origins.values():
+        if origin in local_routes:
+            route = _route_info(*local_routes[origin])
+        else:
+            _, route = tool_cache.get("route_info", [origin, dest_city])
+        _, flight = tool_cache.get("flight_prices", [origin, dest_city])
+        _, petrol = tool_cache.get("petrol_price", [origin])
+        results[origin] = {"route_info": route, "flight_estimate": flight, "petrol_price": petrol}
+        if route is None or flight is None or petrol is None:
+            to_ask.append(origin)
+
+    answers = _ask_travel_batch(to_ask, dest_city) if to_ask else {}
+    for origin in to_ask:
+        answer = answers.get(origin, {})
+        info = results[origin]
+        try:
+            if info["route_info"] is None and isinstance(answer.get("distance_km"), (int, float)) and answer.get("duration_text"):
+                info["route_info"] = _route_info(answer["distance_km"], answer["duration_text"])
+                tool_cache.put("route_info", [origin, dest_city], info["route_info"])
+            if info["flight_estimate"] is None and isinstance(answer.get("flight_price_estimate"), str):
+                info["flight_estimate"] = answer["flight_price_estimate"]
+                tool_cache.put("flight_prices", [origin, dest_city], info["flight_estimate"])
+            if info["petrol_price"] is None and answer.get("petrol_price") is not None:
+                info["petrol_price"] = float(answer["petrol_price"])
+                tool_cache.put("petrol_price", [origin], info["petrol_price"])
+        except (ValueError, TypeError):
+            pass
+
+        # Whatever the batch answer didn't cover is fetched one pair at a time
+        if info["route_info"] is None:
+            info["route_info"] = get_route_info(origin, dest_city)
+        if info["flight_estimate"] is None:
+            info["flight_estimate"] = get_flight_prices(origin, dest_city)
+        if info["petrol_price"] is None:
+            info["petrol_price"] = get_petrol_price(origin)
+
+    return {origin: results[unique_origins[tool_cache.normalize_place(origin)]] for origin in origins}
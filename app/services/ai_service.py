@@ -1,11 +1,23 @@
 import json
-import re
+import logging
 from sqlalchemy.orm import Session
+from app.core import metrics
 from app.core.config import settings
 from app import models
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from app.services import agent_service
-import litellm
+from app.services import checkpoint_service
+from app.services import event_service
+from app.services import ideation_cache
+from app.services import llm
+from app.services import survey_service
+from app.services import travel_service
+from app.services import trip_service
+from app.services import voting_service
+from app.services.tool_cache import normalize_place
+
+logger = logging.getLogger(__name__)
 
 # Updated mock response for the India-focused agent
 MOCK_RESPONSE = {
@@ -21,29 +33,21 @@ MOCK_RESPONSE = {
 
 
 def _aggregate_preferences(trip_id: int, db: Session) -> dict:
-    """Gathers and combines all survey responses and participant locations for a trip."""
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
-    if not trip:
-        return {}
-
-    start_locations = [p.start_location for p in trip.participants if p.start_location]
-    responses = db.query(models.SurveyResponse).join(models.Participant).filter(
-        models.Participant.trip_id == trip_id).all()
+    """Combines the trip's survey answers from its maintained preference summary (one row)."""
+    summary = survey_service.preference_summary(trip_id, db)
+    start_locations = list(summary["location_counts"])
 
-    if not responses:
+    if not summary["response_count"]:
         return {
             "budget": "Moderate",
             "interests": ["hills", "beach"],
             "start_locations": start_locations
         }
 
-    all_interests = []
-    for res in responses:
-        all_interests.extend(res.preferences.get("interests", []))
-
+    budgets = Counter(summary["budget_counts"]).most_common(1)
     return {
-        "interests": [item for item, count in Counter(all_interests).most_common(5)],
-        "budget": responses[0].preferences.get("budget", "Moderate"),
+        "interests": [item for item, count in Counter(summary["interest_counts"]).most_common(5)],
+        "budget": budgets[0][0] if budgets else "Moderate",
         "start_locations": start_locations
     }
 
@@ -86,117 +90,339 @@ Each object must have keys: "destination", "reason", "estimated_total_cost", "to
     return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
 
 
-def generate_recommendations(trip_id: int, db: Session):
-    """Generates enriched travel recommendations using Gemini for all AI tasks."""
+# Placeholders the enrichment uses when a tool call fails
+_NO_HOTELS = [{"name": "Could not retrieve hotel data.", "rating": "N/A", "price": "N/A"}]
+_NO_ROUTE = {"text": "Could not retrieve route info.", "distance_km": 0}
+
+
+def _report(progress, stage: str, done: int = 0, total: int = 0):
+    """Tells the caller (e.g. a background job) which pipeline stage we're in. Never breaks the pipeline."""
+    if progress is None:
+        return
+    try:
+        progress(stage, done, total)
+    except Exception as e:
+        logger.warning("Error reporting pipeline progress", extra={"error": str(e)})
+
+
+def _publish(trip_id: int, event_type: str, data: dict):
+    """Streams a pipeline event to the trip's SSE subscribers. Never breaks the pipeline."""
+    try:
+        event_service.publish(trip_id, event_type, data)
+    except Exception as e:
+        logger.warning("Error publishing pipeline event", extra={"event": event_type, "error": str(e)})
+
+
+def _tool_result(future, fallback):
+    """
+    Waits for a tool call submitted to the enrichment pool, falling back if it failed or took
+    longer than AGENT_TOOL_TIMEOUT_SECONDS (e.g. a provider that ignores its own timeout, or a
+    long wait for the rate limiter).
+    """
+    try:
+        return future.result(timeout=settings.AGENT_TOOL_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        logger.warning("Agent tool call timed out", extra={"timeout_seconds": settings.AGENT_TOOL_TIMEOUT_SECONDS})
+        return fallback
+    except Exception as e:
+        logger.warning("Error in agent tool call", extra={"error": str(e)})
+        return fallback
+
+
+def _enrich_destinations(destination_ideas: list, travellers: list, on_enriched=None) -> list:
+    """
+    Runs the hotel lookup for every destination and the route/fuel/flight lookups for every
+    (destination, traveller) pair concurrently, then assembles them in the original order.
+    `travellers` is a list of (contact_info, start_location) tuples.
+    With AGENT_BATCH_TOOL_CALLS the travel lookups are made once per destination for all origins.
+    `on_enriched(details, done, total)` is called as each destination is assembled.
+    """
+    origins = [origin for _, origin in travellers if origin]
+    pool = ThreadPoolExecutor(max_workers=max(1, settings.AGENT_MAX_CONCURRENCY))
+    try:
+        pending = []
+        for idea in destination_ideas:
+            dest_name = f"{idea['name']}, {idea['state']}"
+            hotels = pool.submit(agent_service.get_hotel_recommendations, dest_name)
+
+            if settings.AGENT_BATCH_TOOL_CALLS:
+                batch = pool.submit(agent_service.get_travel_info_batch, origins, dest_name) if origins else None
+                lookups = [(contact_info, origin, batch) for contact_info, origin in travellers if origin]
+            else:
+                lookups = []
+                for contact_info, origin in travellers:
+                    if origin:
+                        lookups.append((
+                            contact_info,
+                            origin,
+                            (pool.submit(agent_service.get_route_info, origin, dest_name),
+                             pool.submit(agent_service.get_petrol_price, origin),
+                             pool.submit(agent_service.get_flight_prices, origin, dest_name)),
+                        ))
+            pending.append((dest_name, hotels, lookups))
+
+        enriched_destinations = []
+        for dest_name, hotels, lookups in pending:
+            hotel_recs = _tool_result(hotels, _NO_HOTELS)
+            enriched_idea_details = {"destination": dest_name, "top_4_hotels": hotel_recs}
+
+            travel_details_by_person = {}
+            for contact_info, origin, calls in lookups:
+                if settings.AGENT_BATCH_TOOL_CALLS:
+                    info = _tool_result(calls, {}).get(origin, {})
+                    route_info = info.get("route_info") or _NO_ROUTE
+                    petrol_price = info.get("petrol_price") or 100.0
+                    flight_info = info.get("flight_estimate") or "Estimate not available."
+                else:
+                    route, petrol, flight = calls
+                    route_info = _tool_result(route, _NO_ROUTE)
+                    petrol_price = _tool_result(petrol, 100.0)
+                    flight_info = _tool_result(flight, "Estimate not available.")
+
+                fuel_cost = round((route_info.get('distance_km', 0) / 15) * petrol_price) * 2  # Return trip
+
+                # The map URL is built from the origin when a page is rendered (travel_service.map_url)
+                travel_details_by_person[contact_info] = {
+                    "origin": origin,
+                    "route_text": route_info.get('text'),
+                    "distance_km": route_info.get('distance_km'),
+                    "estimated_fuel_cost": f"~₹{fuel_cost}",
+                    "flight_estimate": flight_info,
+                }
+            enriched_idea_details["travel_info"] = travel_details_by_person
+            enriched_destinations.append(enriched_idea_details)
+            if on_enriched:
+                on_enriched(enriched_idea_details, len(enriched_destinations), len(pending))
+    finally:
+        # Don't wait for a tool call that timed out; it finishes (or not) on its own thread
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return enriched_destinations
+
+
+def _brainstorm_destinations(aggregated_prefs: dict) -> list:
+    """First LLM call: destination ideas ({"name", "state"}) for the group's preferences."""
+    logger.info("Getting initial destination ideas using Gemini")
+    initial_messages = create_initial_ideas_prompt(aggregated_prefs)
+    response_text = llm.response_text(llm.completion(initial_messages, purpose="ideation"))
+    logger.debug("Raw AI response (initial ideas)", extra={"response": response_text})
+    return llm.extract_json(response_text, dict, "destinations").get("destinations", [])
+
+
+def _match_destination(item: dict, remaining: dict):
+    """
+    The name in `remaining` (enriched destination name -> details) a summary item is about: the
+    same name, or the same place without its state ("Goa" for "Goa, Goa"). None if it's unknown.
+    """
+    name = normalize_place(item.get("destination") or "")
+    if not name:
+        return None
+    matches = [key for key in remaining if normalize_place(key) == name]
+    if not matches:
+        matches = [key for key in remaining if normalize_place(key).split(",")[0] == name]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _summarize(enriched_destinations: list, on_recommendation) -> None:
+    """
+    Second LLM call: the final recommendations, streamed. Each one is handed to
+    on_recommendation(item, enriched_details) as soon as its object closes in the answer, so the
+    first destination can be shown while the rest are still being written. Items are matched to
+    their destination by name, whatever order they come in; an unknown or repeated one is
+    skipped. Destinations the answer didn't cover (it was cut off, or an item wasn't valid JSON)
+    are asked for again, up to PIPELINE_SUMMARY_ATTEMPTS answers.
+    """
+    remaining = {details["destination"]: details for details in enriched_destinations}
+    for attempt in range(max(1, settings.PIPELINE_SUMMARY_ATTEMPTS)):
+        logger.info("Generating final summary using Gemini", extra={"attempt": attempt + 1, "destinations": len(remaining)})
+        answer = llm.StreamedArray("recommendations")
+        for text in llm.stream_completion(create_final_summary_prompt(list(remaining.values())), purpose="summary"):
+            for item in answer.feed(text):
+                name = _match_destination(item, remaining)
+                if name is None:
+                    logger.warning("Skipping a recommendation for an unknown destination",
+                                   extra={"destination": item.get("destination")})
+                    continue
+                on_recommendation(item, remaining.pop(name))
+        logger.debug("Raw AI response (final summary)", extra={"response": answer.text})
+        if not remaining:
+            return
+        logger.warning("Final summary is missing destinations", extra={
+            "attempt": attempt + 1, "missing": list(remaining), "complete_answer": answer.closed})
+    raise ValueError(f"The final summary is missing {len(remaining)} of {len(enriched_destinations)} recommendations")
+
+
+def _add_recommendation(db: Session, trip_id: int, item: dict, enriched_details: dict, participant_ids: dict):
+    """
+    Adds one recommendation from the summary, with its travel and hotel rows. New candidates
+    invalidate the trip's tally and its cached pages. Caller commits.
+    """
+    details_data = dict(enriched_details)
+    details_data['reason'] = item.get("reason")
+    details_data['estimated_total_cost'] = item.get("estimated_total_cost")
+    details_data['top_stays'] = item.get("top_stays")
+    # Travel info and hotels go to their own tables, one row per participant / stay
+    details_data, travel, hotels = travel_service.split_details(details_data, participant_ids)
+
+    rec = models.Recommendation(
+        trip_id=trip_id,
+        destination_name=item.get("destination"),
+        reason=item.get("reason"),
+        estimated_budget=item.get("budget_tier"),
+        details=details_data
+    )
+    db.add(rec)
+    db.flush()
+    travel_service.add_rows(db, rec.id, travel, hotels)
+    voting_service.invalidate_tally(trip_id, db)
+    trip_service.bump_version(db, trip_id)
+    return rec
+
+
+def _publish_recommendation(trip_id: int, rec):
+    _publish(trip_id, "recommendation", {
+        "id": rec.id,
+        "destination_name": rec.destination_name,
+        "reason": rec.reason,
+        "estimated_budget": rec.estimated_budget,
+        "estimated_total_cost": (rec.details or {}).get("estimated_total_cost"),
+    })
+
+
+def _is_complete(details: dict) -> bool:
+    """False if any tool fell back to its placeholder, so a resumed run asks for this destination again."""
+    if details.get("top_4_hotels") == _NO_HOTELS:
+        return False
+    return all(info.get("route_text") != _NO_ROUTE["text"] for info in details.get("travel_info", {}).values())
+
+
+class PipelineIncomplete(Exception):
+    """A pipeline stage failed; the work finished so far is checkpointed and the next run resumes from it."""
+
+    def __init__(self, stage: str, cause: Exception):
+        self.stage = stage
+        super().__init__(f"The recommendation pipeline failed during {stage}: {cause}")
+
+
+class _Checkpoint:
+    """Binds the checkpoint store to one trip and one set of inputs."""
+
+    def __init__(self, db: Session, trip_id: int, inputs_key: str):
+        self.db, self.trip_id, self.inputs_key = db, trip_id, inputs_key
+        self.saved = checkpoint_service.load(db, trip_id, inputs_key)
+
+    def get(self, stage_key: tuple):
+        return self.saved.get(stage_key)
+
+    def save(self, stage: str, data, item: str = ""):
+        checkpoint_service.save(self.db, self.trip_id, self.inputs_key, stage, data, item)
+        self.saved[(stage, item)] = data
+
+
+def generate_recommendations(trip_id: int, db: Session, progress=None):
+    """
+    Generates enriched travel recommendations using Gemini for all AI tasks.
+    `progress`, if given, is called as progress(stage, done, total) as the pipeline advances.
+
+    Every stage is checkpointed (see checkpoint_service): the ideas, each enriched destination
+    and each recommendation, which is saved and published as soon as the streamed summary
+    contains it. If a stage fails, PipelineIncomplete is raised and the next run for the same
+    preferences resumes from the last checkpoint, re-asking only for what's missing.
+    Without a Gemini key (and without the fake LLM provider) the mock recommendations are used.
+    """
     trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
     if not trip: return None
 
-    aggregated_prefs = _aggregate_preferences(trip_id, db)
-    aggregated_prefs["participants_count"] = len(trip.participants)
+    with metrics.stage("aggregate", trip_id=trip_id):
+        aggregated_prefs = _aggregate_preferences(trip_id, db)
+        aggregated_prefs["participants_count"] = len(trip.participants)
+        travellers = [(p.contact_info, p.start_location) for p in trip.participants]
+        participant_ids = {p.contact_info: p.id for p in trip.participants}
 
-    recommendations_data = []
-    enriched_destinations = []
+    db_recommendations = []
+    _publish(trip_id, "started", {"trip_id": trip_id})
 
-    if settings.GEMINI_API_KEY:
+    if llm.available():
+        checkpoint = _Checkpoint(db, trip_id, checkpoint_service.inputs_key(aggregated_prefs, travellers))
+        stage = "ideation"
         try:
-            # 1. First LLM call to get initial ideas
-            print("AGENT: Getting initial destination ideas using Gemini...")
-            initial_messages = create_initial_ideas_prompt(aggregated_prefs)
-            ideas_response = litellm.completion(model="vertex_ai/gemini-2.5-flash", messages=initial_messages,
-                                                api_key=settings.GEMINI_API_KEY)
-            response_text = ideas_response.choices[0].message.content
-
-            # --- NEW DEBUGGING STATEMENT ---
-            print("\n--- RAW AI RESPONSE (Initial Ideas) ---")
-            print(response_text)
-            print("---------------------------------------\n")
-            # --- END DEBUGGING STATEMENT ---
-
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not json_match:
-                raise ValueError("Could not find a valid JSON object in Gemini's first response.")
-            ideas_content = json.loads(json_match.group(0))
-            destination_ideas = ideas_content.get("destinations", [])
-
-            # 2. Use agent tools to enrich the ideas
-            print("AGENT: Enriching ideas with real-time data...")
-            for idea in destination_ideas:
-                dest_name = f"{idea['name']}, {idea['state']}"
-
-                # These now call our new Gemini-powered tools
-                hotel_recs = agent_service.get_hotel_recommendations(dest_name)
-
-                enriched_idea_details = {"destination": dest_name, "top_4_hotels": hotel_recs}
-
-                travel_details_by_person = {}
-                for participant in trip.participants:
-                    origin = participant.start_location
-                    if origin:
-                        route_info = agent_service.get_route_info(origin, dest_name)
-                        petrol_price = agent_service.get_petrol_price(origin)
-                        flight_info = agent_service.get_flight_prices(origin, dest_name)
-
-                        # Create the Google Maps Embed URL
-                        map_url = f"https://www.google.com/maps/embed/v1/directions?key={settings.GOOGLE_MAPS_API_KEY}&origin={origin}&destination={dest_name}"
-
-                        fuel_cost = round((route_info.get('distance_km', 0) / 15) * petrol_price) * 2  # Return trip
-
-                        travel_details_by_person[participant.contact_info] = {
-                            "route_text": route_info.get('text'),
-                            "estimated_fuel_cost": f"~₹{fuel_cost}",
-                            "flight_estimate": flight_info,
-                            "map_url": map_url
-                        }
-                enriched_idea_details["travel_info"] = travel_details_by_person
-                enriched_destinations.append(enriched_idea_details)
-
-            # 3. Second LLM call to synthesize a final summary
-            print("AGENT: Generating final summary using Gemini...")
-            final_messages = create_final_summary_prompt(enriched_destinations)
-            final_response = litellm.completion(model="vertex_ai/gemini-2.5-flash", messages=final_messages,
-                                                api_key=settings.GEMINI_API_KEY)
-            response_text_final = final_response.choices[0].message.content
-
-            # --- NEW DEBUGGING STATEMENT ---
-            print("\n--- RAW AI RESPONSE (Final Summary) ---")
-            print(response_text_final)
-            print("---------------------------------------\n")
-            # --- END DEBUGGING STATEMENT ---
-
-            json_match_final = re.search(r'\{.*\}', response_text_final, re.DOTALL)
-            if not json_match_final:
-                raise ValueError("Could not find a valid JSON object in Gemini's final response.")
-            final_content = json.loads(json_match_final.group(0))
-            recommendations_data = final_content.get("recommendations", [])
+            # 1. First LLM call to get initial ideas, unless a group with the same profile already paid for it
+            _report(progress, "ideation")
+            with metrics.stage("ideation", trip_id=trip_id):
+                destination_ideas = checkpoint.get(("ideas", ""))
+                if destination_ideas is None:
+                    if trip.ideation_cache_opt_out:
+                        destination_ideas = _brainstorm_destinations(aggregated_prefs)
+                    else:
+                        destination_ideas = ideation_cache.get_or_brainstorm(
+                            aggregated_prefs, lambda: _brainstorm_destinations(aggregated_prefs))
+                    checkpoint.save("ideas", destination_ideas)
+
+            # 2. Use agent tools to enrich the ideas, skipping destinations a previous run finished
+            stage = "enrichment"
+            names = [f"{idea['name']}, {idea['state']}" for idea in destination_ideas]
+            enriched_by_name = {name: checkpoint.get(("destination", name)) for name in names
+                                if checkpoint.get(("destination", name)) is not None}
+            missing = [idea for idea, name in zip(destination_ideas, names) if name not in enriched_by_name]
+            logger.info("Enriching ideas with real-time data", extra={
+                "trip_id": trip_id, "destinations": len(destination_ideas), "resumed": len(enriched_by_name)})
+            _report(progress, "enrichment", len(enriched_by_name), len(destination_ideas))
+            _publish(trip_id, "ideas", {"destinations": destination_ideas})
+
+            def on_enriched(details: dict, done: int, total: int):
+                if _is_complete(details):
+                    checkpoint.save("destination", details, item=details["destination"])
+                finished = len(enriched_by_name) + done
+                _report(progress, "enrichment", finished, len(destination_ideas))
+                _publish(trip_id, "destination", {"index": finished - 1, "total": len(destination_ideas), **details})
+
+            with metrics.stage("enrichment", trip_id=trip_id):
+                for details in _enrich_destinations(missing, travellers, on_enriched):
+                    enriched_by_name[details["destination"]] = details
+            enriched_destinations = [enriched_by_name[name] for name in names]
+
+            # 3. Second LLM call to synthesize a final summary; each recommendation is saved as it arrives
+            stage = "summary"
+            summarized = {name: rec_id for (kind, name), rec_id in checkpoint.saved.items() if kind == "recommendation"}
+            db_recommendations = [rec for rec in (db.get(models.Recommendation, rec_id) for rec_id in summarized.values())
+                                  if rec is not None]
+            _report(progress, "summary", len(db_recommendations), len(enriched_destinations))
+
+            def on_recommendation(item: dict, details: dict):
+                rec = _add_recommendation(db, trip_id, item, details, participant_ids)
+                # Commits the recommendation and its checkpoint together, so a resumed run skips it
+                checkpoint.save("recommendation", rec.id, item=details["destination"])
+                db_recommendations.append(rec)
+                _report(progress, "summary", len(db_recommendations), len(enriched_destinations))
+                _publish_recommendation(trip_id, rec)
+
+            with metrics.stage("summary", trip_id=trip_id):
+                _summarize([d for d in enriched_destinations if d["destination"] not in summarized], on_recommendation)
+            metrics.PIPELINE_RUNS.labels(outcome="ok").inc()
 
         except Exception as e:
-            print(f"Error in agent workflow: {e}")
-            recommendations_data = MOCK_RESPONSE.get("recommendations", [])
+            logger.exception("Error in agent workflow", extra={"trip_id": trip_id, "stage": stage})
+            metrics.PIPELINE_RUNS.labels(outcome="incomplete").inc()
+            _publish(trip_id, "error", {
+                "message": f"The AI agent failed during {stage}; finished work is saved and the next attempt resumes from it.",
+                "stage": stage,
+            })
+            raise PipelineIncomplete(stage, e) from e
     else:
-        print("--- SKIPPING LLM CALL: GEMINI_API_KEY not found. Using mock data. ---")
-        recommendations_data = MOCK_RESPONSE.get("recommendations", [])
-
-    # Save the final recommendations to the database
-    db_recommendations = []
-    for i, item in enumerate(recommendations_data):
-        details_data = enriched_destinations[i] if i < len(enriched_destinations) else {}
-
-        details_data['reason'] = item.get("reason")
-        details_data['estimated_total_cost'] = item.get("estimated_total_cost")
-        details_data['top_stays'] = item.get("top_stays")
-
-        rec = models.Recommendation(
-            trip_id=trip_id,
-            destination_name=item.get("destination"),
-            reason=item.get("reason"),
-            estimated_budget=item.get("budget_tier"),
-            details=details_data
-        )
-        db.add(rec)
-        db_recommendations.append(rec)
-
-    db.commit()
-    for rec in db_recommendations:
-        db.refresh(rec)
-
-    return db_recommendations
\ No newline at end of file
+        logger.warning("Skipping LLM call: GEMINI_API_KEY not found, using mock data")
+        metrics.PIPELINE_RUNS.labels(outcome="mock").inc()
+        for item in MOCK_RESPONSE.get("recommendations", []):
+            rec = _add_recommendation(db, trip_id, item, {}, participant_ids)
+            db.commit()
+            db_recommendations.append(rec)
+            _publish_recommendation(trip_id, rec)
+
+    # The recommendations are already saved, so the run's checkpoints can go
+    with metrics.stage("persist", trip_id=trip_id):
+        checkpoint_service.clear(db, trip_id)
+        db.commit()
+
+    _report(progress, "persisted", len(db_recommendations), len(db_recommendations))
+    _publish(trip_id, "completed", {"recommendation_ids": [rec.id for rec in db_recommendations]})
+
+    return db_recommendations
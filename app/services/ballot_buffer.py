@@ -0,0 +1,132 @@
+# app/services/ballot_buffer.py
+"""
+Write-behind ingestion for voting rushes.
+
+When a trip's voting link goes out to a large group, hundreds of ballots arrive within
+seconds, and each one committed on its own waits for the trip's tally lock and pays for its
+own commit. With VOTE_WRITE_BEHIND_ENABLED, requests hand their ballot to the process-wide
+BallotBuffer instead. A background thread collects whatever arrives within
+VOTE_FLUSH_INTERVAL_SECONDS of the first ballot (up to VOTE_BATCH_MAX_SIZE) and records the
+batch with voting_service.record_ballots: one transaction, one lock per trip, the trips'
+recommendations loaded once. A request is only answered once its batch is committed, so an
+acknowledged ballot is never lost; stopping the buffer (on shutdown) flushes what's queued.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import voting_service
+
+logger = logging.getLogger(__name__)
+
+
+class BallotBuffer:
+    """Queues ballots and commits them in batches from a background thread."""
+
+    def __init__(self, session_factory=SessionLocal, max_batch: int = None, flush_interval: float = None):
+        self.session_factory = session_factory
+        self.max_batch = max(1, max_batch or settings.VOTE_BATCH_MAX_SIZE)
+        self.flush_interval = settings.VOTE_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self._queue = []  # [(queued_at, (trip_id, participant_id, ranked_ids), future)]
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def submit(self, trip_id: int, participant_id: int, ranked_ids: list) -> Future:
+        """
+        Queues a ballot. The future resolves to what voting_service.record_ballot returns (or
+        raises) once the ballot's batch is committed. Starts the flush thread on first use.
+        """
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("The ballot buffer is stopped")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ballot-buffer", daemon=True)
+                self._thread.start()
+            self._queue.append((time.monotonic(), (trip_id, participant_id, ranked_ids), future))
+            self._cond.notify()
+        return future
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._stopping:
+                # Give the rest of the rush until the first ballot's deadline to join the batch
+                deadline = self._queue[0][0] + self.flush_interval
+                while len(self._queue) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            return batch
+
+    def _flush(self, batch: list):
+        db = self.session_factory()
+        try:
+            results = voting_service.record_ballots(db, [ballot for _, ballot, _ in batch])
+        except Exception as e:
+            logger.exception("Error recording ballot batch", extra={"batch_size": len(batch)})
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        metrics.BALLOT_BATCH_SIZE.observe(len(batch))
+        committed = time.monotonic()
+        for (queued_at, _, future), result in zip(batch, results):
+            metrics.BALLOT_QUEUE_SECONDS.observe(committed - queued_at)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping:
+                return
+
+    def stop(self, timeout: float = 30.0):
+        """Stops taking ballots and waits for everything already queued to be committed."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # Never started, or the thread didn't finish in time: flush here so nothing queued is dropped
+        with self._cond:
+            batch, self._queue = self._queue, []
+        for start in range(0, len(batch), self.max_batch):
+            self._flush(batch[start:start + self.max_batch])
+
+
+_buffer: BallotBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> BallotBuffer:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = BallotBuffer()
+        return _buffer
+
+
+def stop_buffer():
+    """Flushes and stops the process-wide buffer, if one was started. Called on app shutdown."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.stop()
@@ -0,0 +1,208 @@
+# app/services/ballots.py
+"""
+Compact ballot representation, a vectorized instant-runoff kernel and multi-method analysis.
+
+A trip only has a handful of candidates, so ballots repeat heavily. compress_ballots collapses
+identical rankings into (ranking, weight) groups held in an integer matrix, and instant_runoff
+finds every group's top active choice per round with array operations instead of walking each
+ballot in Python. analyze_ballots derives Borda, Condorcet and Schulze results alongside IRV
+from one pairwise-preference matrix and one positional-score vector.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class CompressedBallots:
+    candidate_ids: list  # column index -> recommendation id
+    rankings: np.ndarray  # (groups, max ranking length) candidate indexes, padded with -1
+    weights: np.ndarray  # (groups,) number of ballots with that ranking
+
+    @property
+    def total(self) -> int:
+        return int(self.weights.sum())
+
+
+def compress_ballots(ballots: list, candidate_ids) -> CompressedBallots:
+    """
+    Collapses `ballots` (lists of recommendation ids, best first) into weighted groups.
+    Ids that aren't candidates and repeated ids are dropped; ballots left empty still count
+    as cast. Groups keep the order in which their ranking first appears, which is what the
+    tie-breaking in instant_runoff relies on.
+    """
+    candidate_ids = list(candidate_ids)
+    index_of = {candidate_id: index for index, candidate_id in enumerate(candidate_ids)}
+
+    # Count raw rankings first (cheap), then clean up each distinct one once
+    raw_counts: dict[tuple, int] = {}
+    for ranked_choices in ballots:
+        raw = tuple(ranked_choices or ())
+        raw_counts[raw] = raw_counts.get(raw, 0) + 1
+
+    groups: dict[tuple, int] = {}
+    for raw, count in raw_counts.items():
+        ranking = tuple(dict.fromkeys(index_of[c] for c in raw if c in index_of))
+        groups[ranking] = groups.get(ranking, 0) + count
+
+    width = max((len(ranking) for ranking in groups), default=0) or 1
+    rankings = np.full((len(groups), width), -1, dtype=np.int32)
+    for row, ranking in enumerate(groups):
+        rankings[row, :len(ranking)] = ranking
+    weights = np.fromiter(groups.values(), dtype=np.int64, count=len(groups))
+    return CompressedBallots(candidate_ids, rankings, weights)
+
+
+def _top_choices(ballots: CompressedBallots, active: np.ndarray):
+    """Each group's highest-ranked active candidate index, and a mask of groups that aren't exhausted."""
+    # `active` has one extra False slot at the end, which the -1 padding indexes into
+    mask = active[ballots.rankings]
+    live = mask.any(axis=1)
+    tops = ballots.rankings[np.arange(len(ballots.rankings)), mask.argmax(axis=1)]
+    return tops, live
+
+
+def instant_runoff(ballots: CompressedBallots):
+    """
+    Runs instant-runoff rounds. Returns (winner_id or None, rounds), where rounds is a list of
+    {candidate_id: count} per round in the order candidates first appear as a top choice.
+    Same rules as counting ballot by ballot: a majority of all ballots cast wins, the
+    candidates with the fewest votes are eliminated together, and if every remaining candidate
+    is tied the first to appear wins.
+    """
+    candidate_count = len(ballots.candidate_ids)
+    total_voters = ballots.total
+    active = np.zeros(candidate_count + 1, dtype=bool)
+    active[:candidate_count] = True
+    rounds = []
+
+    while active.any():
+        tops, live = _top_choices(ballots, active)
+        live_tops = tops[live]
+        counts = np.bincount(live_tops, weights=ballots.weights[live], minlength=candidate_count)
+
+        # Candidates in order of the first group that puts them on top
+        present, first_index = np.unique(live_tops, return_index=True)
+        present = present[np.argsort(first_index)]
+        round_counts = {int(index): int(counts[index]) for index in present}
+        rounds.append({ballots.candidate_ids[index]: count for index, count in round_counts.items()})
+
+        for index, count in round_counts.items():
+            if count > total_voters / 2:
+                return ballots.candidate_ids[index], rounds
+
+        if not round_counts:
+            return None, rounds
+
+        min_votes = min(round_counts.values())
+        to_eliminate = [index for index, count in round_counts.items() if count == min_votes]
+        if len(to_eliminate) == len(round_counts):
+            return ballots.candidate_ids[next(iter(round_counts))], rounds
+
+        active[to_eliminate] = False
+
+    return None, rounds
+
+
+@dataclass
+class BallotAnalysis:
+    candidate_ids: list
+    pairwise: np.ndarray  # [i, j] = number of ballots ranking candidate i above candidate j
+    borda_scores: np.ndarray  # positional score per candidate
+    schulze_strengths: np.ndarray  # [i, j] = strength of the strongest path from i to j
+    irv_winner: int | None
+    irv_rounds: list
+    borda_winner: int | None
+    condorcet_winner: int | None
+    schulze_winner: int | None
+
+    @property
+    def winners(self) -> dict:
+        return {
+            "instant_runoff": self.irv_winner,
+            "borda": self.borda_winner,
+            "condorcet": self.condorcet_winner,
+            "schulze": self.schulze_winner,
+        }
+
+    @property
+    def methods_disagree(self) -> bool:
+        return len({winner for winner in self.winners.values() if winner is not None}) > 1
+
+    def to_dict(self) -> dict:
+        """JSON-friendly form; matrices are lists of rows in candidate_ids order."""
+        return {
+            "candidate_ids": self.candidate_ids,
+            "winners": self.winners,
+            "methods_disagree": self.methods_disagree,
+            "irv_rounds": [{str(cid): count for cid, count in round_counts.items()} for round_counts in self.irv_rounds],
+            "borda_scores": self.borda_scores.tolist(),
+            "pairwise": self.pairwise.tolist(),
+            "schulze_strengths": self.schulze_strengths.tolist(),
+        }
+
+
+def _positions(ballots: CompressedBallots) -> np.ndarray:
+    """(groups, candidates) rank position of every candidate on every ballot group; unranked = candidate count."""
+    candidate_count = len(ballots.candidate_ids)
+    positions = np.full((len(ballots.rankings), candidate_count), candidate_count, dtype=np.int32)
+    rows, columns = np.nonzero(ballots.rankings >= 0)
+    positions[rows, ballots.rankings[rows, columns]] = columns
+    return positions
+
+
+def _schulze_strengths(pairwise: np.ndarray) -> np.ndarray:
+    """Widest-path (Floyd–Warshall) strengths over the pairwise defeats."""
+    strengths = np.where(pairwise > pairwise.T, pairwise, 0)
+    np.fill_diagonal(strengths, 0)
+    for k in range(len(strengths)):
+        strengths = np.maximum(strengths, np.minimum(strengths[:, k:k + 1], strengths[k:k + 1, :]))
+    np.fill_diagonal(strengths, 0)
+    return strengths
+
+
+def analyze_ballots(ballots: CompressedBallots) -> BallotAnalysis:
+    """
+    Instant-runoff, Borda, Condorcet and Schulze results from one pass over the ballot groups.
+    The pairwise matrix and the positional scores both come from the same rank-position matrix;
+    unranked candidates count as tied below every ranked one and score no Borda points.
+    Borda and Schulze ties go to the earlier candidate in candidate_ids order.
+    """
+    candidate_count = len(ballots.candidate_ids)
+    positions = _positions(ballots)
+    weights = ballots.weights
+
+    # pairwise[i, j] = sum of weights of groups that rank i strictly above j
+    above = positions[:, :, None] < positions[:, None, :]
+    pairwise = np.einsum("g,gij->ij", weights, above.astype(np.int64))
+    borda_scores = weights @ np.clip(candidate_count - 1 - positions, 0, None).astype(np.int64)
+
+    irv_winner, irv_rounds = instant_runoff(ballots)
+
+    borda_winner = condorcet_winner = schulze_winner = None
+    strengths = np.zeros((candidate_count, candidate_count), dtype=np.int64)
+    if candidate_count and ballots.total:
+        borda_winner = ballots.candidate_ids[int(np.argmax(borda_scores))]
+
+        beats = pairwise > pairwise.T
+        np.fill_diagonal(beats, True)
+        condorcet = np.flatnonzero(beats.all(axis=1))
+        if len(condorcet):
+            condorcet_winner = ballots.candidate_ids[int(condorcet[0])]
+
+        strengths = _schulze_strengths(pairwise)
+        schulze = np.flatnonzero((strengths >= strengths.T).all(axis=1))
+        if len(schulze):
+            schulze_winner = ballots.candidate_ids[int(schulze[0])]
+
+    return BallotAnalysis(
+        candidate_ids=list(ballots.candidate_ids),
+        pairwise=pairwise,
+        borda_scores=borda_scores,
+        schulze_strengths=strengths,
+        irv_winner=irv_winner,
+        irv_rounds=irv_rounds,
+        borda_winner=borda_winner,
+        condorcet_winner=condorcet_winner,
+        schulze_winner=schulze_winner,
+    )
@@ -0,0 +1,85 @@
+# app/services/checkpoint_service.py
+"""
+Checkpoints for the recommendation pipeline.
+
+Each finished piece of work (the destination ideas, every enriched destination, every
+recommendation the summary produced) is committed as soon as it exists. A later run for the same trip and the same
+inputs picks them up and only redoes what's missing; checkpoints from runs over different
+preferences or travellers are discarded, along with the recommendations such a run had already
+saved, so a trip never mixes recommendations made for different inputs. They're cleared once
+all recommendations are persisted.
+"""
+import hashlib
+import json
+import time
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services import travel_service, trip_service, voting_service
+
+
+def inputs_key(aggregated_prefs: dict, travellers: list) -> str:
+    payload = {"preferences": aggregated_prefs, "travellers": sorted([list(t) for t in travellers], key=str)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def _discard_recommendations(db: Session, trip_id: int, recommendation_ids: list):
+    """Deletes recommendations an unfinished run saved, with their travel and hotel rows. Caller commits."""
+    travel_service.delete_rows(db, recommendation_ids)
+    db.query(models.Recommendation).filter(
+        models.Recommendation.trip_id == trip_id, models.Recommendation.id.in_(recommendation_ids)
+    ).delete(synchronize_session="fetch")  # SQLite reuses the ids, so the session must forget these objects
+    # The trip's candidates changed: a winner among them is gone, and the tally must be recounted
+    db.query(models.Trip).filter(
+        models.Trip.id == trip_id, models.Trip.winner_recommendation_id.in_(recommendation_ids)
+    ).update({"winner_recommendation_id": None, "status": "planning"}, synchronize_session=False)
+    voting_service.invalidate_tally(trip_id, db)
+    trip_service.bump_version(db, trip_id)
+
+
+def load(db: Session, trip_id: int, key: str) -> dict:
+    """
+    Returns {(stage, key): data} of the trip's checkpoints for these inputs. Stale ones are
+    dropped, and the recommendations they recorded are deleted in the same transaction.
+    """
+    checkpoints = {}
+    stale_recommendation_ids = []
+    stale = False
+    for checkpoint in db.query(models.PipelineCheckpoint).filter(models.PipelineCheckpoint.trip_id == trip_id):
+        if checkpoint.inputs_key == key:
+            checkpoints[(checkpoint.stage, checkpoint.key)] = checkpoint.data
+        else:
+            stale = True
+            if checkpoint.stage == "recommendation":
+                stale_recommendation_ids.append(checkpoint.data)
+    if stale:
+        if stale_recommendation_ids:
+            _discard_recommendations(db, trip_id, stale_recommendation_ids)
+        db.query(models.PipelineCheckpoint).filter(
+            models.PipelineCheckpoint.trip_id == trip_id, models.PipelineCheckpoint.inputs_key != key
+        ).delete(synchronize_session=False)
+        db.commit()
+    return checkpoints
+
+
+def save(db: Session, trip_id: int, key: str, stage: str, data, item: str = ""):
+    """Stores (or replaces) one checkpoint and commits it right away."""
+    checkpoint = db.query(models.PipelineCheckpoint).filter(
+        models.PipelineCheckpoint.trip_id == trip_id,
+        models.PipelineCheckpoint.stage == stage,
+        models.PipelineCheckpoint.key == item,
+    ).first()
+    if checkpoint is None:
+        checkpoint = models.PipelineCheckpoint(trip_id=trip_id, stage=stage, key=item)
+        db.add(checkpoint)
+    checkpoint.inputs_key = key
+    checkpoint.data = data
+    checkpoint.created_at = time.time()
+    db.commit()
+
+
+def clear(db: Session, trip_id: int):
+    """Drops a trip's checkpoints. Caller commits."""
+    db.query(models.PipelineCheckpoint).filter(models.PipelineCheckpoint.trip_id == trip_id).delete(
+        synchronize_session=False)
@@ -0,0 +1,93 @@
+# app/services/event_service.py
+"""
+In-process publish/subscribe for recommendation pipeline events, streamed to browsers as SSE.
+
+The pipeline publishes from worker threads; subscribers are asyncio queues owned by the
+SSE handlers. Every subscriber queue is bounded: when a slow client falls behind, the oldest
+events are dropped and the client is told how many it missed. The last few events of each
+trip are kept so a page that subscribes mid-run (or reconnects) can catch up.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from itertools import count
+
+from app.core.config import settings
+
+_lock = threading.Lock()
+_subscribers: dict[int, set["Subscription"]] = {}
+_history: dict[int, deque] = {}
+_event_ids = count(1)
+
+
+class Subscription:
+    def __init__(self, trip_id: int, loop: asyncio.AbstractEventLoop):
+        self.trip_id = trip_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SSE_SUBSCRIBER_BUFFER)
+        self.dropped = 0
+
+    def _put(self, event: dict):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float) -> dict | None:
+        """The next event, a 'lagged' notice if events were dropped, or None on timeout."""
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"id": None, "event": "lagged", "data": {"dropped": dropped}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def subscribe(trip_id: int, last_event_id: int | None = None) -> Subscription:
+    """Must be called from the event loop that will consume the subscription."""
+    subscription = Subscription(trip_id, asyncio.get_running_loop())
+    with _lock:
+        for event in _history.get(trip_id, ()):
+            if last_event_id is None or event["id"] > last_event_id:
+                subscription._put(event)
+        _subscribers.setdefault(trip_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription: Subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.trip_id)
+        if subscribers:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.trip_id]
+
+
+def publish(trip_id: int, event_type: str, data: dict):
+    """Thread-safe. A 'started' event resets the trip's catch-up history."""
+    with _lock:
+        event = {"id": next(_event_ids), "event": event_type, "data": data}
+        history = _history.setdefault(trip_id, deque(maxlen=settings.SSE_HISTORY_SIZE))
+        if event_type == "started":
+            history.clear()
+        history.append(event)
+        subscribers = list(_subscribers.get(trip_id, ()))
+
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._put, event)
+        except RuntimeError:
+            # The subscriber's loop is closed; it'll be unsubscribed by its handler
+            pass
+
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event["id"] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return "\n".join(lines) + "\n\n"
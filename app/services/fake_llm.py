@@ -0,0 +1,159 @@
+# app/services/fake_llm.py
+"""
+A deterministic, offline stand-in for the LLM (LLM_PROVIDER=fake).
+
+It recognises the prompts the app sends (ideation, route, flight, hotel, petrol, the batched
+travel lookup and the final summary) and answers each with valid JSON in the shape the real
+model is asked for. Answers depend only on the prompt, so runs are repeatable and the pipeline
+can be exercised and benchmarked without a Gemini key. LLM_FAKE_* settings add latency, jitter
+and failures (plain errors and 429s) drawn from a seeded generator.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from app.core.config import settings
+
+_DESTINATIONS = [
+    ("Araku Valley", "Andhra Pradesh"), ("Goa", "Goa"), ("Ooty", "Tamil Nadu"), ("Munnar", "Kerala"),
+    ("Coorg", "Karnataka"), ("Hampi", "Karnataka"), ("Pondicherry", "Puducherry"), ("Gokarna", "Karnataka"),
+    ("Kodaikanal", "Tamil Nadu"), ("Alleppey", "Kerala"), ("Rishikesh", "Uttarakhand"), ("Manali", "Himachal Pradesh"),
+    ("Udaipur", "Rajasthan"), ("Jaisalmer", "Rajasthan"), ("Darjeeling", "West Bengal"), ("Varkala", "Kerala"),
+    ("Lonavala", "Maharashtra"), ("Mahabaleshwar", "Maharashtra"), ("Shillong", "Meghalaya"), ("Gangtok", "Sikkim"),
+]
+_BUDGET_TIERS = ["₹ - Low Budget", "₹₹ - Moderate", "₹₹₹ - High Budget"]
+_STREAM_CHUNK_CHARS = 40
+
+_lock = threading.Lock()
+_random = random.Random(settings.LLM_FAKE_SEED)
+calls: Counter = Counter()  # prompt kind -> count
+
+
+class FakeLLMError(Exception):
+    """A failure injected by LLM_FAKE_ERROR_RATE / LLM_FAKE_RATE_LIMIT_RATE; `status_code` mimics the provider's."""
+
+    def __init__(self, message: str, status_code: int):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def reset(seed: int = None):
+    """Restarts the latency/failure sequence and the call counts, e.g. between benchmark runs."""
+    with _lock:
+        _random.seed(settings.LLM_FAKE_SEED if seed is None else seed)
+        calls.clear()
+
+
+def _number(*parts: str) -> int:
+    """A stable pseudo-random number for the given strings."""
+    return int(hashlib.sha256("|".join(p.strip().lower() for p in parts).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _route(origin: str, dest: str) -> dict:
+    distance_km = 80 + _number("route", origin, dest) % 1900
+    hours = max(1, round(distance_km / 55))
+    return {"distance_km": distance_km, "duration_text": f"{hours} hours"}
+
+
+def _flight(origin: str, dest: str) -> str:
+    low = 2500 + _number("flight", origin, dest) % 6000 // 100 * 100
+    return f"Around ₹{low:,} - ₹{low + 1500:,}"
+
+
+def _petrol(city: str) -> float:
+    return 94 + _number("petrol", city) % 1300 / 100
+
+
+def _hotels(dest: str) -> list:
+    n = _number("hotels", dest)
+    return [{"name": f"{dest.split(',')[0]} {kind}",
+             "rating": round(4.8 - i * 0.2 - (n >> i) % 3 / 10, 1),
+             "estimated_price": f"₹{600 + (n >> (2 * i)) % 15 * 100} per night"}
+            for i, kind in enumerate(["Backpackers Hostel", "Zostel", "Guesthouse", "Homestay"])]
+
+
+def _ideas(prompt: str) -> dict:
+    start = _number("ideas", prompt) % len(_DESTINATIONS)
+    count = min(settings.LLM_FAKE_DESTINATIONS, len(_DESTINATIONS))
+    # 7 is coprime with the list length, so the picks never repeat
+    picks = [_DESTINATIONS[(start + i * 7) % len(_DESTINATIONS)] for i in range(count)]
+    return {"destinations": [{"name": name, "state": state} for name, state in picks]}
+
+
+def _summary(prompt: str) -> dict:
+    recommendations = []
+    for dest in dict.fromkeys(re.findall(r'"destination": "([^"]+)"', prompt)):
+        n = _number("summary", dest)
+        recommendations.append({
+            "destination": dest,
+            "reason": f"{dest.split(',')[0]} suits the group's interests and is within reach of everyone.",
+            "estimated_total_cost": f"Approx. ₹{8000 + n % 12000 // 500 * 500:,} per person",
+            "top_stays": _hotels(dest),
+            "budget_tier": _BUDGET_TIERS[n % len(_BUDGET_TIERS)],
+        })
+    return {"recommendations": recommendations}
+
+
+def _answer(prompt: str) -> tuple[str, str]:
+    """Returns (prompt kind, response text) for one of the app's prompts."""
+    if '"destinations"' in prompt:
+        return "ideation", json.dumps(_ideas(prompt))
+    if '"recommendations"' in prompt:
+        return "summary", json.dumps(_summary(prompt), ensure_ascii=False)
+    if match := re.search(r"estimate travel to (.+?), India:", prompt):
+        dest = match.group(1)
+        origins = re.findall(r"^- (.+)$", prompt, re.MULTILINE)
+        return "travel_batch", json.dumps({origin: {**_route(origin, dest), "flight_price_estimate": _flight(origin, dest),
+                                                    "petrol_price": _petrol(origin)} for origin in origins},
+                                          ensure_ascii=False)
+    if match := re.search(r"by car from (.+?), India to (.+?), India\?", prompt):
+        return "route_info", json.dumps(_route(*match.groups()))
+    if match := re.search(r"flight prices for one person from (.+?) to (.+?), India\?", prompt):
+        return "flight_prices", json.dumps({"price_estimate": _flight(*match.groups())}, ensure_ascii=False)
+    if match := re.search(r"guesthouses in (.+?), India", prompt):
+        return "hotel_recommendations", json.dumps(_hotels(match.group(1)), ensure_ascii=False)
+    if match := re.search(r"litre of petrol in (.+?), India\?", prompt):
+        return "petrol_price", str(_petrol(match.group(1)))
+    return "unknown", "{}"
+
+
+def _stream(model: str, content: str, usage, delay: float):
+    pieces = [content[i:i + _STREAM_CHUNK_CHARS] for i in range(0, len(content), _STREAM_CHUNK_CHARS)] or [""]
+    for i, piece in enumerate(pieces):
+        if delay > 0:
+            time.sleep(delay / len(pieces))
+        last = i == len(pieces) - 1
+        yield SimpleNamespace(model=model, usage=usage if last else None,
+                              choices=[SimpleNamespace(delta=SimpleNamespace(role="assistant", content=piece))])
+
+
+def completion(model: str, messages: list, stream: bool = False, **kwargs):
+    """
+    Same call shape and response shape (choices[0].message.content, usage) as litellm.completion.
+    With stream=True it returns the answer in chunks (choices[0].delta.content) with the latency
+    spread over them, and the usage on the last one.
+    """
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    kind, content = _answer(prompt)
+    with _lock:
+        calls[kind] += 1
+        delay = settings.LLM_FAKE_LATENCY_SECONDS + _random.uniform(0, settings.LLM_FAKE_JITTER_SECONDS)
+        roll = _random.random()
+    if delay > 0 and not stream:
+        time.sleep(delay)
+    if roll < settings.LLM_FAKE_RATE_LIMIT_RATE:
+        raise FakeLLMError("429 Resource exhausted (fake provider)", status_code=429)
+    if roll < settings.LLM_FAKE_RATE_LIMIT_RATE + settings.LLM_FAKE_ERROR_RATE:
+        raise FakeLLMError("500 Internal error (fake provider)", status_code=500)
+
+    usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+    usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+    if stream:
+        return _stream(model, content, usage, delay)
+    return SimpleNamespace(model=model, usage=usage,
+                           choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content))])
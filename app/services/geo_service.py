@@ -0,0 +1,124 @@
+# app/services/geo_service.py
+"""
+Offline route estimates from a bundled gazetteer of Indian cities, towns and destinations.
+
+Place names are resolved against the gazetteer (names, aliases like "Bombay" or "Vizag",
+an optional state to pick between namesakes, and a fuzzy match for typos). A name given with
+a state only matches a place in that state, so a namesake elsewhere is never taken for it. Distances are the
+great-circle distance, computed with numpy for a whole set of origins at once, times a road
+correction factor; the duration assumes an average road speed. A place the gazetteer can't
+resolve, or one that can't be reached by road, gets None, and the caller asks the LLM.
+"""
+import csv
+import difflib
+import functools
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.tool_cache import normalize_place
+
+_DEFAULT_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer_in.csv")
+_EARTH_RADIUS_KM = 6371.0088
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    state: str
+    latitude: float
+    longitude: float
+    by_road: bool
+    aliases: tuple = ()
+
+
+class _Index:
+    def __init__(self, places: list):
+        self.places = places
+        self.radians = np.radians(np.array([[p.latitude, p.longitude] for p in places], dtype=float).reshape(-1, 2))
+        self.by_name: dict[str, list] = {}  # normalized name or alias -> place positions, in file order
+        for i, place in enumerate(places):
+            for name in [place.name, *place.aliases]:
+                self.by_name.setdefault(normalize_place(name), []).append(i)
+        self.names = list(self.by_name)
+        self.states = {normalize_place(place.state) for place in places}
+
+    def lookup(self, name: str, state: str | None) -> int | None:
+        """The place called `name`; with a state, only one in that state (e.g. not another state's namesake)."""
+        candidates = self.by_name.get(name)
+        if not candidates:
+            return None
+        if state is None:
+            return candidates[0]
+        return next((i for i in candidates if normalize_place(self.places[i].state) == state), None)
+
+
+@functools.lru_cache(maxsize=1)
+def _index() -> _Index:
+    places = []
+    with open(settings.GEO_GAZETTEER_PATH or _DEFAULT_GAZETTEER, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            places.append(Place(row["name"], row["state"], float(row["latitude"]), float(row["longitude"]),
+                                row["by_road"] == "1", tuple(a for a in (row.get("aliases") or "").split("|") if a)))
+    return _Index(places)
+
+
+@functools.lru_cache(maxsize=4096)
+def _resolve_position(query: str) -> int | None:
+    index = _index()
+    parts = normalize_place(query).split(",")
+    if not parts or not parts[0]:
+        return None
+    # A trailing part that isn't a state (e.g. a district) doesn't restrict the match
+    state = parts[-1] if len(parts) > 1 and parts[-1] in index.states else None
+
+    # "Goa, Goa" and "Hyderabad, Telangana" are name + state; "Baga Beach, North Goa, Goa" falls back to a broader part
+    for part in parts:
+        position = index.lookup(part, state)
+        if position is not None:
+            return position
+    close = difflib.get_close_matches(parts[0], index.names, n=1, cutoff=settings.GEO_FUZZY_CUTOFF)
+    return index.lookup(close[0], state) if close else None
+
+
+def resolve(name: str) -> Place | None:
+    """The gazetteer entry for a free-text place name, or None if it can't be resolved."""
+    position = _resolve_position(name)
+    return None if position is None else _index().places[position]
+
+
+def distance_matrix(origins: list, destinations: list) -> np.ndarray:
+    """
+    Estimated road distances in km, shape (len(origins), len(destinations)). Pairs where either
+    place is unresolved or not reachable by road are NaN.
+    """
+    index = _index()
+    positions = [[_resolve_position(name) for name in names] for names in (origins, destinations)]
+    usable = [np.array([p is not None and index.places[p].by_road for p in side], dtype=bool) for side in positions]
+    coords = [index.radians[[p if p is not None else 0 for p in side]].reshape(-1, 2) for side in positions]
+
+    lat1, lon1 = coords[0][:, 0:1], coords[0][:, 1:2]
+    lat2, lon2 = coords[1][:, 0], coords[1][:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    km = 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * settings.GEO_ROAD_DISTANCE_FACTOR
+    km[~usable[0], :] = np.nan
+    km[:, ~usable[1]] = np.nan
+    return km
+
+
+def duration_text(distance_km: float) -> str:
+    minutes = int(round(distance_km / settings.GEO_AVERAGE_SPEED_KMPH * 60 / 15)) * 15
+    hours, minutes = divmod(max(minutes, 15), 60)
+    if not hours:
+        return f"{minutes} mins"
+    return f"{hours} hours" + (f" {minutes} mins" if minutes else "")
+
+
+def route_infos(origins: list, destination: str) -> dict:
+    """{origin: (distance_km, duration_text)} for every origin the gazetteer can route to `destination`."""
+    if not settings.GEO_ROUTES_ENABLED or not origins:
+        return {}
+    distances = distance_matrix(origins, [destination])[:, 0]
+    return {origin: (int(round(km)), duration_text(km)) for origin, km in zip(origins, distances) if not np.isnan(km)}
@@ -0,0 +1,142 @@
+# app/services/ideation_cache.py
+"""
+Cache of brainstormed destination ideas, shared across trips.
+
+The first Gemini call only depends on the aggregated preferences, so groups with the same
+profile (budget, interests, start cities and rough size) get the same ideas. Profiles are
+normalized and hashed into a fingerprint, and the ideas are stored under it in the tool
+cache (tool "ideation"), which provides the TTL, the in-process LRU and persistence. The
+persistent tier is capped at IDEATION_CACHE_MAX_ENTRIES, evicting the entries closest to
+expiry. With IDEATION_CACHE_SIMILARITY_THRESHOLD set, a miss falls back to the most similar
+cached profile with the same budget and group size.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app import models
+from app.services import tool_cache
+
+logger = logging.getLogger(__name__)
+
+TOOL = "ideation"
+
+_lock = threading.Lock()
+_counters: Counter = Counter()  # outcome -> count
+
+
+def _group_size(participants_count: int) -> str:
+    for upper, label in ((2, "1-2"), (5, "3-5"), (10, "6-10"), (20, "11-20")):
+        if participants_count <= upper:
+            return label
+    return "21+"
+
+
+def normalize_profile(preferences: dict) -> dict:
+    """The parts of the aggregated preferences the brainstorm depends on, in canonical form."""
+    return {
+        "budget": " ".join(str(preferences.get("budget") or "").lower().split()),
+        "interests": sorted({" ".join(str(i).lower().split()) for i in preferences.get("interests", []) if str(i).strip()}),
+        "start_locations": sorted({tool_cache.normalize_place(loc) for loc in preferences.get("start_locations", []) if loc}),
+        "group_size": _group_size(preferences.get("participants_count", 0)),
+    }
+
+
+def fingerprint(profile: dict) -> str:
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def _jaccard(a: list, b: list) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def similarity(a: dict, b: dict) -> float:
+    """0..1; profiles with a different budget or group size never match."""
+    if a["budget"] != b["budget"] or a["group_size"] != b["group_size"]:
+        return 0.0
+    return (_jaccard(a["interests"], b["interests"]) + _jaccard(a["start_locations"], b["start_locations"])) / 2
+
+
+def _count(outcome: str):
+    with _lock:
+        _counters[outcome] += 1
+
+
+def _nearest(profile: dict, threshold: float):
+    """The cached ideas of the most similar live profile scoring at least `threshold`, or None."""
+    db = SessionLocal()
+    try:
+        rows = db.query(models.ToolCacheEntry.value).filter(
+            models.ToolCacheEntry.tool == TOOL, models.ToolCacheEntry.expires_at > time.time())
+        best, best_score = None, threshold
+        for (value,) in rows:
+            score = similarity(profile, value["profile"])
+            if score >= best_score:
+                best, best_score = value, score
+        return best["destinations"] if best else None
+    except Exception as e:
+        logger.warning("Ideation cache similarity lookup failed", extra={"error": str(e)})
+        return None
+    finally:
+        db.close()
+
+
+def _evict_overflow():
+    db = SessionLocal()
+    try:
+        overflow = db.query(models.ToolCacheEntry.key).filter(models.ToolCacheEntry.tool == TOOL).order_by(
+            models.ToolCacheEntry.expires_at.desc()).offset(settings.IDEATION_CACHE_MAX_ENTRIES).all()
+        if overflow:
+            db.query(models.ToolCacheEntry).filter(models.ToolCacheEntry.key.in_([key for (key,) in overflow])).delete(
+                synchronize_session=False)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Ideation cache eviction failed", extra={"error": str(e)})
+    finally:
+        db.close()
+
+
+def get_or_brainstorm(preferences: dict, brainstorm: Callable[[], list]) -> list:
+    """
+    Returns destination ideas for `preferences`: cached for the same profile, else from the
+    most similar cached profile (if enabled), else from `brainstorm()`, whose non-empty
+    result is cached.
+    """
+    profile = normalize_profile(preferences)
+    key = fingerprint(profile)
+
+    hit, value = tool_cache.get(TOOL, [key])
+    if hit:
+        _count("hit")
+        return value["destinations"]
+
+    threshold = settings.IDEATION_CACHE_SIMILARITY_THRESHOLD
+    if threshold is not None:
+        destinations = _nearest(profile, threshold)
+        if destinations:
+            _count("near_hit")
+            return destinations
+
+    _count("miss")
+    destinations = brainstorm()
+    if destinations:
+        tool_cache.put(TOOL, [key], {"profile": profile, "destinations": destinations})
+        _evict_overflow()
+    return destinations
+
+
+def stats() -> dict:
+    """e.g. {"hit": 3, "near_hit": 1, "miss": 4, "hit_rate": 0.5}"""
+    with _lock:
+        counts = {outcome: _counters[outcome] for outcome in ("hit", "near_hit", "miss")}
+    lookups = sum(counts.values())
+    counts["hit_rate"] = round((counts["hit"] + counts["near_hit"]) / lookups, 3) if lookups else 0.0
+    return counts
@@ -0,0 +1,245 @@
+# app/services/job_service.py
+"""
+Background jobs for the recommendation pipeline.
+
+Jobs are rows in the `recommendation_jobs` table and are executed by a small local thread
+pool, so no external broker is needed. A worker claims a job by taking a lease on it; the
+lease is renewed whenever the pipeline reports progress and by a heartbeat while the job runs,
+so a long wait for the LLM doesn't let it lapse. A poller picks up queued jobs and running jobs
+whose lease has expired, which is how jobs interrupted by a restart (or by a dead worker
+process) get resumed; jobs this process is still running are never picked up again. A job whose pipeline failed part-way is queued again and
+resumes from the pipeline's checkpoints. The poller also sweeps expired rows out of the tool cache.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import ai_service, tool_cache
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_stop = threading.Event()
+_poller: threading.Thread | None = None
+_running: set = set()  # ids of the jobs this process is executing
+_running_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, settings.JOB_WORKERS), thread_name_prefix="job")
+        return _executor
+
+
+def _active_job(trip_id: int, db: Session) -> models.RecommendationJob | None:
+    return db.query(models.RecommendationJob).filter(
+        models.RecommendationJob.trip_id == trip_id,
+        models.RecommendationJob.status.in_(["queued", "running"])
+    ).first()
+
+
+def submit_recommendation_job(trip_id: int, db: Session) -> models.RecommendationJob:
+    """
+    Queues a recommendation job for a trip, or returns the one already queued/running for it.
+    A unique index allows one active job per trip, so of two concurrent submits only one queues.
+    """
+    existing = _active_job(trip_id, db)
+    if existing:
+        return existing
+
+    now = time.time()
+    job = models.RecommendationJob(id=uuid.uuid4().hex, trip_id=trip_id, status="queued", stage="queued",
+                                   progress_done=0, progress_total=0, attempts=0, created_at=now, updated_at=now)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race to another submit; its job is the trip's job
+        db.rollback()
+        existing = _active_job(trip_id, db)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(job)
+
+    _get_executor().submit(_run_job, job.id)
+    return job
+
+
+def get_job(job_id: str, db: Session) -> models.RecommendationJob | None:
+    return db.query(models.RecommendationJob).filter(models.RecommendationJob.id == job_id).first()
+
+
+def _claimable(now: float):
+    job = models.RecommendationJob
+    return or_(job.status == "queued", and_(job.status == "running", job.lease_expires_at < now))
+
+
+def _claim(job_id: str) -> bool:
+    """Atomically moves a claimable job to 'running' under our lease. False if someone else has it."""
+    db = SessionLocal()
+    try:
+        now = time.time()
+        job = models.RecommendationJob
+        claimed = db.query(job).filter(job.id == job_id, _claimable(now)).update({
+            job.status: "running",
+            job.attempts: job.attempts + 1,
+            job.lease_expires_at: now + settings.JOB_LEASE_SECONDS,
+            job.updated_at: now,
+        }, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def _update(job_id: str, **fields):
+    db = SessionLocal()
+    try:
+        now = time.time()
+        fields["updated_at"] = now
+        if fields.get("status", "running") == "running":
+            fields["lease_expires_at"] = now + settings.JOB_LEASE_SECONDS
+        db.query(models.RecommendationJob).filter(models.RecommendationJob.id == job_id).update(
+            fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _renew_lease(job_id: str):
+    db = SessionLocal()
+    try:
+        job = models.RecommendationJob
+        db.query(job).filter(job.id == job_id, job.status == "running").update(
+            {job.lease_expires_at: time.time() + settings.JOB_LEASE_SECONDS}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _heartbeat(job_id: str, finished: threading.Event):
+    # Renews the lease well before it runs out, however long the pipeline goes without reporting progress
+    while not finished.wait(max(1.0, settings.JOB_LEASE_SECONDS / 3)):
+        try:
+            _renew_lease(job_id)
+        except Exception as e:
+            logger.warning("Error renewing recommendation job lease", extra={"job_id": job_id, "error": str(e)})
+
+
+def _run_job(job_id: str):
+    with _running_lock:
+        if job_id in _running:
+            return
+        _running.add(job_id)
+    try:
+        if _claim(job_id):
+            finished = threading.Event()
+            threading.Thread(target=_heartbeat, args=(job_id, finished), name=f"job-heartbeat-{job_id[:8]}",
+                             daemon=True).start()
+            try:
+                _execute(job_id)
+            finally:
+                finished.set()
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+
+
+def _execute(job_id: str):
+    db = SessionLocal()
+    job = None
+    try:
+        job = get_job(job_id, db)
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            _update(job_id, status="failed", error="Gave up after the job was interrupted too many times.")
+            return
+
+        def progress(stage: str, done: int, total: int):
+            _update(job_id, stage=stage, progress_done=done, progress_total=total)
+
+        recommendations = ai_service.generate_recommendations(trip_id=job.trip_id, db=db, progress=progress)
+        if recommendations is None:
+            _update(job_id, status="failed", error="Trip not found.")
+        else:
+            _update(job_id, status="completed", stage="persisted",
+                    recommendation_ids=[rec.id for rec in recommendations])
+    except ai_service.PipelineIncomplete as e:
+        # The finished stages are checkpointed; queue the job again so the poller resumes it from there
+        retry = job is not None and job.attempts < settings.JOB_MAX_ATTEMPTS
+        logger.warning("Recommendation job incomplete", extra={"job_id": job_id, "stage": e.stage, "retry": retry})
+        _update(job_id, status="queued" if retry else "failed", error=str(e))
+    except Exception as e:
+        logger.exception("Error in recommendation job", extra={"job_id": job_id})
+        _update(job_id, status="failed", error=str(e))
+    finally:
+        db.close()
+
+
+def resume_pending_jobs() -> int:
+    """
+    Dispatches every queued job and every running job whose worker lease has expired, except
+    the ones this process is running.
+    """
+    db = SessionLocal()
+    try:
+        job_ids = [job_id for (job_id,) in db.query(models.RecommendationJob.id).filter(_claimable(time.time()))]
+    finally:
+        db.close()
+    with _running_lock:
+        job_ids = [job_id for job_id in job_ids if job_id not in _running]
+    for job_id in job_ids:
+        _get_executor().submit(_run_job, job_id)
+    return len(job_ids)
+
+
+def _poll():
+    purged_at = 0.0
+    while not _stop.wait(settings.JOB_POLL_INTERVAL_SECONDS):
+        try:
+            resume_pending_jobs()
+        except Exception:
+            logger.exception("Error polling recommendation jobs")
+        # Expired tool results are only skipped on read, so the table is swept here
+        if time.time() - purged_at >= settings.TOOL_CACHE_PURGE_INTERVAL_SECONDS:
+            purged_at = time.time()
+            try:
+                tool_cache.purge_expired()
+            except Exception:
+                logger.exception("Error purging the tool cache")
+
+
+def start_worker():
+    """Resumes interrupted jobs and starts polling for new ones. Called on app startup."""
+    global _poller
+    if _poller is not None:
+        return
+    _stop.clear()
+    resumed = resume_pending_jobs()
+    if resumed:
+        logger.info("Resumed pending recommendation jobs", extra={"jobs": resumed})
+    _poller = threading.Thread(target=_poll, name="job-poller", daemon=True)
+    _poller.start()
+
+
+def stop_worker():
+    """Stops polling; running jobs keep their lease and are resumed by the next process if cut off."""
+    global _poller, _executor
+    _stop.set()
+    _poller = None
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,237 @@
+# app/services/llm.py
+"""
+The one place the app calls the LLM.
+
+Wraps litellm.completion so every call is measured: latency per model and purpose, prompt
+and completion tokens from the response's usage, and the estimated cost from litellm's
+pricing tables. `purpose` names the caller ("ideation", "summary", or an agent tool). Calls
+queue behind a shared per-model rate limiter (see app.services.llm_limiter). With
+LLM_PROVIDER=fake the calls go to the offline stand-in in app.services.fake_llm instead.
+extract_json pulls the JSON answer out of a free-text response; stream_completion and
+StreamedArray do the same for an answer that is still arriving. litellm is slow to import, so
+it's only loaded by the first real call, not when the app starts.
+"""
+import json
+import logging
+import re
+import time
+
+from app.core import metrics
+from app.core.config import settings
+from app.services import fake_llm
+from app.services import llm_limiter
+
+logger = logging.getLogger(__name__)
+
+
+def _litellm():
+    import litellm
+    return litellm
+
+
+def _record_usage(response, model: str, purpose: str) -> dict:
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    metrics.LLM_TOKENS.labels(model=model, purpose=purpose, kind="prompt").inc(prompt_tokens)
+    metrics.LLM_TOKENS.labels(model=model, purpose=purpose, kind="completion").inc(completion_tokens)
+
+    cost = 0.0
+    if settings.LLM_PROVIDER != "fake":
+        try:
+            cost = _litellm().completion_cost(completion_response=response) or 0.0
+        except Exception:
+            # Models missing from litellm's pricing tables just go uncounted
+            pass
+    metrics.LLM_COST_USD.labels(model=model, purpose=purpose).inc(cost)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": round(cost, 6)}
+
+
+def available() -> bool:
+    """True if LLM calls can be made: a Gemini key is configured, or the fake provider is on."""
+    return settings.LLM_PROVIDER == "fake" or bool(settings.GEMINI_API_KEY)
+
+
+def _provider_completion():
+    if settings.LLM_PROVIDER == "fake":
+        return fake_llm.completion
+    return _litellm().completion
+
+
+def _call(model: str, messages: list, purpose: str, estimated_tokens: int, **kwargs) -> tuple:
+    """
+    Calls the provider behind the model's rate limiter. 429/quota errors back the limiter off and
+    are retried up to LLM_MAX_RETRIES times; anything else (and the last rate-limit error) is
+    raised as litellm raised it. Returns (response, seconds queued, start time, retries).
+    """
+    attempt = 0
+    while True:
+        queued = llm_limiter.acquire(model, estimated_tokens)
+        started = time.perf_counter()
+        try:
+            response = _provider_completion()(model=model, messages=messages, api_key=settings.GEMINI_API_KEY, **kwargs)
+            return response, queued, started, attempt
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            metrics.LLM_REQUEST_SECONDS.labels(model=model, purpose=purpose).observe(elapsed)
+            rate_limited = llm_limiter.is_rate_limit_error(e)
+            metrics.LLM_REQUESTS.labels(model=model, purpose=purpose,
+                                        outcome="rate_limited" if rate_limited else "error").inc()
+            if rate_limited and attempt < settings.LLM_MAX_RETRIES:
+                # The backoff is enforced by the limiter, so other callers of this model wait it out too
+                llm_limiter.throttled(model)
+                attempt += 1
+                continue
+            logger.warning("llm call failed", extra={
+                "model": model, "purpose": purpose, "duration_ms": round(elapsed * 1000, 1), "error": str(e)})
+            raise
+
+
+def _finished(response, model: str, purpose: str, estimated_tokens: int, queued: float, started: float, retries: int):
+    elapsed = time.perf_counter() - started
+    metrics.LLM_REQUEST_SECONDS.labels(model=model, purpose=purpose).observe(elapsed)
+    metrics.LLM_REQUESTS.labels(model=model, purpose=purpose, outcome="ok").inc()
+    usage = _record_usage(response, model, purpose)
+    llm_limiter.succeeded(model, estimated_tokens, usage["prompt_tokens"] + usage["completion_tokens"])
+    logger.info("llm call finished", extra={
+        "model": model, "purpose": purpose, "duration_ms": round(elapsed * 1000, 1),
+        "queued_ms": round(queued * 1000, 1), "retries": retries, **usage})
+
+
+def completion(messages: list, purpose: str, model: str = None, **kwargs):
+    """
+    litellm.completion behind the model's rate limiter, with metrics and a structured log line.
+    Rate-limit errors are retried as described in _call.
+    """
+    model = model or settings.LLM_MODEL
+    estimated_tokens = llm_limiter.estimate_tokens(messages)
+    response, queued, started, retries = _call(model, messages, purpose, estimated_tokens, **kwargs)
+    _finished(response, model, purpose, estimated_tokens, queued, started, retries)
+    return response
+
+
+def _streamed_response(chunks: list, messages: list):
+    """A response carrying the usage of a finished stream, for _record_usage."""
+    if settings.LLM_PROVIDER == "fake":
+        # The fake provider reports usage on its last chunk, like OpenAI's include_usage
+        return chunks[-1] if chunks else None
+    return _litellm().stream_chunk_builder(chunks, messages=messages)
+
+
+def stream_completion(messages: list, purpose: str, model: str = None, **kwargs):
+    """
+    Like completion, but streams the answer: yields its text piece by piece as the provider
+    sends it. Only opening the stream is retried on rate limits; once text has been yielded, a
+    failure is raised to the caller. Usage, cost and latency are recorded when the stream ends.
+    """
+    model = model or settings.LLM_MODEL
+    estimated_tokens = llm_limiter.estimate_tokens(messages)
+    stream, queued, started, retries = _call(model, messages, purpose, estimated_tokens, stream=True, **kwargs)
+    chunks = []
+    try:
+        for chunk in stream:
+            if not chunks:
+                metrics.LLM_FIRST_TOKEN_SECONDS.labels(model=model, purpose=purpose).observe(time.perf_counter() - started)
+            chunks.append(chunk)
+            choices = getattr(chunk, "choices", None)
+            text = getattr(choices[0].delta, "content", None) if choices else None
+            if text:
+                yield text
+    except Exception as e:
+        elapsed = time.perf_counter() - started
+        metrics.LLM_REQUEST_SECONDS.labels(model=model, purpose=purpose).observe(elapsed)
+        metrics.LLM_REQUESTS.labels(model=model, purpose=purpose, outcome="error").inc()
+        logger.warning("llm stream failed", extra={
+            "model": model, "purpose": purpose, "duration_ms": round(elapsed * 1000, 1),
+            "chunks": len(chunks), "error": str(e)})
+        raise
+    _finished(_streamed_response(chunks, messages), model, purpose, estimated_tokens, queued, started, retries)
+
+
+def response_text(response) -> str:
+    return response.choices[0].message.content
+
+
+def extract_json(text: str, kind: type = dict, required_key: str | None = None):
+    """
+    Returns the first JSON value of type `kind` (dict or list) embedded in an LLM response,
+    skipping prose, code fences and any earlier JSON that doesn't fit (with `required_key`,
+    a dict must have that key). Each candidate is decoded with raw_decode from its opening
+    bracket, so trailing text or a second object after it doesn't break the parse the way a
+    greedy regex does. Raises ValueError if there's no such value.
+    """
+    decoder = json.JSONDecoder()
+    opener = "{" if kind is dict else "["
+    text = text or ""
+    start = text.find(opener)
+    while start != -1:
+        try:
+            value, end = decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find(opener, start + 1)
+            continue
+        if isinstance(value, kind) and (required_key is None or required_key in value):
+            return value
+        start = text.find(opener, end)
+    raise ValueError(f"No JSON {kind.__name__} found in the response" + (f" with key '{required_key}'" if required_key else ""))
+
+
+class StreamedArray:
+    """
+    Incremental parser for an answer shaped like {"<key>": [{...}, {...}, ...]} that is still
+    arriving. feed() takes the next piece of text and returns the array's objects that closed in
+    it, so each can be used before the rest of the answer exists. Text around the JSON is
+    skipped, as by extract_json; an item that isn't a valid object is dropped. `closed` tells a
+    complete array from a truncated one.
+    """
+
+    def __init__(self, key: str):
+        self._start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.text = ""
+        self.closed = False
+        self._pos = None  # where scanning resumes, once the array has been found
+        self._depth = 0
+        self._item_start = None
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list:
+        self.text += text
+        if self._pos is None:
+            match = self._start.search(self.text)
+            if match is None:
+                return []
+            self._pos = match.end()
+
+        items = []
+        buffer, i = self.text, self._pos
+        while i < len(buffer) and not self.closed:
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    self.closed = char == "]"
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            item = json.loads(buffer[self._item_start:i + 1])
+                        except ValueError:
+                            item = None
+                        if isinstance(item, dict):
+                            items.append(item)
+            i += 1
+        self._pos = i
+        return items
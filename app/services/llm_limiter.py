@@ -0,0 +1,165 @@
+# app/services/llm_limiter.py
+"""
+Adaptive rate limiting for LLM calls.
+
+Every model has two token buckets, requests per minute and tokens per minute
+(settings.LLM_RATE_LIMITS, falling back to the LLM_DEFAULT_* limits, which are unlimited
+unless configured). Their state lives
+in a small JSON file per model under LLM_LIMITER_STATE_DIR, read and written under an
+exclusive file lock. That way every thread and every worker process on the machine draws
+from the same buckets. Where file locking isn't available the state stays in memory and
+is only shared within the process.
+
+A 429/quota error blocks the model for an exponentially growing, jittered backoff and
+halves its effective rate, if it has one. Each success wins back a small part of the rate
+(additive increase, multiplicative decrease), so throughput settles just below the real
+quota.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coordination
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_memory_state: dict[str, dict] = {}
+
+_MIN_SCALE = 0.1
+
+
+class RateLimitTimeout(TimeoutError):
+    """Waited longer than LLM_LIMITER_MAX_WAIT_SECONDS for the model's rate limit."""
+
+
+def _limits(model: str) -> tuple[float, float]:
+    limits = settings.LLM_RATE_LIMITS.get(model, {})
+    return (limits.get("requests_per_minute", settings.LLM_DEFAULT_REQUESTS_PER_MINUTE),
+            limits.get("tokens_per_minute", settings.LLM_DEFAULT_TOKENS_PER_MINUTE))
+
+
+def _state_path(model: str) -> str:
+    directory = settings.LLM_LIMITER_STATE_DIR or os.path.join(tempfile.gettempdir(), "chalovote-llm-limiter")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, hashlib.sha1(model.encode("utf-8")).hexdigest()[:16] + ".json")
+
+
+@contextmanager
+def _locked_state(model: str):
+    """Yields the model's limiter state for read-modify-write; changes are saved on exit."""
+    with _lock:
+        if fcntl is None:
+            yield _memory_state.setdefault(model, {})
+            return
+        with open(_state_path(model), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _refill(state: dict, model: str, now: float) -> list:
+    """Tops up both buckets for the time since the last update. Returns [(name, rate/s, capacity)] of the active ones."""
+    scale = state.get("scale", 1.0)
+    elapsed = max(0.0, now - state.get("updated", now))
+    state["updated"] = now
+    buckets = []
+    for name, per_minute in zip(("requests", "tokens"), _limits(model)):
+        if not per_minute:
+            continue
+        rate = per_minute * scale / 60
+        capacity = max(1.0, rate * settings.LLM_RATE_BURST_SECONDS)
+        state[name] = min(capacity, state.get(name, capacity) + elapsed * rate)
+        buckets.append((name, rate, capacity))
+    return buckets
+
+
+def _try_take(state: dict, model: str, tokens: int, now: float) -> float:
+    """Takes one request and `tokens` from the buckets if they're all available; else returns how long to wait."""
+    if state.get("blocked_until", 0) > now:
+        return state["blocked_until"] - now
+
+    buckets = _refill(state, model, now)
+    needs = {name: (1 if name == "requests" else min(tokens, capacity)) for name, _, capacity in buckets}
+    wait = max([(needs[name] - state[name]) / rate for name, rate, _ in buckets if state[name] < needs[name]], default=0.0)
+    if wait <= 0:
+        for name, need in needs.items():
+            state[name] -= need
+    return wait
+
+
+def acquire(model: str, estimated_tokens: int) -> float:
+    """Blocks until the model's limits allow another call. Returns the seconds spent waiting."""
+    started = time.time()
+    while True:
+        with _locked_state(model) as state:
+            wait = _try_take(state, model, estimated_tokens, time.time())
+        waited = time.time() - started
+        if wait <= 0:
+            metrics.LLM_LIMITER_WAIT_SECONDS.labels(model=model).observe(waited)
+            return waited
+        if waited + wait > settings.LLM_LIMITER_MAX_WAIT_SECONDS:
+            metrics.LLM_LIMITER_WAIT_SECONDS.labels(model=model).observe(waited)
+            raise RateLimitTimeout(f"Gave up waiting {waited:.0f}s for the {model} rate limit")
+        # A little jitter keeps waiting threads and processes from all waking at once
+        time.sleep(wait + random.uniform(0, 0.05))
+
+
+def succeeded(model: str, estimated_tokens: int, actual_tokens: int | None):
+    """Settles the token estimate against actual usage and wins back some of the rate."""
+    with _locked_state(model) as state:
+        if actual_tokens and "tokens" in state:
+            state["tokens"] -= actual_tokens - estimated_tokens
+        state["scale"] = min(1.0, state.get("scale", 1.0) + settings.LLM_RATE_RECOVERY_STEP)
+        state["strikes"] = 0
+
+
+def throttled(model: str) -> float:
+    """Records a 429/quota error: halves the rate and blocks the model for a jittered backoff. Returns the backoff."""
+    metrics.LLM_RATE_LIMITED.labels(model=model).inc()
+    with _locked_state(model) as state:
+        now = time.time()
+        strikes = state.get("strikes", 0)
+        backoff = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** strikes)
+        backoff *= random.uniform(0.5, 1.0)
+        state["strikes"] = strikes + 1
+        state["scale"] = max(_MIN_SCALE, state.get("scale", 1.0) / 2)
+        state["blocked_until"] = max(state.get("blocked_until", 0), now + backoff)
+        scale = state["scale"]
+    logger.warning("LLM rate limited; backing off", extra={
+        "model": model, "backoff_seconds": round(backoff, 2), "rate_scale": round(scale, 3)})
+    return backoff
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message or "resource exhausted" in message
+
+
+def estimate_tokens(messages: list) -> int:
+    """Rough prompt size (~4 characters per token) plus the completion we expect back."""
+    characters = sum(len(str(message.get("content", ""))) for message in messages)
+    return characters // 4 + settings.LLM_EXPECTED_COMPLETION_TOKENS
@@ -1,11 +1,384 @@
-from twilio.rest import Client
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+import logging
+import random
+import threading
+import time
+import uuid
+
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import Session
+from app.core import metrics
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app import models
+
+logger = logging.getLogger(__name__)
+
+
+# --- Providers ---
+# Each provider keeps one long-lived client. SMS providers send one message at a time;
+# email providers send one multi-recipient request per batch. The provider SDKs are imported
+# when a client is first needed, so starting the app (a serverless cold start) doesn't load them.
+
+class TwilioSmsProvider:
+    name = "twilio"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+            return self._client
+
+    def send(self, to_number: str, body: str) -> str:
+        message = self.client.messages.create(body=body, from_=settings.TWILIO_PHONE_NUMBER, to=to_number)
+        return message.sid
+
+
+class SendGridEmailProvider:
+    name = "sendgrid"
+    # SendGrid accepts up to 1000 personalizations per request
+    max_batch = 1000
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from sendgrid import SendGridAPIClient
+                self._client = SendGridAPIClient(settings.SENDGRID_API_KEY)
+            return self._client
+
+    def send_batch(self, subject: str, messages: list) -> str | None:
+        """
+        Sends one email per (to_email, html_content) pair in a single request. Every recipient
+        gets their own personalization, so they don't see each other and keep their own body.
+        """
+        from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
+        mail = Mail(from_email=settings.SENDER_EMAIL, subject=subject, html_content="-body-")
+        for to_email, html_content in messages:
+            personalization = Personalization()
+            personalization.add_to(To(to_email))
+            personalization.add_substitution(Substitution("-body-", html_content))
+            mail.add_personalization(personalization)
+        response = self.client.send(mail)
+        if response.status_code >= 400:
+            raise RuntimeError(f"SendGrid returned {response.status_code}")
+        return response.headers.get("X-Message-Id") if response.headers else None
+
+
+class LogSmsProvider:
+    """Used when Twilio credentials aren't configured: logs instead of sending."""
+    name = "log-sms"
+
+    def send(self, to_number: str, body: str) -> str:
+        logger.info("Skipping SMS: Twilio credentials not found", extra={"to": to_number, "body": body})
+        return "logged"
+
+
+class LogEmailProvider:
+    """Used when SendGrid credentials aren't configured: logs instead of sending."""
+    name = "log-email"
+    max_batch = 1000
+
+    def send_batch(self, subject: str, messages: list) -> str:
+        for to_email, html_content in messages:
+            logger.info("Skipping email: SendGrid credentials not found",
+                        extra={"to": to_email, "subject": subject, "body": html_content})
+        return "logged"
+
+
+class FakeSmsProvider:
+    """In-memory SMS provider for local runs and tests. Fails the first `fail_times` sends."""
+    name = "fake-sms"
+
+    def __init__(self, latency: float = 0.0, fail_times: int = 0):
+        self.latency = latency
+        self.fail_times = fail_times
+        self.sent = []
+
+    def send(self, to_number: str, body: str) -> str:
+        time.sleep(self.latency)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("fake SMS failure")
+        self.sent.append((to_number, body))
+        return f"fake-sms-{len(self.sent)}"
+
+
+class FakeEmailProvider:
+    """In-memory email provider for local runs and tests. Records every batch it was asked to send."""
+    name = "fake-email"
+    max_batch = 1000
+
+    def __init__(self, latency: float = 0.0, fail_times: int = 0):
+        self.latency = latency
+        self.fail_times = fail_times
+        self.batches = []
+
+    def send_batch(self, subject: str, messages: list) -> str:
+        time.sleep(self.latency)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise RuntimeError("fake email failure")
+        self.batches.append((subject, list(messages)))
+        return f"fake-email-{len(self.batches)}"
+
+
+def default_sms_provider():
+    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
+        return TwilioSmsProvider()
+    return LogSmsProvider()
+
+
+def default_email_provider():
+    if settings.SENDGRID_API_KEY and settings.SENDER_EMAIL:
+        return SendGridEmailProvider()
+    return LogEmailProvider()
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` requests per second on average, with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- Outbox ---
+
+def _channel(contact_info: str) -> str:
+    return "email" if "@" in contact_info else "sms"
+
+
+def enqueue_notification(db: Session, contact_info: str, message: str, subject: str = "Your new trip awaits!"):
+    """
+    Adds a notification to the outbox as part of the caller's transaction; nothing is sent
+    until the caller commits and the dispatcher picks it up.
+    """
+    enqueue_notifications(db, [(contact_info, message)], subject=subject)
+
+
+def enqueue_notifications(db: Session, messages: list, subject: str = "Your new trip awaits!"):
+    """Bulk version of enqueue_notification for (contact_info, message) pairs."""
+    if not messages:
+        return
+    now = time.time()
+    db.execute(insert(models.OutboxMessage), [
+        {
+            "channel": _channel(contact_info),
+            "recipient": contact_info,
+            "subject": subject,
+            "body": message,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for contact_info, message in messages
+    ])
+
+
+class OutboxDispatcher:
+    """
+    Drains the notification outbox: claims due messages, sends emails in multi-recipient
+    batches and SMS one by one through rate-limited, long-lived provider clients, and records
+    the outcome of every message. Failed sends are retried with exponential backoff.
+    """
+
+    def __init__(self, sms_provider=None, email_provider=None, session_factory=SessionLocal):
+        self.sms_provider = sms_provider or default_sms_provider()
+        self.email_provider = email_provider or default_email_provider()
+        self.session_factory = session_factory
+        self.sms_limiter = RateLimiter(settings.SMS_RATE_PER_SECOND, burst=settings.SMS_RATE_BURST)
+        self.email_limiter = RateLimiter(settings.EMAIL_RATE_PER_SECOND, burst=settings.EMAIL_RATE_BURST)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _claim(self, db: Session, limit: int) -> list:
+        now = time.time()
+        token = uuid.uuid4().hex
+        outbox = models.OutboxMessage
+        due = or_(
+            and_(outbox.status == "pending", outbox.next_attempt_at <= now),
+            and_(outbox.status == "sending", outbox.lease_expires_at < now),
+        )
+        ids = [message_id for (message_id,) in db.query(outbox.id).filter(due).order_by(outbox.id).limit(limit)]
+        if not ids:
+            return []
+        # Re-check the condition in the UPDATE so two dispatchers never claim the same message
+        db.query(outbox).filter(outbox.id.in_(ids), due).update({
+            outbox.status: "sending",
+            outbox.claim_token: token,
+            outbox.lease_expires_at: now + settings.OUTBOX_LEASE_SECONDS,
+        }, synchronize_session=False)
+        db.commit()
+        return db.query(outbox).filter(outbox.claim_token == token, outbox.status == "sending").order_by(outbox.id).all()
+
+    def _succeeded(self, message: models.OutboxMessage, provider_message_id: str | None):
+        message.status = "sent"
+        message.sent_at = time.time()
+        metrics.NOTIFICATION_DELIVERY_SECONDS.labels(channel=message.channel).observe(message.sent_at - message.created_at)
+        message.attempts += 1
+        message.provider_message_id = provider_message_id
+        message.last_error = None
+
+    def _failed(self, message: models.OutboxMessage, error: Exception):
+        message.attempts += 1
+        message.last_error = str(error)[:500]
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = "failed"
+        else:
+            backoff = settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** (message.attempts - 1))
+            message.status = "pending"
+            message.next_attempt_at = time.time() + backoff * random.uniform(0.8, 1.2)
+
+    def _send_emails(self, db: Session, messages: list):
+        by_subject: dict[str, list] = {}
+        for message in messages:
+            by_subject.setdefault(message.subject or "", []).append(message)
+
+        for subject, group in by_subject.items():
+            batch_size = max(1, min(settings.EMAIL_BATCH_SIZE, self.email_provider.max_batch))
+            for start in range(0, len(group), batch_size):
+                batch = group[start:start + batch_size]
+                self.email_limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    provider_id = self.email_provider.send_batch(subject, [(m.recipient, m.body) for m in batch])
+                    for message in batch:
+                        self._succeeded(message, provider_id)
+                    metrics.NOTIFICATIONS.labels(channel="email", outcome="sent").inc(len(batch))
+                except Exception as e:
+                    logger.warning("Error sending email batch", extra={"batch_size": len(batch), "error": str(e)})
+                    metrics.NOTIFICATIONS.labels(channel="email", outcome="failed").inc(len(batch))
+                    for message in batch:
+                        self._failed(message, e)
+                metrics.NOTIFICATION_SEND_SECONDS.labels(channel="email").observe(time.perf_counter() - started)
+                self._release(db, batch)
+
+    def _send_sms(self, db: Session, messages: list):
+        for message in messages:
+            self.sms_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                self._succeeded(message, self.sms_provider.send(message.recipient, message.body))
+                metrics.NOTIFICATIONS.labels(channel="sms", outcome="sent").inc()
+            except Exception as e:
+                logger.warning("Error sending SMS", extra={"to": message.recipient, "error": str(e)})
+                metrics.NOTIFICATIONS.labels(channel="sms", outcome="failed").inc()
+                self._failed(message, e)
+            metrics.NOTIFICATION_SEND_SECONDS.labels(channel="sms").observe(time.perf_counter() - started)
+            self._release(db, [message])
+
+    def _release(self, db: Session, messages: list):
+        """Records the outcome of sent messages right away so their status is visible while the rest go out."""
+        for message in messages:
+            message.claim_token = None
+            message.lease_expires_at = None
+        db.commit()
+
+    def drain(self, limit: int | None = None) -> int:
+        """Sends every message that is due, in batches. Returns how many messages were processed."""
+        processed = 0
+        db = self.session_factory()
+        try:
+            while limit is None or processed < limit:
+                batch_limit = settings.OUTBOX_CLAIM_SIZE if limit is None else min(settings.OUTBOX_CLAIM_SIZE, limit - processed)
+                messages = self._claim(db, batch_limit)
+                if not messages:
+                    break
+                self._send_emails(db, [m for m in messages if m.channel == "email"])
+                self._send_sms(db, [m for m in messages if m.channel == "sms"])
+                processed += len(messages)
+        finally:
+            db.close()
+        return processed
+
+    def wake(self):
+        """Asks the background thread to drain now instead of at its next poll."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Error draining notification outbox")
+            self._wake.wait(settings.OUTBOX_POLL_INTERVAL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """
+        Stops the background thread and waits up to `timeout` (OUTBOX_STOP_TIMEOUT_SECONDS) for a
+        drain in progress to finish, so it doesn't outlive the engine or overlap a restarted dispatcher.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(settings.OUTBOX_STOP_TIMEOUT_SECONDS if timeout is None else timeout)
+            if self._thread.is_alive():
+                # Its claimed messages are sent again once their lease expires
+                logger.warning("Outbox dispatcher still sending at shutdown")
+            self._thread = None
+
+
+_dispatcher: OutboxDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> OutboxDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = OutboxDispatcher()
+        return _dispatcher
+
+
+def set_dispatcher(dispatcher: OutboxDispatcher):
+    """Swaps the process-wide dispatcher, e.g. for one built with fake providers."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+        _dispatcher = dispatcher
+
+
+# --- Direct sending ---
 
 def send_notification(contact_info: str, message: str, subject: str = "Your new trip awaits!"):
     """
     Determines whether to send an SMS or Email based on the contact_info.
+    Sends immediately; prefer enqueue_notification inside a transaction.
     """
     if "@" in contact_info:
         # It's an email
@@ -18,40 +391,18 @@ def send_sms(to_number: str, body: str):
     """
     Sends an SMS using Twilio.
     """
-    # Only try to send if the credentials are set
-    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-        try:
-            client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-            message = client.messages.create(
-                body=body,
-                from_=settings.TWILIO_PHONE_NUMBER,
-                to=to_number
-            )
-            print(f"SMS sent to {to_number}. SID: {message.sid}")
-        except Exception as e:
-            print(f"Error sending SMS to {to_number}: {e}")
-    else:
-        print("--- SKIPPING SMS: Twilio credentials not found. ---")
-        print(f"TO: {to_number}\nBODY: {body}")
+    try:
+        sid = get_dispatcher().sms_provider.send(to_number, body)
+        logger.info("SMS sent", extra={"to": to_number, "sid": sid})
+    except Exception as e:
+        logger.warning("Error sending SMS", extra={"to": to_number, "error": str(e)})
 
 def send_email(to_email: str, subject: str, html_content: str):
     """
     Sends an email using SendGrid.
     """
-    # Only try to send if the credentials are set
-    if settings.SENDGRID_API_KEY and settings.SENDER_EMAIL:
-        message = Mail(
-            from_email=settings.SENDER_EMAIL,
-            to_emails=to_email,
-            subject=subject,
-            html_content=html_content
-        )
-        try:
-            sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-            response = sg.send(message)
-            print(f"Email sent to {to_email}. Status Code: {response.status_code}")
-        except Exception as e:
-            print(f"Error sending email to {to_email}: {e}")
-    else:
-        print("--- SKIPPING EMAIL: SendGrid credentials not found. ---")
-        print(f"TO: {to_email}\nSUBJECT: {subject}\nBODY: {html_content}")
\ No newline at end of file
+    try:
+        get_dispatcher().email_provider.send_batch(subject, [(to_email, html_content)])
+        logger.info("Email sent", extra={"to": to_email})
+    except Exception as e:
+        logger.warning("Error sending email", extra={"to": to_email, "error": str(e)})
@@ -0,0 +1,102 @@
+# app/services/page_cache.py
+"""
+Conditional GETs and a rendered-page cache for the trip pages.
+
+Every trip carries a version that's bumped by each write to it, its recommendations, votes or
+surveys (trip_service.bump_version). A page is identified by (page, trip, version), plus a
+variant for pages rendered per participant: that's its ETag, and the key its rendered HTML is
+cached under in a bounded in-process LRU. An unchanged
+page costs one primary-key lookup of the version: a 304 if the client already has it, the
+cached HTML otherwise. Old versions are never invalidated explicitly; nothing asks for them any
+more, so they fall out of the LRU.
+"""
+import threading
+from collections import Counter, OrderedDict
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core.config import settings
+
+_lock = threading.Lock()
+_pages: "OrderedDict[tuple, bytes]" = OrderedDict()  # (page, trip_id, version, variant) -> rendered HTML
+_counters: Counter = Counter()  # (page, outcome) -> count
+
+
+def _count(page: str, outcome: str):
+    with _lock:
+        _counters[(page, outcome)] += 1
+
+
+def _get(key: tuple) -> bytes | None:
+    with _lock:
+        body = _pages.get(key)
+        if body is not None:
+            _pages.move_to_end(key)
+        return body
+
+
+def _put(key: tuple, body: bytes):
+    with _lock:
+        _pages[key] = body
+        _pages.move_to_end(key)
+        while len(_pages) > settings.PAGE_CACHE_MAX_ENTRIES:
+            _pages.popitem(last=False)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    # Only the version ETag is trusted: a Last-Modified date has whole-second resolution, so a
+    # write in the same second as the client's copy would get a 304 for stale content
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+async def serve(request: Request, db: AsyncSession, page: str, trip_id: int, render, variant=None) -> Response:
+    """
+    Serves trip page `page` as a 304, from the cache, or by awaiting `render()`, which builds
+    the full response (and may raise, e.g. a 404). Only 200 responses are cached. `variant`
+    tells apart versions of a page that differ by more than the trip, e.g. a participant id.
+    """
+    version = (await db.execute(select(models.Trip.version).where(models.Trip.id == trip_id))).scalar()
+    if version is None or not settings.PAGE_CACHE_ENABLED:
+        return await render()
+
+    etag = f'W/"{page}-{trip_id}-{version}"' if variant is None else f'W/"{page}-{trip_id}-{variant}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _not_modified(request, etag):
+        _count(page, "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    key = (page, trip_id, version, variant)
+    body = _get(key)
+    if body is not None:
+        _count(page, "hit")
+        return HTMLResponse(body, headers=headers)
+
+    _count(page, "miss")
+    response = await render()
+    if response.status_code == 200:
+        _put(key, response.body)
+        response.headers.update(headers)
+    return response
+
+
+def clear():
+    with _lock:
+        _pages.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        entries = len(_pages)
+    pages = {}
+    for (page, outcome), count in counters.items():
+        pages.setdefault(page, {"not_modified": 0, "hit": 0, "miss": 0})[outcome] = count
+    return {"entries": entries, "max_entries": settings.PAGE_CACHE_MAX_ENTRIES, "pages": pages}
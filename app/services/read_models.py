@@ -0,0 +1,215 @@
+# app/services/read_models.py
+"""
+Read models for the HTML pages.
+
+Each loader fetches everything its page renders in a fixed number of queries, using explicit
+eager loading, and returns plain frozen dataclasses. Templates never touch an ORM object, so
+they can't trigger lazy loads however many participants or recommendations a trip has.
+Loaders return None when the trip or participant doesn't exist.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app import models
+from app.services import survey_service, travel_service, voting_service
+
+
+@dataclass(frozen=True)
+class ParticipantView:
+    id: int
+    contact_info: str
+    start_location: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class HotelView:
+    name: str
+    rating: Optional[str] = None
+    price: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class RecommendationView:
+    id: int
+    trip_id: int
+    destination_name: str
+    reason: Optional[str] = None
+    estimated_budget: Optional[str] = None
+    details: dict = field(default_factory=dict)
+    top_stays: list = field(default_factory=list)  # [HotelView], only loaded for the trip status page
+
+
+@dataclass(frozen=True)
+class TravelView:
+    recommendation_id: int
+    destination_name: str
+    origin: Optional[str] = None
+    route_text: Optional[str] = None
+    distance_km: Optional[int] = None
+    estimated_fuel_cost: Optional[str] = None
+    flight_estimate: Optional[str] = None
+    map_url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class TripView:
+    id: int
+    name: str
+    status: str
+    participants: list = field(default_factory=list)  # [ParticipantView]
+    recommendations: list = field(default_factory=list)  # [RecommendationView]
+
+
+@dataclass(frozen=True)
+class TripStatusPage:
+    trip: TripView
+    vote_count: int
+    voted_participant_ids: frozenset
+
+
+@dataclass(frozen=True)
+class ResultsPage:
+    winner: Optional[RecommendationView]
+    analysis: Optional[dict]
+    names: dict  # recommendation id -> destination name
+
+
+@dataclass(frozen=True)
+class SurveyPage:
+    participant: ParticipantView
+    trip_name: str
+
+
+@dataclass(frozen=True)
+class ParticipantTravelPage:
+    participant: ParticipantView
+    trip_name: str
+    travel: list = field(default_factory=list)  # [TravelView], one per recommendation
+
+
+@dataclass(frozen=True)
+class PendingSurveysPage:
+    trip_name: str
+    participant_count: int
+    response_count: int
+    pending: list = field(default_factory=list)  # [ParticipantView] who haven't answered
+
+
+def _participant_view(participant: models.Participant) -> ParticipantView:
+    return ParticipantView(id=participant.id, contact_info=participant.contact_info,
+                           start_location=participant.start_location)
+
+
+def _recommendation_view(rec: models.Recommendation, with_hotels: bool = False) -> RecommendationView:
+    top_stays = [HotelView(name=h.name, rating=h.rating, price=h.price)
+                 for h in rec.hotels if h.source == "top_stay"] if with_hotels else []
+    return RecommendationView(id=rec.id, trip_id=rec.trip_id, destination_name=rec.destination_name,
+                              reason=rec.reason, estimated_budget=rec.estimated_budget, details=rec.details or {},
+                              top_stays=top_stays)
+
+
+def _trip_view(trip: models.Trip, with_participants: bool = True, with_hotels: bool = False) -> TripView:
+    return TripView(
+        id=trip.id,
+        name=trip.name,
+        status=trip.status,
+        participants=[_participant_view(p) for p in trip.participants] if with_participants else [],
+        recommendations=[_recommendation_view(rec, with_hotels) for rec in trip.recommendations],
+    )
+
+
+def load_trip_status(db: Session, trip_id: int) -> Optional[TripStatusPage]:
+    """
+    Trip status page: the trip, its participants, its recommendations with their stays, and
+    who has voted. Participants' travel info is fetched per participant (load_participant_travel),
+    so the page doesn't grow with participants x recommendations. 5 queries.
+    """
+    trip = db.query(models.Trip).options(
+        selectinload(models.Trip.participants),
+        selectinload(models.Trip.recommendations).selectinload(models.Recommendation.hotels),
+    ).filter(models.Trip.id == trip_id).first()
+    if not trip:
+        return None
+
+    voted_participant_ids = frozenset(participant_id for (participant_id,) in db.query(models.Vote.participant_id).join(
+        models.Participant).filter(models.Participant.trip_id == trip_id))
+    return TripStatusPage(trip=_trip_view(trip, with_hotels=True), vote_count=len(voted_participant_ids),
+                          voted_participant_ids=voted_participant_ids)
+
+
+def load_voting_page(db: Session, trip_id: int) -> Optional[TripView]:
+    """Voting page: the trip and its recommendations. 2 queries."""
+    trip = db.query(models.Trip).options(selectinload(models.Trip.recommendations)).filter(
+        models.Trip.id == trip_id).first()
+    if not trip:
+        return None
+    return _trip_view(trip, with_participants=False)
+
+
+def load_results_page(db: Session, trip_id: int) -> ResultsPage:
+    """
+    Results page: the winner and every counting method's result from the maintained tally,
+    plus the names of the trip's recommendations. 2 queries while the tally is current; the
+    first view after a ballot changed re-tallies: 6 queries, writes included.
+    """
+    tally = voting_service.current_tally(trip_id, db)
+    recommendations = [_recommendation_view(rec) for rec in
+                       db.query(models.Recommendation).filter(models.Recommendation.trip_id == trip_id)]
+
+    winner = None
+    if tally.ballot_count and tally.winner_recommendation_id is not None:
+        winner = next((rec for rec in recommendations if rec.id == tally.winner_recommendation_id), None)
+    return ResultsPage(
+        winner=winner,
+        analysis=tally.analysis if tally.ballot_count else None,
+        names={rec.id: rec.destination_name for rec in recommendations},
+    )
+
+
+def load_survey_page(db: Session, participant_id: int) -> Optional[SurveyPage]:
+    """Survey page: the participant and their trip's name. 1 query."""
+    participant = db.query(models.Participant).options(joinedload(models.Participant.trip)).filter(
+        models.Participant.id == participant_id).first()
+    if not participant:
+        return None
+    return SurveyPage(participant=_participant_view(participant), trip_name=participant.trip.name)
+
+
+def load_participant_travel(db: Session, trip_id: int, participant_id: int) -> Optional[ParticipantTravelPage]:
+    """One participant's travel info for each of their trip's recommendations. 2 queries."""
+    participant = db.query(models.Participant).options(joinedload(models.Participant.trip)).filter(
+        models.Participant.id == participant_id, models.Participant.trip_id == trip_id).first()
+    if not participant:
+        return None
+
+    rows = db.query(models.RecommendationTravel, models.Recommendation.destination_name).join(
+        models.Recommendation, models.Recommendation.id == models.RecommendationTravel.recommendation_id).filter(
+        models.RecommendationTravel.participant_id == participant_id, models.Recommendation.trip_id == trip_id
+    ).order_by(models.Recommendation.id)
+    travel = []
+    for row, destination_name in rows:
+        map_url = travel_service.map_url(row.origin, destination_name) if row.origin and destination_name else None
+        travel.append(TravelView(
+            recommendation_id=row.recommendation_id, destination_name=destination_name, origin=row.origin,
+            route_text=row.route_text, distance_km=row.distance_km, estimated_fuel_cost=row.estimated_fuel_cost,
+            flight_estimate=row.flight_estimate, map_url=map_url))
+    return ParticipantTravelPage(participant=_participant_view(participant), trip_name=participant.trip.name,
+                                 travel=travel)
+
+
+def load_pending_surveys(db: Session, trip_id: int) -> Optional[PendingSurveysPage]:
+    """Who hasn't answered the survey yet, from the trip's preference summary. 3 queries."""
+    trip = db.query(models.Trip).options(selectinload(models.Trip.participants)).filter(
+        models.Trip.id == trip_id).first()
+    if not trip:
+        return None
+
+    respondent_ids = set(survey_service.preference_summary(trip_id, db)["respondent_ids"])
+    return PendingSurveysPage(
+        trip_name=trip.name,
+        participant_count=len(trip.participants),
+        response_count=len(respondent_ids),
+        pending=[_participant_view(p) for p in trip.participants if p.id not in respondent_ids],
+    )
@@ -0,0 +1,132 @@
+from collections import Counter
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import models
+from app.services import trip_service
+
+
+def _interests(preferences: dict) -> list:
+    """A response's interests, each counted once and blanks dropped."""
+    return list(dict.fromkeys(i.strip() for i in (preferences or {}).get("interests", []) if i and i.strip()))
+
+
+def _budget(preferences: dict) -> str | None:
+    return (preferences or {}).get("budget") or None
+
+
+def summarize(responses) -> dict:
+    """
+    Summary fields for (participant_id, start_location, preferences) rows, one per respondent.
+    Used to (re)build a summary from scratch; submissions update it incrementally.
+    """
+    interests, budgets, locations = Counter(), Counter(), Counter()
+    respondent_ids = []
+    for participant_id, location, preferences in responses:
+        interests.update(_interests(preferences))
+        budget = _budget(preferences)
+        if budget:
+            budgets[budget] += 1
+        if location:
+            locations[location] += 1
+        respondent_ids.append(participant_id)
+    return {"interest_counts": dict(interests), "budget_counts": dict(budgets), "location_counts": dict(locations),
+            "respondent_ids": respondent_ids, "response_count": len(respondent_ids)}
+
+
+def _responses(trip_id: int, db: Session):
+    return db.query(models.Participant.id, models.Participant.start_location, models.SurveyResponse.preferences).join(
+        models.SurveyResponse).filter(models.Participant.trip_id == trip_id).order_by(models.SurveyResponse.id)
+
+
+def _rebuild_summary(trip_id: int, db: Session) -> models.PreferenceSummary:
+    """(Re)creates a trip's summary row from its responses, e.g. for trips surveyed before summaries existed."""
+    summary = db.get(models.PreferenceSummary, trip_id)
+    if summary is None:
+        summary = models.PreferenceSummary(trip_id=trip_id, version=0)
+        db.add(summary)
+    for name, value in summarize(_responses(trip_id, db)).items():
+        setattr(summary, name, value)
+    summary.version = (summary.version or 0) + 1
+    return summary
+
+
+def _lock_summary(db: Session, participant_id: int) -> bool:
+    """Bumps the version of the participant's trip summary first thing, like voting_service._lock_tally."""
+    trip_id = select(models.Participant.trip_id).where(models.Participant.id == participant_id).scalar_subquery()
+    result = db.execute(
+        update(models.PreferenceSummary).where(models.PreferenceSummary.trip_id == trip_id)
+        .values(version=models.PreferenceSummary.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _adjust(counts: dict, keys: list, delta: int) -> dict:
+    counter = Counter(counts or {})
+    for key in keys:
+        counter[key] += delta
+    return {key: count for key, count in counter.items() if count > 0}
+
+
+def _submit_survey(db: Session, participant_id: int, location: str, preferences: dict):
+    locked = _lock_summary(db, participant_id)
+    participant = db.query(models.Participant).filter(models.Participant.id == participant_id).first()
+    if not participant:
+        db.rollback()
+        return None
+    trip_id = participant.trip_id
+
+    # _rebuild_summary counts the participant's current answers, which the code below then replaces
+    summary = db.get(models.PreferenceSummary, trip_id) if locked else _rebuild_summary(trip_id, db)
+    interest_counts, budget_counts, location_counts = summary.interest_counts, summary.budget_counts, summary.location_counts
+    respondent_ids = list(summary.respondent_ids or [])
+
+    existing = db.query(models.SurveyResponse).filter(models.SurveyResponse.participant_id == participant_id).first()
+    if existing:
+        interest_counts = _adjust(interest_counts, _interests(existing.preferences), -1)
+        budget_counts = _adjust(budget_counts, [_budget(existing.preferences)] if _budget(existing.preferences) else [], -1)
+        location_counts = _adjust(location_counts, [participant.start_location] if participant.start_location else [], -1)
+        existing.preferences = preferences
+    else:
+        db.add(models.SurveyResponse(participant_id=participant_id, preferences=preferences))
+        respondent_ids.append(participant_id)
+
+    participant.start_location = location
+    summary.interest_counts = _adjust(interest_counts, _interests(preferences), 1)
+    summary.budget_counts = _adjust(budget_counts, [_budget(preferences)] if _budget(preferences) else [], 1)
+    summary.location_counts = _adjust(location_counts, [location] if location else [], 1)
+    summary.respondent_ids = respondent_ids
+    summary.response_count = len(respondent_ids)
+    trip_service.bump_version(db, trip_id)
+    db.commit()
+    return trip_id
+
+
+def submit_survey(db: Session, participant_id: int, location: str, preferences: dict):
+    """
+    Records (or replaces) a participant's survey answers and starting city, and updates the
+    trip's preference summary in the same transaction. Resubmitting replaces the earlier
+    answers. Safe to call concurrently. Returns the participant's trip id, or None if the
+    participant doesn't exist.
+    """
+    try:
+        return _submit_survey(db, participant_id, location, preferences)
+    except IntegrityError:
+        # Lost a race to create the trip's summary (or the participant's response); both exist now
+        db.rollback()
+        return _submit_survey(db, participant_id, location, preferences)
+
+
+def preference_summary(trip_id: int, db: Session) -> dict:
+    """
+    The trip's summary fields as a dict (see summarize). Read from the maintained row; a trip
+    without one (no surveys yet) is summarized from its responses without writing anything.
+    """
+    summary = db.get(models.PreferenceSummary, trip_id)
+    if summary is None:
+        return summarize(_responses(trip_id, db))
+    return {"interest_counts": summary.interest_counts or {}, "budget_counts": summary.budget_counts or {},
+            "location_counts": summary.location_counts or {}, "respondent_ids": summary.respondent_ids or [],
+            "response_count": summary.response_count or 0}
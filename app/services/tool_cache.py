@@ -0,0 +1,204 @@
+# app/services/tool_cache.py
+"""
+Two-tier cache for agent tool results.
+
+Lookups go to a bounded in-process LRU first and then to the `tool_cache` table, so
+results survive restarts and are shared between worker processes. Every tool has its
+own TTL (settings.TOOL_CACHE_TTL_SECONDS). Concurrent misses for the same key are
+coalesced into a single fetch.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app import models
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+_inflight: dict[str, Future] = {}
+_counters: Counter = Counter()  # (tool, outcome) -> count
+
+
+def normalize_place(name: str) -> str:
+    """'  Goa ,  GOA, India ' -> 'goa,goa'. Case, spacing, punctuation and a trailing country are ignored."""
+    parts = []
+    for part in str(name).lower().split(","):
+        part = " ".join(re.sub(r"[^\w\s]", " ", part).split())
+        if part and part != "india":
+            parts.append(part)
+    return ",".join(parts)
+
+
+def make_key(tool: str, args: Iterable[str]) -> str:
+    return f"{tool}:" + "|".join(normalize_place(arg) for arg in args)
+
+
+def _ttl(tool: str) -> float:
+    return settings.TOOL_CACHE_TTL_SECONDS.get(tool, settings.TOOL_CACHE_DEFAULT_TTL_SECONDS)
+
+
+def _remember(key: str, expires_at: float, value: Any):
+    with _lock:
+        _memory[key] = (expires_at, value)
+        _memory.move_to_end(key)
+        while len(_memory) > settings.TOOL_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _lookup(tool: str, key: str) -> tuple[bool, Any]:
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry and entry[0] > now:
+            _memory.move_to_end(key)
+            _counters[(tool, "memory_hit")] += 1
+            return True, entry[1]
+        if entry:
+            del _memory[key]
+
+    db = SessionLocal()
+    try:
+        row = db.get(models.ToolCacheEntry, key)
+        if row and row.expires_at > now:
+            _remember(key, row.expires_at, row.value)
+            with _lock:
+                _counters[(tool, "db_hit")] += 1
+            return True, row.value
+    except Exception as e:
+        logger.warning("Tool cache read failed", extra={"key": key, "error": str(e)})
+    finally:
+        db.close()
+
+    with _lock:
+        _counters[(tool, "miss")] += 1
+    return False, None
+
+
+def get(tool: str, args: Iterable[str]) -> tuple[bool, Any]:
+    """Returns (hit, value) for a tool call without fetching anything."""
+    return _lookup(tool, make_key(tool, args))
+
+
+def put(tool: str, args: Iterable[str], value: Any):
+    """Stores a tool result in both tiers."""
+    key = make_key(tool, args)
+    expires_at = time.time() + _ttl(tool)
+    _remember(key, expires_at, value)
+
+    db = SessionLocal()
+    try:
+        try:
+            db.merge(models.ToolCacheEntry(key=key, tool=tool, value=value, expires_at=expires_at))
+            db.commit()
+        except IntegrityError:
+            # Another thread or process inserted the key after merge looked for it; update that row instead
+            db.rollback()
+            db.merge(models.ToolCacheEntry(key=key, tool=tool, value=value, expires_at=expires_at))
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Tool cache write failed", extra={"key": key, "error": str(e)})
+    finally:
+        db.close()
+
+
+def get_or_fetch(tool: str, args: Iterable[str], fetch: Callable[[], Any]) -> Any:
+    """
+    Returns the cached result for `tool(*args)`, calling `fetch` on a miss.
+    A fetch that returns None is treated as a failure and is not cached.
+    """
+    args = list(args)
+    key = make_key(tool, args)
+    hit, value = _lookup(tool, key)
+    if hit:
+        return value
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+    if not owner:
+        # Another thread is already fetching this key; share its result.
+        with _lock:
+            _counters[(tool, "coalesced")] += 1
+        return future.result()
+
+    try:
+        value = fetch()
+        if value is not None:
+            put(tool, args, value)
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def invalidate(tool: str | None = None, args: Iterable[str] | None = None) -> int:
+    """
+    Drops cached results. With `tool` and `args` a single entry is removed, with only `tool`
+    every entry of that tool, and with neither the whole cache. Returns the number of
+    persistent rows deleted.
+    """
+    if tool is None and args is not None:
+        raise ValueError("args can only be given together with tool")
+
+    key = make_key(tool, args) if args is not None else None
+    with _lock:
+        for cached_key in list(_memory):
+            if (key and cached_key == key) or (not key and (tool is None or cached_key.startswith(f"{tool}:"))):
+                del _memory[cached_key]
+
+    db = SessionLocal()
+    try:
+        query = db.query(models.ToolCacheEntry)
+        if key:
+            query = query.filter(models.ToolCacheEntry.key == key)
+        elif tool:
+            query = query.filter(models.ToolCacheEntry.tool == tool)
+        deleted = query.delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def purge_expired() -> int:
+    """Deletes stale rows from the persistent tier. Run periodically by the job poller. Returns the number deleted."""
+    db = SessionLocal()
+    try:
+        deleted = db.query(models.ToolCacheEntry).filter(
+            models.ToolCacheEntry.expires_at <= time.time()).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def stats() -> dict:
+    """Hit/miss counters per tool, e.g. {"tools": {"petrol_price": {"memory_hit": 12, ...}}, "memory_entries": 40}."""
+    with _lock:
+        tools: dict[str, dict] = {}
+        for (tool, outcome), count in _counters.items():
+            tools.setdefault(tool, {"memory_hit": 0, "db_hit": 0, "coalesced": 0, "miss": 0})[outcome] = count
+        for counts in tools.values():
+            # A coalesced lookup missed both tiers but shared another thread's fetch.
+            lookups = counts["memory_hit"] + counts["db_hit"] + counts["miss"]
+            hits = counts["memory_hit"] + counts["db_hit"] + counts["coalesced"]
+            counts["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return {"tools": tools, "memory_entries": len(_memory)}
@@ -0,0 +1,91 @@
+# app/services/travel_service.py
+"""
+Per-participant travel estimates and hotels for recommendations.
+
+The pipeline assembles each destination as one dict: the summary's fields, the hotels, and a
+`travel_info` entry per participant. Stored like that, every page that showed a recommendation
+loaded everyone's travel info. Instead, split_details keeps only the recommendation's own
+fields in `details` and turns the rest into one recommendation_travel row per participant and
+one recommendation_hotels row per stay, so a participant's slice is read on its own. The map
+URL (which carries the API key) is never stored; map_url builds it when a page is rendered.
+"""
+from urllib.parse import parse_qs, quote, urlsplit
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+
+# Keys of an enriched destination that are stored as rows rather than in Recommendation.details
+_SPLIT_KEYS = ("travel_info", "top_stays", "top_4_hotels")
+_HOTEL_SOURCES = (("top_stays", "top_stay"), ("top_4_hotels", "search"))
+
+
+def _text(value) -> str | None:
+    return None if value is None else str(value)
+
+
+def _origin(info: dict) -> str | None:
+    # Details stored before origins were kept only have the origin inside the map URL
+    if info.get("origin"):
+        return info["origin"]
+    origins = parse_qs(urlsplit(info.get("map_url") or "").query).get("origin")
+    return origins[0] if origins else None
+
+
+def map_url(origin: str, destination: str) -> str:
+    """Google Maps embed URL for directions from `origin` to `destination`."""
+    return (f"https://www.google.com/maps/embed/v1/directions?key={quote(settings.GOOGLE_MAPS_API_KEY)}"
+            f"&origin={quote(origin)}&destination={quote(destination)}")
+
+
+def split_details(details: dict, participant_ids: dict) -> tuple:
+    """
+    Splits an enriched destination into (details, travel rows, hotel rows). `participant_ids`
+    maps contact info to participant id; travel info for anyone not in it is dropped. Rows
+    are dicts without recommendation_id, ready for add_rows.
+    """
+    own = {key: value for key, value in (details or {}).items() if key not in _SPLIT_KEYS}
+
+    travel = []
+    for contact_info, info in ((details or {}).get("travel_info") or {}).items():
+        participant_id = participant_ids.get(contact_info)
+        if participant_id is None or not isinstance(info, dict):
+            continue
+        distance_km = info.get("distance_km")
+        travel.append({
+            "participant_id": participant_id,
+            "origin": _origin(info),
+            "route_text": _text(info.get("route_text")),
+            "distance_km": int(distance_km) if isinstance(distance_km, (int, float)) else None,
+            "estimated_fuel_cost": _text(info.get("estimated_fuel_cost")),
+            "flight_estimate": _text(info.get("flight_estimate")),
+        })
+
+    hotels = []
+    for key, source in _HOTEL_SOURCES:
+        for position, stay in enumerate((details or {}).get(key) or []):
+            if isinstance(stay, dict) and stay.get("name"):
+                # The hotel lookup and the summary both return `estimated_price`
+                price = stay.get("estimated_price") or stay.get("price")
+                hotels.append({"source": source, "position": position, "name": _text(stay["name"]),
+                               "rating": _text(stay.get("rating")), "price": _text(price)})
+    return own, travel, hotels
+
+
+def add_rows(db: Session, recommendation_id: int, travel: list, hotels: list):
+    """
+    Inserts a recommendation's travel and hotel rows from split_details. `db` may also be a
+    Connection, as in the migration that moved existing details into these tables. Caller commits.
+    """
+    if travel:
+        db.execute(insert(models.RecommendationTravel), [{"recommendation_id": recommendation_id, **row} for row in travel])
+    if hotels:
+        db.execute(insert(models.RecommendationHotel), [{"recommendation_id": recommendation_id, **row} for row in hotels])
+
+
+def delete_rows(db: Session, recommendation_ids: list):
+    """Deletes the travel and hotel rows of these recommendations. Caller commits."""
+    db.execute(delete(models.RecommendationTravel).where(models.RecommendationTravel.recommendation_id.in_(recommendation_ids)))
+    db.execute(delete(models.RecommendationHotel).where(models.RecommendationHotel.recommendation_id.in_(recommendation_ids)))
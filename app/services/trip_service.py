@@ -1,3 +1,6 @@
+import time
+
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from app import models, schemas
 from app.services import notification_service
@@ -5,32 +8,89 @@ from app.models.trip import Trip
 from app.core.config import settings
 
 
+class DuplicateParticipantError(ValueError):
+    """Raised before anything is written when a trip's roster lists the same contact more than once."""
+
+    def __init__(self, duplicates: list):
+        self.duplicates = duplicates
+        super().__init__(f"Duplicate participant contact info: {', '.join(duplicates)}")
+
+
+def _contact_key(contact_info: str) -> str:
+    """Emails compare case-insensitively, phone numbers ignore spaces and dashes."""
+    if "@" in contact_info:
+        return contact_info.lower()
+    return contact_info.replace(" ", "").replace("-", "")
+
+
+def _find_duplicates(contacts: list) -> list:
+    seen = set()
+    duplicates = []
+    for contact_info in contacts:
+        key = _contact_key(contact_info)
+        if key in seen and contact_info not in duplicates:
+            duplicates.append(contact_info)
+        seen.add(key)
+    return duplicates
+
+
+def _invite_message(trip_name: str, participant_id: int) -> str:
+    # In the future, this link will point to a unique survey page
+    survey_link = f"{settings.BASE_URL}/survey/{participant_id}"
+    return (f"You've been invited to the trip '{trip_name}'! "
+            f"Please fill out your preferences here: {survey_link}")
+
+
+def bump_version(db: Session, trip_id: int, *criteria, **values):
+    """
+    Marks a trip as changed, so cached pages and ETags for it go stale. `values` are other
+    columns to set in the same UPDATE, and `criteria` restrict it, e.g. to only when those
+    values would change something. Caller commits.
+    """
+    db.execute(
+        update(models.Trip).where(models.Trip.id == trip_id, *criteria)
+        .values(version=models.Trip.version + 1, updated_at=time.time(), **values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def create_trip(db: Session, trip: schemas.TripCreate) -> schemas.Trip:
+    """
+    Creates a trip and all of its participants in a single transaction, inserting the
+    participants in bulk. Duplicate contacts are rejected up front with
+    DuplicateParticipantError. Invites are written to the notification outbox in the same
+    transaction and delivered by the outbox dispatcher once it has committed.
+    """
+    contacts = [p.contact_info.strip() for p in trip.participants if p.contact_info and p.contact_info.strip()]
+    duplicates = _find_duplicates(contacts)
+    if duplicates:
+        raise DuplicateParticipantError(duplicates)
 
+    try:
+        # Create the main Trip object; flushing gives us its id without committing
+        db_trip = models.Trip(name=trip.name, status="planning", ideation_cache_opt_out=trip.ideation_cache_opt_out,
+                              version=1, updated_at=time.time())
+        db.add(db_trip)
+        db.flush()
 
-def create_trip(db: Session, trip: schemas.TripCreate):
-    # Create the main Trip object
-    db_trip = models.Trip(name=trip.name)
-    db.add(db_trip)
-    db.commit()
-    db.refresh(db_trip)
+        participants = []
+        if contacts:
+            # Each returned row carries its own contact_info, so the order of the rows doesn't matter
+            rows = db.execute(
+                insert(models.Participant).returning(models.Participant.id, models.Participant.contact_info),
+                [{"contact_info": contact_info, "trip_id": db_trip.id} for contact_info in contacts]
+            ).all()
+            participants = [schemas.Participant(id=row.id, contact_info=row.contact_info, trip_id=db_trip.id)
+                            for row in rows]
 
-    participants = []
-    # Now create the Participant objects and link them to the trip
-    for participant_data in trip.participants:
-        db_participant = models.Participant(
-            contact_info=participant_data.contact_info,
-            trip_id=db_trip.id
-        )
-        db.add(db_participant)
-        participants.append(db_participant)
-    db.commit()
-    for p in participants:
-        # In the future, this link will point to a unique survey page
-        survey_link = f"{settings.BASE_URL}/survey/{p.id}"
-        message = (f"You've been invited to the trip '{db_trip.name}'! "
-                   f"Please fill out your preferences here: {survey_link}")
+        notification_service.enqueue_notifications(
+            db, [(p.contact_info, _invite_message(trip.name, p.id)) for p in participants])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-        notification_service.send_notification(contact_info=p.contact_info, message=message)
+    notification_service.get_dispatcher().wake()
 
-    db.refresh(db_trip)
-    return db_trip
+    return schemas.Trip(id=db_trip.id, name=db_trip.name, status=db_trip.status,
+                        ideation_cache_opt_out=db_trip.ideation_cache_opt_out, participants=participants)
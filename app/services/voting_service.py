@@ -1,53 +1,217 @@
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from collections import Counter
 from app import models
+from app.services import ballots as ballot_kernel
+from app.services import trip_service
+
+
+def _instant_runoff(ballots: list, candidate_ids) -> tuple:
+    """Compresses the ballots and runs the instant-runoff kernel. Returns (winner_id or None, rounds)."""
+    return ballot_kernel.instant_runoff(ballot_kernel.compress_ballots(ballots, candidate_ids))
+
+
+def _candidate_ids(trip_id: int, db: Session) -> set:
+    return {rec_id for (rec_id,) in db.query(models.Recommendation.id).filter(models.Recommendation.trip_id == trip_id)}
+
+
+def _ballots(trip_id: int, db: Session) -> list:
+    votes = db.query(models.Vote.ranked_choices).join(models.Participant).filter(
+        models.Participant.trip_id == trip_id).order_by(models.Vote.id)
+    return [ranked_choices for (ranked_choices,) in votes]
+
+
+def analyze_votes(trip_id: int, db: Session) -> ballot_kernel.BallotAnalysis:
+    """Instant-runoff, Borda, Condorcet and Schulze results for a trip from a single scan of its ballots."""
+    compressed = ballot_kernel.compress_ballots(_ballots(trip_id, db), sorted(_candidate_ids(trip_id, db)))
+    return ballot_kernel.analyze_ballots(compressed)
 
 
 def tally_votes(trip_id: int, db: Session):
     """
     Calculates the winner of a trip's vote using ranked-choice (instant-runoff) voting.
+    This always re-tallies every ballot; pages should use get_results instead.
     """
-    # 1. Get all votes and recommendations for this trip
-    votes = db.query(models.Vote).join(models.Participant).filter(models.Participant.trip_id == trip_id).all()
-    recommendations = db.query(models.Recommendation).filter(models.Recommendation.trip_id == trip_id).all()
-
-    if not votes:
+    ballots = _ballots(trip_id, db)
+    if not ballots:
         return None  # No votes have been cast
 
-    total_voters = len(votes)
-    active_candidates = {rec.id for rec in recommendations}
-
-    # 2. Run voting rounds until a winner is found
-    while len(active_candidates) > 0:
-        # Tally the top-ranked active choice for each voter in this round
-        round_counts = Counter()
-        for vote in votes:
-            for choice_id in vote.ranked_choices:
-                if choice_id in active_candidates:
-                    round_counts[choice_id] += 1
-                    break  # Move to the next voter
-
-        # 3. Check for a winner (more than 50% of the vote)
-        for candidate_id, count in round_counts.items():
-            if count > total_voters / 2:
-                # We have a winner!
-                winner = db.query(models.Recommendation).filter(models.Recommendation.id == candidate_id).first()
-                return winner
-
-        # 4. If no winner, eliminate the candidate with the fewest votes
-        if not round_counts:
-            # This can happen in a tie where all remaining candidates are eliminated
-            return None
-
-        min_votes = min(round_counts.values())
-        candidates_to_eliminate = {cid for cid, count in round_counts.items() if count == min_votes}
-
-        # If all remaining candidates are tied, we can just pick one as a tie-breaker
-        if set(round_counts.keys()) == candidates_to_eliminate:
-            winner_id = list(round_counts.keys())[0]
-            winner = db.query(models.Recommendation).filter(models.Recommendation.id == winner_id).first()
-            return winner
-
-        active_candidates -= candidates_to_eliminate
-
-    return None  # Should not be reached in a normal vote
\ No newline at end of file
+    winner_id, _ = _instant_runoff(ballots, sorted(_candidate_ids(trip_id, db)))
+    if winner_id is None:
+        return None
+    return db.query(models.Recommendation).filter(models.Recommendation.id == winner_id).first()
+
+
+def _rebuild_tally(trip_id: int, db: Session) -> models.VoteTally:
+    """(Re)creates a trip's tally row from its ballots, e.g. for trips that voted before tallies existed."""
+    ballot_count = db.query(func.count(models.Vote.id)).join(models.Participant).filter(
+        models.Participant.trip_id == trip_id).scalar()
+
+    tally = db.get(models.VoteTally, trip_id)
+    if tally is None:
+        tally = models.VoteTally(trip_id=trip_id, ballot_version=0)
+        db.add(tally)
+    tally.ballot_count = ballot_count
+    tally.ballot_version = (tally.ballot_version or 0) + 1
+    tally.tallied_version = -1
+    return tally
+
+
+class InvalidBallot(ValueError):
+    """A ballot that doesn't rank the trip's recommendations (unknown or repeated ids, or none at all)."""
+
+
+def _lock_tally(db: Session, trip_id: int) -> bool:
+    """
+    Bumps the ballot version of the trip's tally as the transaction's first statement. That
+    takes the write lock (the row on PostgreSQL, the database on SQLite) before anything is
+    read, so concurrent ballots for a trip are applied one after another instead of
+    overwriting each other's counts. Returns False if there's no tally row yet.
+    """
+    result = db.execute(
+        update(models.VoteTally).where(models.VoteTally.trip_id == trip_id)
+        .values(ballot_version=models.VoteTally.ballot_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _upsert_votes(db: Session, votes: dict):
+    """Inserts or replaces {participant_id: ranked_choices} in one INSERT ... ON CONFLICT statement."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(models.Vote).values(
+        [{"participant_id": participant_id, "ranked_choices": ranked} for participant_id, ranked in votes.items()])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[models.Vote.participant_id],
+        set_={"ranked_choices": statement.excluded.ranked_choices},
+    ))
+
+
+def _validate(ranked_ids: list, candidate_ids: set):
+    if not ranked_ids:
+        raise InvalidBallot("The ballot doesn't rank any recommendation")
+    if len(set(ranked_ids)) != len(ranked_ids):
+        raise InvalidBallot("The ballot ranks a recommendation more than once")
+    unknown = [rec_id for rec_id in ranked_ids if rec_id not in candidate_ids]
+    if unknown:
+        raise InvalidBallot(f"Not recommendations of this trip: {unknown}")
+
+
+def _record_ballots(db: Session, ballots: list) -> list:
+    trip_ids = sorted({trip_id for trip_id, _, _ in ballots})
+    locked = {trip_id: _lock_tally(db, trip_id) for trip_id in trip_ids}
+
+    # Each participant's trip and whether they've voted, and every trip's candidates: one query each for the batch
+    participant_ids = {participant_id for _, participant_id, _ in ballots}
+    participants = {participant_id: (trip_id, vote_id) for participant_id, trip_id, vote_id in db.query(
+        models.Participant.id, models.Participant.trip_id, models.Vote.id
+    ).outerjoin(models.Vote, models.Vote.participant_id == models.Participant.id).filter(
+        models.Participant.id.in_(participant_ids))}
+    candidates = {trip_id: set() for trip_id in trip_ids}
+    for rec_id, trip_id in db.query(models.Recommendation.id, models.Recommendation.trip_id).filter(
+            models.Recommendation.trip_id.in_(trip_ids)):
+        candidates[trip_id].add(rec_id)
+
+    results = []
+    accepted = {}  # participant_id -> (trip_id, ranked_ids); a later ballot in the batch replaces an earlier one
+    for trip_id, participant_id, ranked_ids in ballots:
+        if participants.get(participant_id, (None,))[0] != trip_id:
+            results.append(None)
+            continue
+        try:
+            _validate(ranked_ids, candidates[trip_id])
+        except InvalidBallot as e:
+            results.append(e)
+            continue
+        accepted[participant_id] = (trip_id, ranked_ids)
+        results.append(trip_id)
+    if not accepted:
+        db.rollback()
+        return results
+
+    # _rebuild_tally counts the current ballots (and bumps the version itself); the batch is applied on top
+    tallies = {}
+    for trip_id in {trip_id for trip_id, _ in accepted.values()}:
+        tallies[trip_id] = db.get(models.VoteTally, trip_id) if locked[trip_id] else _rebuild_tally(trip_id, db)
+    for participant_id, (trip_id, _) in accepted.items():
+        if participants[participant_id][1] is None:
+            tallies[trip_id].ballot_count = (tallies[trip_id].ballot_count or 0) + 1
+
+    _upsert_votes(db, {participant_id: ranked_ids for participant_id, (_, ranked_ids) in accepted.items()})
+    for trip_id in tallies:
+        trip_service.bump_version(db, trip_id)
+    db.commit()
+    return results
+
+
+def record_ballots(db: Session, ballots: list) -> list:
+    """
+    Inserts or replaces a batch of (trip_id, participant_id, ranked_ids) ballots and updates
+    their trips' tallies incrementally, in one transaction. Ballots are checked against each
+    trip's recommendations, loaded once for the whole batch. Returns, per ballot, the trip id,
+    None if the participant doesn't exist or isn't in that trip, or the InvalidBallot it was
+    rejected with. Safe to call concurrently for the same trip.
+    """
+    try:
+        return _record_ballots(db, ballots)
+    except IntegrityError:
+        # Lost a race to create a trip's tally; it exists now
+        db.rollback()
+        return _record_ballots(db, ballots)
+
+
+def record_ballot(db: Session, trip_id: int, participant_id: int, ranked_ids: list):
+    """
+    Inserts or replaces one participant's ballot (see record_ballots). Returns the trip id, or
+    None if the participant isn't in the trip; raises InvalidBallot for a malformed ballot.
+    """
+    result = record_ballots(db, [(trip_id, participant_id, ranked_ids)])[0]
+    if isinstance(result, InvalidBallot):
+        raise result
+    return result
+
+
+def invalidate_tally(trip_id: int, db: Session):
+    """Drops the maintained tally, e.g. when the trip's candidate recommendations change. Caller commits."""
+    db.query(models.VoteTally).filter(models.VoteTally.trip_id == trip_id).delete(synchronize_session=False)
+
+
+def current_tally(trip_id: int, db: Session) -> models.VoteTally:
+    """
+    Returns a trip's tally, brought up to date. Ballots are only re-tallied when one changed
+    since the last tally, and the trip row is only written when the winner changes.
+    `tally.analysis` holds every method's result.
+    """
+    tally = db.get(models.VoteTally, trip_id)
+    if tally is None:
+        tally = _rebuild_tally(trip_id, db)
+        db.commit()
+
+    if tally.ballot_count and tally.tallied_version != tally.ballot_version:
+        analysis = analyze_votes(trip_id, db).to_dict()
+        winner_id = analysis["winners"]["instant_runoff"]
+        tally.rounds = analysis["irv_rounds"]
+        tally.analysis = analysis
+        tally.winner_recommendation_id = winner_id
+        tally.tallied_version = tally.ballot_version
+
+        if winner_id is not None:
+            # One UPDATE that only writes (and re-versions the trip) if the winner changed
+            trip_service.bump_version(
+                db, trip_id,
+                or_(models.Trip.winner_recommendation_id.is_(None), models.Trip.winner_recommendation_id != winner_id,
+                    models.Trip.status != "completed"),
+                status="completed", winner_recommendation_id=winner_id)
+        db.commit()
+    return tally
+
+
+def get_results(trip_id: int, db: Session):
+    """Returns (winner recommendation or None, tally) for a trip from its maintained tally."""
+    tally = current_tally(trip_id, db)
+    if not tally.ballot_count or tally.winner_recommendation_id is None:
+        return None, tally
+    return db.get(models.Recommendation, tally.winner_recommendation_id), tally
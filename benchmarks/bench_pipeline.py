@@ -0,0 +1,208 @@
+"""
+Benchmarks generate_recommendations offline against the fake LLM provider.
+
+Runs the whole pipeline (aggregation, ideation, enrichment, summary, persistence) for every
+trip size in a participants x destinations matrix on a throwaway SQLite database, and reports
+the median wall time, how long the first recommendation took to be saved (the summary is
+streamed, so it shouldn't wait for the rest), the LLM calls made by kind and the peak Python
+memory of each case.
+The tool and ideation caches are emptied before every run, so each run does the full work.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --participants 2,8,32 --destinations 3,5,10 --latency 0.05
+    python benchmarks/bench_pipeline.py --output before.json
+    python benchmarks/bench_pipeline.py --compare before.json
+
+Results saved with --output carry the commit and settings they were measured with; --compare
+prints each case's change against such a file, so runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix="chalovote-bench-")
+# Must be set before the app's settings are loaded
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'bench.db')}",
+    "LLM_PROVIDER": "fake",
+    "LLM_LIMITER_STATE_DIR": os.path.join(_workdir, "limiter"),
+    "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+})
+
+from app import models  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.core.logging_config import configure_logging  # noqa: E402
+from app.core.migrations import run_migrations  # noqa: E402
+from app.services import ai_service, fake_llm, tool_cache  # noqa: E402
+
+CITIES = [
+    "Hyderabad", "Bengaluru", "Chennai", "Mumbai", "Pune", "Delhi", "Kolkata", "Visakhapatnam", "Vijayawada",
+    "Kochi", "Coimbatore", "Mysuru", "Mangaluru", "Ahmedabad", "Jaipur", "Lucknow", "Bhopal", "Indore", "Nagpur",
+    "Bhubaneswar", "Guwahati", "Chandigarh", "Dehradun", "Madurai", "Thiruvananthapuram", "Warangal", "Surat",
+    "Vadodara", "Nashik", "Patna", "Ranchi", "Raipur",
+]
+INTERESTS = ["hills", "beach", "trekking", "food", "history", "nightlife", "wildlife", "temples"]
+
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _create_trip(participants: int) -> int:
+    db = SessionLocal()
+    try:
+        trip = models.Trip(name=f"Benchmark {participants}", status="planning")
+        db.add(trip)
+        db.flush()
+        for i in range(participants):
+            participant = models.Participant(trip_id=trip.id, contact_info=f"bench{i}@example.com",
+                                             start_location=CITIES[i % len(CITIES)])
+            db.add(participant)
+            db.flush()
+            db.add(models.SurveyResponse(participant_id=participant.id, preferences={
+                "budget": "Moderate", "interests": [INTERESTS[i % len(INTERESTS)], INTERESTS[(i + 3) % len(INTERESTS)]]}))
+        db.commit()
+        return trip.id
+    finally:
+        db.close()
+
+
+def _run(participants: int, trace_memory: bool = False) -> dict:
+    trip_id = _create_trip(participants)
+    tool_cache.invalidate()
+    fake_llm.reset()
+    db = SessionLocal()
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        first_saved = []
+
+        def progress(stage: str, done: int, total: int):
+            if stage == "summary" and done and not first_saved:
+                first_saved.append(time.perf_counter())
+
+        started = time.perf_counter()
+        recommendations = ai_service.generate_recommendations(trip_id, db, progress=progress)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        db.close()
+    first = first_saved[0] - started if first_saved else elapsed
+    return {"seconds": elapsed, "first_seconds": first, "peak_bytes": peak, "recommendations": len(recommendations),
+            "llm_calls": dict(fake_llm.calls)}
+
+
+def run_case(participants: int, destinations: int, repeat: int) -> dict:
+    settings.LLM_FAKE_DESTINATIONS = destinations
+    _run(participants)  # warm-up: imports, connection pool, prepared statements
+    runs = [_run(participants) for _ in range(repeat)]
+    # tracemalloc slows everything down, so memory gets a run of its own
+    memory_run = _run(participants, trace_memory=True)
+    times = [run["seconds"] for run in runs]
+    return {
+        "participants": participants,
+        "destinations": destinations,
+        "median_seconds": round(statistics.median(times), 4),
+        "min_seconds": round(min(times), 4),
+        "max_seconds": round(max(times), 4),
+        "first_recommendation_seconds": round(statistics.median(run["first_seconds"] for run in runs), 4),
+        "llm_calls": runs[-1]["llm_calls"],
+        "total_llm_calls": sum(runs[-1]["llm_calls"].values()),
+        "recommendations": runs[-1]["recommendations"],
+        "peak_memory_mb": round(memory_run["peak_bytes"] / 1024 / 1024, 2),
+    }
+
+
+def _change(now: float, before: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(now - before) / before * 100:+.1f}%"
+
+
+def print_results(results: list, baseline: dict = None):
+    previous = {(r["participants"], r["destinations"]): r for r in (baseline or {}).get("results", [])}
+    header = f"{'participants':>12} {'dests':>5} {'median s':>9} {'min s':>8} {'1st rec s':>9} {'llm calls':>9} {'peak MB':>8}"
+    if baseline:
+        header += f"  {'time vs ' + baseline.get('commit', '?'):>16} {'calls':>7} {'memory':>7}"
+    print(header)
+    for r in results:
+        line = (f"{r['participants']:>12} {r['destinations']:>5} {r['median_seconds']:>9.4f} {r['min_seconds']:>8.4f} "
+                f"{r['first_recommendation_seconds']:>9.4f} {r['total_llm_calls']:>9} {r['peak_memory_mb']:>8.2f}")
+        before = previous.get((r["participants"], r["destinations"]))
+        if before:
+            line += (f"  {_change(r['median_seconds'], before['median_seconds']):>16} "
+                     f"{_change(r['total_llm_calls'], before['total_llm_calls']):>7} "
+                     f"{_change(r['peak_memory_mb'], before['peak_memory_mb']):>7}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--participants", type=_ints, default=[2, 8, 32], help="comma-separated trip sizes")
+    parser.add_argument("--destinations", type=_ints, default=[3, 5, 10], help="comma-separated idea counts")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the median is reported)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM latency per call, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency per call, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake LLM calls that fail")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="a previous --output file to compare against")
+    args = parser.parse_args()
+
+    configure_logging()
+    run_migrations()
+    settings.LLM_FAKE_LATENCY_SECONDS = args.latency
+    settings.LLM_FAKE_JITTER_SECONDS = args.jitter
+    settings.LLM_FAKE_ERROR_RATE = args.error_rate
+
+    results = []
+    for participants in args.participants:
+        for destinations in args.destinations:
+            try:
+                results.append(run_case(participants, destinations, max(1, args.repeat)))
+            except ai_service.PipelineIncomplete as e:
+                print(f"{participants} participants x {destinations} destinations failed: {e}", file=sys.stderr)
+
+    report = {
+        "commit": _commit(),
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate, "repeat": args.repeat,
+            "agent_max_concurrency": settings.AGENT_MAX_CONCURRENCY,
+            "agent_batch_tool_calls": settings.AGENT_BATCH_TOOL_CALLS,
+        },
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmarks a cold start: importing the app and serving its first request.
+
+Every run is a fresh Python process, like a new serverless instance. It times importing
+app.main, the startup hooks (migrations, background workers), the first request (the survey
+form, which renders a template) and a second one for comparison, and lists which heavy
+provider SDKs got imported along the way; none should be until they're actually used. The
+database and the pyc files are prepared by an untimed warm-up run, so the runs measure the app,
+not the first-ever deploy. Each case runs with the template bytecode cache filled and without it.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --output before.json
+    python benchmarks/bench_startup.py --compare before.json
+
+As with bench_pipeline.py, --output saves the results with the commit they were measured at and
+--compare prints each measurement's change against such a file.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are slow to import and only needed once a provider is actually called
+HEAVY_MODULES = ["litellm", "twilio", "sendgrid"]
+
+# Runs in the fresh process; prints one JSON line of timings
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+from app import models
+from app.core.database import SessionLocal
+
+with TestClient(app.main.app) as client:
+    ready = time.perf_counter()
+    db = SessionLocal()
+    participant = db.query(models.Participant).first()
+    if participant is None:
+        trip = models.Trip(name="Startup benchmark", status="planning")
+        db.add(trip)
+        db.flush()
+        participant = models.Participant(trip_id=trip.id, contact_info="bench@example.com")
+        db.add(participant)
+        db.commit()
+    participant_id = participant.id
+    db.close()
+
+    requested = time.perf_counter()
+    first = client.get(f"/survey/{participant_id}")
+    first_done = time.perf_counter()
+    second = client.get(f"/survey/{participant_id}")
+    second_done = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - started,
+    "startup_seconds": ready - imported,
+    "first_request_seconds": first_done - requested,
+    "second_request_seconds": second_done - first_done,
+    "status": [first.status_code, second.status_code],
+    "modules": len(sys.modules),
+    "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+CASES = {
+    "bytecode-cache": {"TEMPLATE_BYTECODE_CACHE_ENABLED": "true"},
+    "no-bytecode-cache": {"TEMPLATE_BYTECODE_CACHE_ENABLED": "false"},
+}
+TIMINGS = ["import_seconds", "startup_seconds", "first_request_seconds", "second_request_seconds", "process_seconds"]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _run(env: dict) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{_CHILD}"], cwd=ROOT,
+                            env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{result.stderr[-2000:]}")
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run["process_seconds"] = elapsed
+    return run
+
+
+def run_case(name: str, overrides: dict, repeat: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="chalovote-startup-")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "LLM_PROVIDER": "fake",
+        "TEMPLATE_BYTECODE_CACHE_DIR": os.path.join(workdir, "templates"),
+        "LLM_LIMITER_STATE_DIR": os.path.join(workdir, "limiter"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    env.update(overrides)
+    _run(env)  # warm-up: creates the schema and the participant, writes pyc and template caches
+    runs = [_run(env) for _ in range(repeat)]
+    result = {"case": name}
+    for timing in TIMINGS:
+        result[timing] = round(statistics.median(run[timing] for run in runs), 4)
+    result["modules"] = runs[-1]["modules"]
+    result["heavy_modules"] = sorted({m for run in runs for m in run["heavy_modules"]})
+    result["status"] = runs[-1]["status"]
+    return result
+
+
+def _change(now: float, before: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(now - before) / before * 100:+.1f}%"
+
+
+def print_results(results: list, baseline: dict = None):
+    previous = {r["case"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'case':>18} {'import s':>9} {'startup s':>9} {'1st req s':>9} {'2nd req s':>9} {'process s':>9} {'modules':>7}")
+    for r in results:
+        print(f"{r['case']:>18} {r['import_seconds']:>9.4f} {r['startup_seconds']:>9.4f} "
+              f"{r['first_request_seconds']:>9.4f} {r['second_request_seconds']:>9.4f} "
+              f"{r['process_seconds']:>9.4f} {r['modules']:>7}")
+        before = previous.get(r["case"])
+        if before:
+            print(f"{'vs ' + baseline.get('commit', '?'):>18} " + " ".join(
+                f"{_change(r[t], before[t]):>9}" for t in TIMINGS) + f" {_change(r['modules'], before['modules']):>7}")
+        if r["heavy_modules"]:
+            print(f"{'':>18} imported at startup: {', '.join(r['heavy_modules'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts per case (the median is reported)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="a previous --output file to compare against")
+    args = parser.parse_args()
+
+    results = [run_case(name, overrides, max(1, args.repeat)) for name, overrides in CASES.items()]
+    report = {
+        "commit": _commit(),
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {"repeat": args.repeat},
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    # Exits non-zero if a provider SDK is imported at startup again, so CI can catch it
+    if any(r["heavy_modules"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
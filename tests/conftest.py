@@ -0,0 +1,61 @@
+"""
+Test setup: the app runs against a throwaway SQLite database with the offline LLM provider, so
+the suite needs no network access or API keys. Settings are read when app modules are first
+imported, so the environment is set here, before any test imports the app.
+"""
+import os
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="chalovote-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    "LLM_PROVIDER": "fake",
+    "LLM_LIMITER_STATE_DIR": os.path.join(_workdir, "limiter"),
+    "TEMPLATE_BYTECODE_CACHE_DIR": os.path.join(_workdir, "templates"),
+    "QUERY_LOG_ENABLED": "true",
+    "LOG_LEVEL": "WARNING",
+})
+
+
+def pytest_configure(config):
+    # SQLAlchemy warns about session misuse (e.g. a stale object whose id was reused) instead of failing
+    config.addinivalue_line("filterwarnings", "error::sqlalchemy.exc.SAWarning")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def trip(client, db):
+    """A trip of three participants who answered the survey, with recommendations from the fake LLM."""
+    from app.services import ai_service
+
+    response = client.post("/trips/bulk", json={"name": "Test trip", "participants": [
+        {"contact_info": f"traveller{i}@example.com"} for i in range(3)]})
+    assert response.status_code == 201
+    created = response.json()
+    for participant, city in zip(created["participants"], ["Hyderabad", "Pune", "Chennai"]):
+        response = client.post(f"/surveys/{participant['id']}",
+                               data={"location": city, "budget": "Moderate", "interests": "hills, food"})
+        assert response.status_code == 200
+    ai_service.generate_recommendations(created["id"], db)
+    return created
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import models
+from app.core.config import settings
+from app.services import agent_service, ai_service, fake_llm
+
+
+@pytest.fixture
+def summary_breaks_after(monkeypatch):
+    """Makes the next streamed summary fail after `chunks` chunks, as a dropped connection would."""
+    def install(chunks: int):
+        completion = fake_llm.completion
+        state = {"armed": True}
+
+        def breaking_completion(model, messages, stream=False, **kwargs):
+            response = completion(model, messages, stream=stream, **kwargs)
+            if not stream or not state["armed"]:
+                return response
+            state["armed"] = False
+
+            def chunks_then_error():
+                for i, chunk in enumerate(response):
+                    if i == chunks:
+                        raise ConnectionError("stream dropped")
+                    yield chunk
+            return chunks_then_error()
+
+        monkeypatch.setattr(fake_llm, "completion", breaking_completion)
+    return install
+
+
+def _recommendations(db, trip_id: int) -> list:
+    db.expire_all()
+    return db.query(models.Recommendation).filter(models.Recommendation.trip_id == trip_id).all()
+
+
+def _new_trip(client) -> dict:
+    response = client.post("/trips/bulk", json={"name": "Streaming", "participants": [
+        {"contact_info": "a@example.com"}, {"contact_info": "b@example.com"}]})
+    trip = response.json()
+    for participant, city in zip(trip["participants"], ["Hyderabad", "Pune"]):
+        client.post(f"/surveys/{participant['id']}", data={"location": city, "budget": "Moderate", "interests": "hills"})
+    return trip
+
+
+def test_recommendations_saved_before_a_failure_are_kept_and_resumed(client, db, summary_breaks_after):
+    trip = _new_trip(client)
+    summary_breaks_after(25)
+    with pytest.raises(ai_service.PipelineIncomplete):
+        ai_service.generate_recommendations(trip["id"], db)
+    partial = _recommendations(db, trip["id"])
+    assert 0 < len(partial) < 5
+
+    ai_service.generate_recommendations(trip["id"], db)
+    names = [rec.destination_name for rec in _recommendations(db, trip["id"])]
+    assert len(names) == len(set(names)) == 5
+    assert db.query(models.PipelineCheckpoint).filter(models.PipelineCheckpoint.trip_id == trip["id"]).count() == 0
+
+
+def test_changed_inputs_discard_a_partial_run(client, db, summary_breaks_after):
+    trip = _new_trip(client)
+    summary_breaks_after(25)
+    with pytest.raises(ai_service.PipelineIncomplete):
+        ai_service.generate_recommendations(trip["id"], db)
+    assert _recommendations(db, trip["id"])
+
+    # A new survey answer changes the inputs, so the next run starts over
+    client.post(f"/surveys/{trip['participants'][0]['id']}", data={"location": "Chennai", "budget": "Low", "interests": "beach"})
+    ai_service.generate_recommendations(trip["id"], db)
+
+    assert len(_recommendations(db, trip["id"])) == 5
+    # No travel or hotel rows were left behind by the discarded recommendations
+    existing = db.query(models.Recommendation.id)
+    assert db.query(models.RecommendationHotel).filter(~models.RecommendationHotel.recommendation_id.in_(existing)).count() == 0
+    assert db.query(models.RecommendationTravel).filter(~models.RecommendationTravel.recommendation_id.in_(existing)).count() == 0
+
+
+def test_summary_items_are_matched_to_their_destination_by_name(client, db, monkeypatch):
+    trip = _new_trip(client)
+    answer = fake_llm._answer
+    state = {"armed": True}
+
+    def reordered_with_a_broken_item(prompt):
+        kind, content = answer(prompt)
+        if kind != "summary" or not state["armed"]:
+            return kind, content
+        state["armed"] = False
+        items = [json.dumps(item, ensure_ascii=False) for item in json.loads(content)["recommendations"]][::-1]
+        items[1] = items[1].replace('"reason": "', '"reason": ', 1)  # no longer a valid object
+        return kind, '{"recommendations": [' + ", ".join(items) + "]}"
+
+    monkeypatch.setattr(fake_llm, "_answer", reordered_with_a_broken_item)
+    ai_service.generate_recommendations(trip["id"], db)
+
+    recommendations = _recommendations(db, trip["id"])
+    assert len({rec.destination_name for rec in recommendations}) == len(recommendations) == 5
+    for rec in recommendations:
+        # Each recommendation got the research (and travel rows) of its own destination
+        assert rec.details["destination"] == rec.destination_name
+        assert rec.reason.startswith(rec.destination_name.split(",")[0])
+
+
+def test_a_hung_tool_call_falls_back_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_TOOL_TIMEOUT_SECONDS", 0.5)
+    release = threading.Event()
+
+    def hung_hotel_lookup(destination):
+        release.wait(30)  # a provider that ignores its own timeout
+        return []
+
+    monkeypatch.setattr(agent_service, "get_hotel_recommendations", hung_hotel_lookup)
+    started = time.time()
+    try:
+        enriched = ai_service._enrich_destinations([{"name": "Goa", "state": "Goa"}], [("a@example.com", "Pune")])
+    finally:
+        release.set()
+
+    assert time.time() - started < 5
+    assert enriched[0]["top_4_hotels"] == ai_service._NO_HOTELS
+    assert enriched[0]["travel_info"]["a@example.com"]["route_text"]
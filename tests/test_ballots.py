@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+import pytest
+
+from app.services import ballots as ballot_kernel
+
+
+def _counted_ballot_by_ballot(ballots: list, candidate_ids: list):
+    """The instant-runoff count tally_votes did before the kernel, one ballot at a time."""
+    if not ballots:
+        return None
+    total_voters = len(ballots)
+    active_candidates = set(candidate_ids)
+    while active_candidates:
+        round_counts = Counter()
+        for ranked_choices in ballots:
+            for choice_id in ranked_choices:
+                if choice_id in active_candidates:
+                    round_counts[choice_id] += 1
+                    break
+
+        for candidate_id, count in round_counts.items():
+            if count > total_voters / 2:
+                return candidate_id
+        if not round_counts:
+            return None
+
+        min_votes = min(round_counts.values())
+        candidates_to_eliminate = {cid for cid, count in round_counts.items() if count == min_votes}
+        if set(round_counts) == candidates_to_eliminate:
+            return list(round_counts)[0]
+        active_candidates -= candidates_to_eliminate
+    return None
+
+
+def _random_ballot(rng: random.Random, candidate_ids: list) -> list:
+    ballot = rng.sample(candidate_ids, rng.randint(0, len(candidate_ids)))  # partial and empty ballots exhaust
+    if rng.random() < 0.2:
+        ballot.insert(rng.randint(0, len(ballot)), 999)  # not a candidate
+    if ballot and rng.random() < 0.1:
+        ballot.append(ballot[0])  # repeated choice
+    return ballot
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_kernel_picks_the_same_winner_as_counting_ballot_by_ballot(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        candidate_ids = rng.sample(range(1, 50), rng.randint(1, 5))
+        # Few voters for few candidates, so tied rounds and all-way ties are common
+        ballots = [_random_ballot(rng, candidate_ids) for _ in range(rng.randint(0, 12))]
+
+        winner, _ = ballot_kernel.instant_runoff(ballot_kernel.compress_ballots(ballots, candidate_ids))
+        assert winner == _counted_ballot_by_ballot(ballots, candidate_ids), (candidate_ids, ballots)
+
+
+@pytest.mark.parametrize("ballots, winner", [
+    ([[1, 2], [2, 1]], 1),  # all-way tie: the first top choice to appear wins
+    ([[2, 1], [1, 2]], 2),
+    ([[3], [1, 3], [2, 3], [2]], 2),  # 1 and 3 are eliminated together
+    ([[], [1], [2]], 1),  # an empty ballot still counts towards the majority
+])
+def test_tie_breaking(ballots, winner):
+    assert ballot_kernel.instant_runoff(ballot_kernel.compress_ballots(ballots, [1, 2, 3]))[0] == winner
+    assert _counted_ballot_by_ballot(ballots, [1, 2, 3]) == winner
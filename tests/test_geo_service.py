@@ -0,0 +1,16 @@
+from app.services import geo_service
+
+
+def test_state_picks_the_place():
+    assert geo_service.resolve("Hyderabad, Telangana").name == "Hyderabad"
+    assert geo_service.resolve("Aurangabad, Maharashtra").state == "Maharashtra"
+    assert geo_service.resolve("Aurangabad").state == "Maharashtra"
+
+
+def test_namesake_in_another_state_is_left_to_the_llm():
+    assert geo_service.resolve("Aurangabad, Bihar") is None
+    assert geo_service.route_infos(["Aurangabad, Bihar", "Pune"], "Goa, Goa").keys() == {"Pune"}
+
+
+def test_trailing_part_that_is_not_a_state_is_ignored():
+    assert geo_service.resolve("Secunderabad, Hyderabad district").name == "Hyderabad"
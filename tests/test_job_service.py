@@ -0,0 +1,124 @@
+import threading
+import time
+import uuid
+
+from app import models
+from app.core.config import settings
+from app.services import ai_service, job_service
+
+
+def _job(db, trip_id: int) -> models.RecommendationJob:
+    now = time.time()
+    job = models.RecommendationJob(id=uuid.uuid4().hex, trip_id=trip_id, status="queued", stage="queued",
+                                   progress_done=0, progress_total=0, attempts=0, created_at=now, updated_at=now)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_lease_is_renewed_while_the_pipeline_is_quiet(client, db, trip, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 2)
+    release = threading.Event()
+
+    def slow_pipeline(trip_id, db, progress=None):
+        release.wait(10)  # e.g. a long limiter wait: no progress is reported meanwhile
+        return []
+
+    monkeypatch.setattr(ai_service, "generate_recommendations", slow_pipeline)
+    job = _job(db, trip["id"])
+    runner = threading.Thread(target=job_service._run_job, args=(job.id,))
+    runner.start()
+    try:
+        time.sleep(3.5)  # longer than the lease
+        db.expire_all()
+        assert db.get(models.RecommendationJob, job.id).lease_expires_at > time.time()
+        assert job.id not in _dispatched(monkeypatch)
+    finally:
+        release.set()
+        runner.join()
+    db.expire_all()
+    assert db.get(models.RecommendationJob, job.id).status == "completed"
+
+
+def _dispatched(monkeypatch) -> list:
+    dispatched = []
+
+    class Executor:
+        def submit(self, fn, job_id):
+            dispatched.append(job_id)
+
+    monkeypatch.setattr(job_service, "_get_executor", lambda: Executor())
+    job_service.resume_pending_jobs()
+    return dispatched
+
+
+def test_job_that_is_still_running_here_is_not_dispatched_again(client, db, trip, monkeypatch):
+    job = _job(db, trip["id"])
+    # Lease expired, as if the heartbeat had failed, but this process still runs the job
+    db.query(models.RecommendationJob).filter(models.RecommendationJob.id == job.id).update(
+        {"status": "running", "lease_expires_at": time.time() - 1}, synchronize_session=False)
+    db.commit()
+    monkeypatch.setattr(job_service, "_running", {job.id})
+
+    assert job.id not in _dispatched(monkeypatch)
+
+
+def test_incomplete_pipeline_queues_the_job_again(client, db, trip, monkeypatch):
+    def failing_pipeline(trip_id, db, progress=None):
+        raise ai_service.PipelineIncomplete("summary", RuntimeError("stream dropped"))
+
+    monkeypatch.setattr(ai_service, "generate_recommendations", failing_pipeline)
+    job = _job(db, trip["id"])
+    job_service._run_job(job.id)
+
+    db.expire_all()
+    stored = db.get(models.RecommendationJob, job.id)
+    assert stored.status == "queued"
+    assert "summary" in stored.error
+
+
+def test_concurrent_submits_queue_one_job(client, db, trip, monkeypatch):
+    from app.core.database import SessionLocal
+
+    dispatched = []
+
+    class Executor:
+        def submit(self, fn, job_id):
+            dispatched.append(job_id)
+
+    monkeypatch.setattr(job_service, "_get_executor", lambda: Executor())
+    # Each submit's first check misses the other's job, as when both check before either commits
+    active_job, checks = job_service._active_job, []
+    monkeypatch.setattr(job_service, "_active_job",
+                        lambda trip_id, db: active_job(trip_id, db) if checks.append(trip_id) or len(checks) > 2 else None)
+    first = job_service.submit_recommendation_job(trip["id"], db)
+    other = SessionLocal()
+    try:
+        second = job_service.submit_recommendation_job(trip["id"], other)
+        assert second.id == first.id
+    finally:
+        other.close()
+
+    assert dispatched == [first.id]
+    assert db.query(models.RecommendationJob).filter(models.RecommendationJob.trip_id == trip["id"]).count() == 1
+
+
+def test_poller_purges_expired_tool_cache_rows(client, db, monkeypatch):
+    now = time.time()
+    db.add_all([models.ToolCacheEntry(key="petrol_price:expired", tool="petrol_price", value=100.0, expires_at=now - 1),
+                models.ToolCacheEntry(key="petrol_price:fresh", tool="petrol_price", value=100.0, expires_at=now + 60)])
+    db.commit()
+    stop = threading.Event()
+    monkeypatch.setattr(job_service, "_stop", stop)
+    monkeypatch.setattr(job_service, "resume_pending_jobs", lambda: 0)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL_SECONDS", 0.05)
+
+    poller = threading.Thread(target=job_service._poll)
+    poller.start()
+    time.sleep(0.5)
+    stop.set()
+    poller.join()
+
+    db.expire_all()
+    assert db.get(models.ToolCacheEntry, "petrol_price:expired") is None
+    assert db.get(models.ToolCacheEntry, "petrol_price:fresh") is not None
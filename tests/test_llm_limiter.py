@@ -0,0 +1,24 @@
+from app.services import llm_limiter
+
+
+def test_calls_are_not_paced_by_default():
+    model = "test/unlimited"
+    waits = [llm_limiter.acquire(model, 1000) for _ in range(50)]
+    assert max(waits) < 0.5
+
+
+def test_rate_limit_error_blocks_the_model(monkeypatch):
+    model = "test/throttled"
+    llm_limiter.acquire(model, 1000)
+    backoff = llm_limiter.throttled(model)
+
+    clock = {"now": llm_limiter.time.time(), "slept": 0.0}
+
+    def sleep(seconds: float):
+        clock["now"] += seconds
+        clock["slept"] += seconds
+
+    monkeypatch.setattr(llm_limiter.time, "time", lambda: clock["now"])
+    monkeypatch.setattr(llm_limiter.time, "sleep", sleep)
+    llm_limiter.acquire(model, 1000)
+    assert clock["slept"] >= backoff * 0.9
@@ -0,0 +1,22 @@
+import threading
+import time
+
+from app.services import notification_service
+
+
+def test_stop_waits_for_the_send_in_progress(client, monkeypatch):
+    sending, finished = threading.Event(), threading.Event()
+
+    def slow_drain(self, limit=None):
+        sending.set()
+        time.sleep(0.3)
+        finished.set()
+        return 0
+
+    monkeypatch.setattr(notification_service.OutboxDispatcher, "drain", slow_drain)
+    dispatcher = notification_service.OutboxDispatcher()
+    dispatcher.start()
+    assert sending.wait(5)
+    dispatcher.stop()
+
+    assert finished.is_set()
@@ -0,0 +1,22 @@
+import time
+from email.utils import formatdate
+
+from app.services import page_cache, trip_service
+
+
+def test_revalidation_goes_by_the_version_etag(client, db, trip):
+    page_cache.clear()
+    url = f"/trips/{trip['id']}"
+    etag = client.get(url).headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    trip_service.bump_version(db, trip["id"])
+    db.commit()
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_if_modified_since_alone_never_gets_a_304(client, db, trip):
+    # A write in the same second as the client's copy would otherwise look unmodified
+    response = client.get(f"/trips/{trip['id']}", headers={"If-Modified-Since": formatdate(time.time() + 60, usegmt=True)})
+    assert response.status_code == 200
+    assert "last-modified" not in response.headers
@@ -0,0 +1,55 @@
+"""
+Every page declared with @query_log.budget stays within it, measured through the X-Query-Count
+header the query log adds with QUERY_LOG_ENABLED. Pages are served from the page cache once
+rendered, so each one is checked on a cache miss, the most expensive way to serve it.
+"""
+import re
+
+import pytest
+
+from app.main import app
+from app.services import page_cache
+
+BUDGETED_ROUTES = sorted(
+    (route.path, route.endpoint.query_budget) for route in app.routes
+    if getattr(getattr(route, "endpoint", None), "query_budget", None) is not None
+)
+
+
+def _url(path: str, trip: dict) -> str:
+    values = {"trip_id": trip["id"], "participant_id": trip["participants"][0]["id"]}
+    return re.sub(r"\{(\w+)\}", lambda match: str(values[match.group(1)]), path)
+
+
+def _queries(client, url: str) -> int:
+    page_cache.clear()
+    response = client.get(url)
+    assert response.status_code == 200, url
+    return int(response.headers["X-Query-Count"])
+
+
+def _vote(client, trip: dict, participant: dict, db):
+    from app import models
+
+    recommendation_ids = [rec_id for (rec_id,) in db.query(models.Recommendation.id).filter(
+        models.Recommendation.trip_id == trip["id"]).order_by(models.Recommendation.id.desc())]
+    response = client.post(f"/trip/{trip['id']}/vote/{participant['id']}",
+                           data={f"rank_{rec_id}": str(rank) for rank, rec_id in enumerate(recommendation_ids, 1)})
+    assert response.status_code == 200
+
+
+def test_every_page_declares_a_budget():
+    assert BUDGETED_ROUTES
+
+
+@pytest.mark.parametrize("path,query_budget", BUDGETED_ROUTES)
+def test_page_stays_within_budget(client, trip, path, query_budget):
+    assert _queries(client, _url(path, trip)) <= query_budget
+
+
+@pytest.mark.parametrize("path,query_budget", BUDGETED_ROUTES)
+def test_page_stays_within_budget_after_votes(client, db, trip, path, query_budget):
+    # The first view after a ballot changes re-tallies the vote
+    for participant in trip["participants"]:
+        _vote(client, trip, participant, db)
+    assert _queries(client, _url(path, trip)) <= query_budget
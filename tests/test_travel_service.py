@@ -0,0 +1,33 @@
+from app import models
+from app.services import travel_service
+
+
+def test_split_details_keeps_stay_prices():
+    details = {
+        "destination": "Goa, Goa",
+        "top_stays": [{"name": "Zostel", "rating": 4.5, "estimated_price": "₹800 per night"}],
+        "top_4_hotels": [{"name": "Guesthouse", "rating": 4.1, "price": "₹600"}],
+        "travel_info": {"a@example.com": {"origin": "Pune", "route_text": "8 hours", "distance_km": 450}},
+    }
+    own, travel, hotels = travel_service.split_details(details, {"a@example.com": 1})
+
+    assert own == {"destination": "Goa, Goa"}
+    assert [(hotel["source"], hotel["price"]) for hotel in hotels] == [("top_stay", "₹800 per night"), ("search", "₹600")]
+    assert travel[0]["participant_id"] == 1 and travel[0]["distance_km"] == 450
+
+
+def test_persisted_recommendations_have_stay_prices(db, trip):
+    hotels = db.query(models.RecommendationHotel).join(models.Recommendation).filter(
+        models.Recommendation.trip_id == trip["id"]).all()
+
+    assert {hotel.source for hotel in hotels} == {"top_stay", "search"}
+    assert all(hotel.price for hotel in hotels)
+
+
+def test_trip_page_shows_stay_prices(client, db, trip):
+    stay = db.query(models.RecommendationHotel).join(models.Recommendation).filter(
+        models.Recommendation.trip_id == trip["id"], models.RecommendationHotel.source == "top_stay").first()
+    page = client.get(f"/trips/{trip['id']}").text
+
+    assert f"{stay.name} (Rating: {stay.rating}) - {stay.price}" in page
+    assert "- None</li>" not in page
@@ -0,0 +1,33 @@
+from app import models
+from app.services import voting_service
+
+
+def _recommendation_ids(db, trip_id: int) -> list:
+    return [rec_id for (rec_id,) in db.query(models.Recommendation.id).filter(
+        models.Recommendation.trip_id == trip_id).order_by(models.Recommendation.id)]
+
+
+def test_ballot_count_counts_voters_not_ballots(db, trip):
+    rec_ids = _recommendation_ids(db, trip["id"])
+    first, second, _ = (p["id"] for p in trip["participants"])
+
+    voting_service.record_ballot(db, trip["id"], first, rec_ids)
+    voting_service.record_ballot(db, trip["id"], first, rec_ids[::-1])
+    voting_service.record_ballots(db, [(trip["id"], second, rec_ids), (trip["id"], second, rec_ids[::-1])])
+
+    tally = voting_service.current_tally(trip["id"], db)
+    assert tally.ballot_count == 2
+    assert tally.winner_recommendation_id == rec_ids[-1]
+
+
+def test_a_dropped_tally_is_rebuilt_from_the_ballots(db, trip):
+    rec_ids = _recommendation_ids(db, trip["id"])
+    for participant in trip["participants"]:
+        voting_service.record_ballot(db, trip["id"], participant["id"], rec_ids)
+    voting_service.invalidate_tally(trip["id"], db)
+    db.commit()
+
+    voting_service.record_ballot(db, trip["id"], trip["participants"][0]["id"], rec_ids[::-1])
+    tally = voting_service.current_tally(trip["id"], db)
+    assert tally.ballot_count == 3
+    assert tally.winner_recommendation_id == rec_ids[0]